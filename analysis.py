@@ -1,10 +1,180 @@
 import numpy as np
-from scipy import stats as st
+
+# scipy.stats takes about a second to import, it is loaded by the functions that need it
 
 def analysis_compute_latency(trials_record):
+    from scipy import stats as st
     usec_array = np.array(trials_record['usec'])
-    ci = st.t.interval(alpha=0.95, df=usec_array.size-1, loc=usec_array.mean(), scale=st.sem(usec_array))
+    ci = st.t.interval(0.95, usec_array.size - 1, loc=usec_array.mean(), scale=st.sem(usec_array))
     return {'95ci': ci, 
             'min': usec_array.min(), 'max' : usec_array.max(), 
             'mean': usec_array.mean(),
-            'median': np.median(usec_array)}
\ No newline at end of file
+            'median': np.median(usec_array)}
+
+def analysis_compute_jitter(trials_record):
+    # spread around the median, the tail percentiles matter for real-time deadlines
+    usec_array = np.array(trials_record['usec'])
+    median = np.median(usec_array)
+    p50, p95, p99 = np.percentile(usec_array, [50, 95, 99])
+    return {'p50': p50, 'p95': p95, 'p99': p99, 'std': usec_array.std(ddof=1) if usec_array.size > 1 else 0.0,
+            'max_deviation': np.abs(usec_array - median).max()}
+
+def analysis_compute_throughput(burst_record):
+    if not burst_record or not burst_record['usec']:
+        return None
+    return {'inferences': burst_record['count'], 'usec': burst_record['usec'],
+            'inferences_per_sec': burst_record['count'] / (burst_record['usec'] / 1e6),
+            'mean_usec': burst_record['usec'] / burst_record['count']}
+
+def analysis_compute_energy(energy_uj):
+    from scipy import stats as st
+    energy_uj = np.asarray(energy_uj, dtype=np.float64)
+    ci = (st.t.interval(0.95, energy_uj.size - 1, loc=energy_uj.mean(), scale=st.sem(energy_uj))
+          if energy_uj.size > 1 else (np.nan, np.nan))
+    return {'95ci': ci, 'min': energy_uj.min(), 'max': energy_uj.max(), 'mean': energy_uj.mean(),
+            'median': np.median(energy_uj)}
+
+def analysis_compare_latency(baseline_usec, candidate_usec):
+    # Welch's t-test on the means, Mann-Whitney U on the distributions (robust to the long tail of
+    # interrupted trials), Hedges' g and Cliff's delta as effect sizes
+    a = np.asarray(baseline_usec, dtype=np.float64)
+    b = np.asarray(candidate_usec, dtype=np.float64)
+    result = {'baseline_mean': a.mean(), 'candidate_mean': b.mean(),
+              'baseline_median': np.median(a), 'candidate_median': np.median(b),
+              'rel_change': (b.mean() - a.mean()) / a.mean() if a.mean() > 0 else np.nan,
+              'welch_p': np.nan, 'mannwhitney_p': np.nan, 'hedges_g': np.nan, 'cliffs_delta': np.nan}
+    if a.size < 2 or b.size < 2:
+        return result
+    from scipy import stats as st
+    pooled = np.sqrt(((a.size - 1) * a.var(ddof=1) + (b.size - 1) * b.var(ddof=1)) / (a.size + b.size - 2))
+    if pooled > 0:
+        correction = 1 - 3 / (4 * (a.size + b.size) - 9)
+        result['hedges_g'] = (b.mean() - a.mean()) / pooled * correction
+        result['welch_p'] = st.ttest_ind(b, a, equal_var=False).pvalue
+    elif a.mean() != b.mean():
+        # constant timings on both sides (e.g. cycle counters on a cache-less core)
+        result['welch_p'] = 0.0
+    else:
+        result['welch_p'] = 1.0
+    u = st.mannwhitneyu(b, a, alternative='two-sided')
+    result['mannwhitney_p'] = u.pvalue
+    result['cliffs_delta'] = 2 * u.statistic / (a.size * b.size) - 1
+    return result
+
+class P2Quantile:
+    # P-square online quantile estimator (Jain & Chlamtac 1985), O(1) memory per quantile
+
+    def __init__(self, p):
+        self.p = p
+        self._initial = []
+        self._q = None
+        self._n = None
+        self._np = None
+        self._dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x):
+        if self._q is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                p = self.p
+                self._q = sorted(self._initial)
+                self._n = [0, 1, 2, 3, 4]
+                self._np = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+            return
+        q, n = self._q, self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = max(i for i in range(4) if q[i] <= x)
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._np[i] += self._dn[i]
+        for i in range(1, 4):
+            d = self._np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        if self._q is None:
+            return np.percentile(self._initial, self.p * 100) if self._initial else np.nan
+        return self._q[2]
+
+
+class StreamingLatencyStats:
+
+    def __init__(self, percentiles=(0.5, 0.95, 0.99), confidence=0.95):
+        self.confidence = confidence
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._quantiles = {p: P2Quantile(p) for p in percentiles}
+
+    def update(self, x):
+        # Welford's online mean / variance
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        for q in self._quantiles.values():
+            q.update(x)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.n - 1) if self.n > 1 else np.nan
+
+    def percentile(self, p):
+        return self._quantiles[p].value()
+
+    def ci_half_width(self):
+        if self.n < 2:
+            return np.inf
+        from scipy import stats as st
+        return st.t.ppf((1 + self.confidence) / 2, self.n - 1) * np.sqrt(self.variance / self.n)
+
+    def ci(self):
+        h = self.ci_half_width()
+        return (self.mean - h, self.mean + h)
+
+    def relative_precision(self):
+        return self.ci_half_width() / self.mean if self.mean > 0 else np.inf
+
+    def to_dict(self):
+        return {'95ci': self.ci(), 'min': self.min, 'max': self.max, 'mean': self.mean,
+                'median': self.percentile(0.5) if 0.5 in self._quantiles else np.nan,
+                'n': self.n, 'std': np.sqrt(self.variance)}
+
+
+class EarlyStopping:
+
+    def __init__(self, rel_precision=0.01, min_trials=5, max_trials=10000, max_time=None):
+        self.rel_precision = rel_precision
+        self.min_trials = min_trials
+        self.max_trials = max_trials
+        self.max_time = max_time
+        self.reason = None
+
+    def should_stop(self, stats, elapsed_time):
+        if stats.n >= self.max_trials:
+            self.reason = 'max_trials'
+        elif self.max_time is not None and elapsed_time >= self.max_time:
+            self.reason = 'max_time'
+        elif (self.rel_precision is not None and stats.n >= max(self.min_trials, 2)
+              and stats.relative_precision() <= self.rel_precision):
+            self.reason = 'precision'
+        return self.reason is not None
@@ -0,0 +1,100 @@
+import io
+import re
+import tarfile
+
+import numpy as np
+
+# C prototypes of the profiling hooks implemented in main.c (UTOE_GRANULARITY=2)
+PROF_HOOKS_DECL = "void utoe_prof_begin(unsigned call);\nvoid utoe_prof_end(unsigned call);\n"
+
+_MAIN_FUNC_RE = re.compile(r'\b(tvmgen_\w+?)___tvm_main__\s*\(')
+_OP_CALL_RE = re.compile(r'\b(tvmgen_\w+?_fused_\w+)\s*\(')
+_CONST_ARG_RE = re.compile(r'\b(\w*constant\w*)\b')
+
+def instrument_aot_source(source):
+    # Wrap every operator call statement of the AoT main function in
+    # utoe_prof_begin(k) / utoe_prof_end(k). TVM emits one call statement per line.
+    lines = source.split('\n')
+    call_sites = []
+    out = []
+    depth = None
+    for line in lines:
+        if depth is None:
+            out.append(line)
+            if _MAIN_FUNC_RE.search(line) and not line.rstrip().endswith(';'):
+                depth = line.count('{') - line.count('}')
+            continue
+        if depth <= 0 and '{' in line:
+            # opening brace on its own line
+            depth += line.count('{') - line.count('}')
+            out.append(line)
+            continue
+        m = _OP_CALL_RE.search(line)
+        if m is not None and depth > 0:
+            k = len(call_sites)
+            call_sites.append({'call': k, 'op': m.group(1),
+                               'params': sorted(set(_CONST_ARG_RE.findall(line[m.end():])))})
+            indent = line[:len(line) - len(line.lstrip())]
+            out.append(f'{indent}{{ utoe_prof_begin({k}); {line.strip()} utoe_prof_end({k}); }}')
+        else:
+            out.append(line)
+        depth += line.count('{') - line.count('}')
+        if depth <= 0 and '}' in line:
+            depth = None
+    if not call_sites:
+        return source, call_sites
+    return PROF_HOOKS_DECL + '\n'.join(out), call_sites
+
+def instrument_aot_mlf(mlf_path):
+    # rewrite the exported Model Library Format tar in place, returns the instrumented call sites
+    with tarfile.open(mlf_path, 'r') as tar:
+        members = [(m, tar.extractfile(m).read() if m.isfile() else None) for m in tar.getmembers()]
+    call_sites = []
+    patched = []
+    for member, data in members:
+        if data is not None and member.name.endswith('.c') and '/codegen/host/src/' in '/' + member.name:
+            source = data.decode()
+            if _MAIN_FUNC_RE.search(source):
+                source, sites = instrument_aot_source(source)
+                for s in sites:
+                    s['call'] += len(call_sites)
+                call_sites += sites
+                data = source.encode()
+        patched.append((member, data))
+    if not call_sites:
+        raise RuntimeError(f"no AoT main function with operator calls found in {mlf_path}")
+    with tarfile.open(mlf_path, 'w') as tar:
+        for member, data in patched:
+            if data is not None:
+                member.size = len(data)
+                tar.addfile(member, io.BytesIO(data))
+            else:
+                tar.addfile(member)
+    return call_sites
+
+def parse_aot_profile(call_sites, profile, timer_hz, function_metadata):
+    # profile: (repeat, calls) ticks -> per op record in the layout of evaluate_per_operator
+    seconds = np.asarray(profile, dtype=np.float64) / timer_hz
+    per_call_mean = seconds.mean(axis=0)
+    total_time = per_call_mean.sum()
+    ops_rec = {}
+    for site in call_sites:
+        op = site['op']
+        t = per_call_mean[site['call']]
+        rec = ops_rec.setdefault(op, {'time_us': 0.0, 'time_percent': 0.0, 'params': [],
+                                      'calls': 0, 'measurements': [],
+                                      'memory': None, 'storage': None})
+        rec['time_us'] += t * 1e6
+        rec['calls'] += 1
+        rec['params'] += [p for p in site['params'] if p not in rec['params']]
+        rec['measurements'].append([round(x * 1e6, 3) for x in seconds[:, site['call']]])
+    for op, rec in ops_rec.items():
+        rec['time_percent'] = round(rec['time_us'] / (total_time * 1e6) * 100, 3) if total_time > 0 else 0.0
+        rec['time_us'] = round(rec['time_us'], 3)
+        meta = function_metadata.get(op)
+        if meta is not None:
+            rec['memory'] = meta['workspace_sizes'] + meta['io_sizes']
+            rec['storage'] = meta['constant_sizes']
+        else:
+            rec['memory'] = rec['storage'] = 0
+    return ops_rec
@@ -0,0 +1,66 @@
+import os
+import json
+
+from compile_cache import hash_file
+from results_db import ResultsDB, DB_PATH, print_results, make_evaluation_config, get_config_hash
+from sweep import make_sweep_jobs, SWEEP_BUILD_ROOT
+from pipeline import Pipeline
+
+MODEL_EXTENSIONS = ('.tflite', '.onnx', '.pt', '.pth')
+
+def collect_models(path):
+    # path: a directory of model files, or a manifest (.txt one model per line, .json list)
+    if os.path.isdir(path):
+        return [{'model_path': os.path.join(path, f), 'shape_dict': None}
+                for f in sorted(os.listdir(path)) if f.endswith(MODEL_EXTENSIONS)]
+    base = os.path.dirname(path)
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            entries = json.load(f)
+    else:
+        with open(path, 'r') as f:
+            entries = [l.strip() for l in f if l.strip() and not l.startswith('#')]
+    models = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'model_path': entry}
+        shape = entry.get('input_shape')
+        models.append({'model_path': os.path.join(base, entry['model_path']),
+                       'shape_dict': {'input': shape} if shape is not None else None})
+    return models
+
+def filter_fresh_jobs(jobs, db, max_age_sec=None):
+    model_hashes = {}
+    todo, skipped = [], []
+    for job in jobs:
+        if job['model_path'] not in model_hashes:
+            model_hashes[job['model_path']] = hash_file(job['model_path'])
+        config_hash = get_config_hash(make_evaluation_config(job['env'], job['early_stopping'], job['compile_config'],
+                                                             job['shape_dict']))
+        if db.is_fresh(model_hashes[job['model_path']], job['board'], config_hash, max_age_sec):
+            skipped.append(job)
+        else:
+            todo.append(job)
+    return todo, skipped
+
+def run_batch(path, boards, trials_num=10, use_iotlab=False, random_seed=42, devices=None,
+              compile_jobs=None, build_root=SWEEP_BUILD_ROOT, use_cache=True, timer=None,
+              db_path=DB_PATH, max_age_sec=None, force=False):
+    db = ResultsDB(db_path)
+    models = collect_models(path)
+    jobs = make_sweep_jobs(models, boards, trials_num, use_iotlab, random_seed,
+                           build_root=build_root, use_cache=use_cache, timer=timer)
+    skipped = []
+    if not force:
+        jobs, skipped = filter_fresh_jobs(jobs, db, max_age_sec)
+    print(f"Batch: {len(models)} models x {len(boards)} boards, {len(skipped)} fresh results skipped, {len(jobs)} to run")
+    if jobs:
+        # every finished record is stored right away, an interrupted batch resumes with the remaining jobs
+        pipeline = Pipeline(boards, devices, codegen_workers=compile_jobs, on_record=db.insert)
+        pipeline.run(jobs)
+        pipeline.print_stage_summary()
+        for failure in pipeline.failures:
+            print(f"Failed: {failure['job']} ({failure['stage']}): {failure['error']}")
+    rows = [r for board in boards for r in db.query(board=board)]
+    print_results(rows)
+    return rows
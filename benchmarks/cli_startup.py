@@ -0,0 +1,93 @@
+# Startup time of the u-toe.py commands that work without TVM or a board, fails above the budget or when a
+# command imports TVM, scipy or riotctrl at startup. report and compare also run on a small results database:
+#   python benchmarks/cli_startup.py --budget 0.5
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from tabulate import tabulate
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+COMMANDS = [['report', '--help'], ['compare', '--help'], ['memory', '--help'], ['energy', '--help'],
+            ['pool', '--help'], ['collect', '--help'], ['--help'],
+            ['report', '--db', '{baseline}'], ['report', '--db', '{baseline}', '--all'],
+            # the run sets share no run: a matched run imports scipy.stats for its tests, which is no startup cost
+            ['compare', '{baseline}', '{candidate}', '--allow-missing']]
+# top-level packages that cost seconds or are missing without the full toolchain
+HEAVY_MODULES = ('tvm', 'scipy', 'riotctrl', 'serial', 'model_converter', 'evaluate')
+
+def make_record(model, board, mean_usec):
+    usec = [mean_usec + i for i in range(-5, 5)]
+    return {'mode': 'per-model', 'model_path': f'models/{model}.onnx', 'model_hash': model * 32, 'board': board,
+            'config_hash': '0' * 16, 'config': {'UTOE_TRIAL_NUM': str(len(usec))}, 'datetime': '20260101-120000',
+            'trials_record': {'usec': usec}, 'memory': 20000, 'storage': 100000,
+            'trials_stats_in_usec': {'mean': mean_usec, 'median': mean_usec, 'min': usec[0], 'max': usec[-1],
+                                     '95ci': (mean_usec - 1, mean_usec + 1)}}
+
+def make_fixture(dir_path):
+    # baseline.db: two models on one board, candidate.db: the same models on another board
+    sys.path.insert(0, ROOT)
+    from results_db import ResultsDB
+    paths = {}
+    for name, board in (('baseline', 'nrf52840dk'), ('candidate', 'stm32f746g-disco')):
+        paths[name] = os.path.join(dir_path, f'{name}.db')
+        db = ResultsDB(paths[name])
+        for model, mean_usec in (('a', 1500.0), ('b', 32000.0)):
+            db.insert(make_record(model, board, mean_usec))
+    return paths
+
+def run_command(command, import_time=False):
+    flags = ['-X', 'importtime'] if import_time else []
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + flags + ['u-toe.py'] + command, cwd=ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    return time.perf_counter() - start, proc
+
+def imported_modules(stderr):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    modules = set()
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.split('|')[-1].strip().split('.')[0])
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of the u-toe.py reporting commands.")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per command. default: 5")
+    parser.add_argument('--budget', type=float, default=0.5, help="max. median startup time in seconds. default: 0.5")
+    args = parser.parse_args()
+
+    fixture_dir = tempfile.mkdtemp(prefix='cli_startup_')
+    try:
+        fixture = make_fixture(fixture_dir)
+        rows, failed = time_commands([[arg.format(**fixture) for arg in c] for c in COMMANDS], args)
+    finally:
+        shutil.rmtree(fixture_dir)
+    print(tabulate(rows, headers=['Command', 'Median (ms)', 'Min. (ms)', 'Heavy imports', f'<= {args.budget} s']))
+    sys.exit(1 if failed else 0)
+
+def time_commands(commands, args):
+    rows = []
+    failed = False
+    for command in commands:
+        times = []
+        for _ in range(args.repeat):
+            elapsed, proc = run_command(command)
+            if proc.returncode != 0:
+                print(proc.stderr)
+                raise SystemExit(f"u-toe.py {' '.join(command)} failed")
+            times.append(elapsed)
+        heavy = sorted(imported_modules(run_command(command, import_time=True)[1].stderr) & set(HEAVY_MODULES))
+        median = sorted(times)[len(times) // 2]
+        ok = median <= args.budget and not heavy
+        failed |= not ok
+        rows.append([' '.join(os.path.basename(arg) for arg in command), round(median * 1e3, 1),
+                     round(min(times) * 1e3, 1), ', '.join(heavy) or None, 'ok' if ok else 'FAIL'])
+    return rows, failed
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# Post-processing cost of --per-ops on synthetic graphs, no TVM or board needed:
+#   python benchmarks/per_ops_scaling.py --ops 100 1000 5000
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+from tabulate import tabulate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from per_ops import index_graph, parse_per_ops_result
+from memory_timeline import compute_memory_timeline
+
+def make_graph(num_ops, num_op_names, seed=0):
+    # chain of fused ops with two params each and a skip connection every 4 ops,
+    # num_op_names < num_ops makes several nodes share a fused op name
+    rng = random.Random(seed)
+    nodes = [{'op': 'null', 'name': 'input', 'inputs': []}]
+    shapes, dtypes, storage_ids = [[1, 64]], ['int8'], [0]
+    param_names = []
+    prev, skip = 0, 0
+    for k in range(num_ops):
+        params = []
+        for j in range(2):
+            name = f'p{len(param_names)}'
+            param_names.append(name)
+            nodes.append({'op': 'null', 'name': name, 'inputs': []})
+            shapes.append([64, 64] if j == 0 else [64])
+            dtypes.append('int8')
+            storage_ids.append(len(storage_ids))
+            params.append(len(nodes) - 1)
+        inputs = [[prev, 0, 0]] + [[p, 0, 0] for p in params]
+        if k % 4 == 3:
+            inputs.append([skip, 0, 0])
+            skip = len(nodes)
+        nodes.append({'op': 'tvm_op', 'name': f'node_{k}', 'inputs': inputs,
+                      'attrs': {'func_name': f'tvmgen_default_fused_op_{rng.randrange(num_op_names)}',
+                                'num_inputs': str(len(inputs)), 'num_outputs': '1'}})
+        shapes.append([1, 64])
+        dtypes.append('int8')
+        storage_ids.append(len(storage_ids))
+        prev = len(nodes) - 1
+    graph = {'nodes': nodes, 'arg_nodes': [i for i, n in enumerate(nodes) if n['op'] == 'null'],
+             'heads': [[prev, 0, 0]], 'node_row_ptr': list(range(len(nodes) + 1)),
+             'attrs': {'storage_id': ['list_int', storage_ids], 'shape': ['list_shape', shapes],
+                       'dltype': ['list_str', dtypes]}}
+    return graph, param_names
+
+def debug_nodes(graph):
+    # node list as DebugResult.get_graph_nodes returns it
+    nodes = []
+    for nid, node in enumerate(graph['nodes']):
+        if node['op'] == 'null':
+            nodes.append({'op': 'param', 'name': node['name'], 'inputs': [],
+                          'attrs': {'T': 'type: ' + graph['attrs']['dltype'][1][nid]},
+                          'shape': graph['attrs']['shape'][1][nid]})
+        else:
+            nodes.append({'op': node['attrs']['func_name'], 'name': node['name'],
+                          'inputs': [graph['nodes'][i[0]]['name'] for i in node['inputs']],
+                          'attrs': dict(node['attrs'], T='type: int8'), 'shape': [1, 64]})
+    return nodes
+
+def legacy_per_ops(nodes_info, time_list):
+    # previous evaluate_per_operator: per node np.mean in Python, linear node lookup per op
+    total_time = sum([np.mean(t) for t in time_list])
+    params_info = {n['name']: {'bytes': int(np.prod(n['shape']))} for n in nodes_info if n['op'] == 'param'}
+    ops_rec = {}
+    for node, t in zip(nodes_info, time_list):
+        if node['op'] == 'param':
+            continue
+        op = node['op']
+        op_node = [n for n in nodes_info if n['op'] == op][0]
+        op_params = [p for p in op_node['inputs'] if p != 'reshape_nop']
+        ops_rec[op] = {'time_us': round(np.mean(t) * 1e6, 3), 'time_percent': round(np.mean(t) / total_time * 100, 3),
+                       'storage': sum(params_info[p]['bytes'] for p in op_params if p in params_info)}
+    return ops_rec
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-processing cost of --per-ops on synthetic graphs.")
+    parser.add_argument('--ops', type=int, nargs='+', default=[100, 1000, 3000])
+    parser.add_argument('--op-names', type=float, default=0.5, help="distinct fused op names per op. default: 0.5")
+    parser.add_argument('--repeat', type=int, default=10, help="measurements per node. default: 10")
+    args = parser.parse_args()
+
+    rows = []
+    for num_ops in args.ops:
+        graph, param_names = make_graph(num_ops, max(1, int(num_ops * args.op_names)))
+        time_list = np.random.default_rng(0).uniform(1e-5, 1e-3, (len(graph['nodes']), args.repeat)).tolist()
+        nodes_info = debug_nodes(graph)
+        legacy_sec, legacy = timed(legacy_per_ops, nodes_info, time_list)
+        index_sec, index = timed(index_graph, graph, param_names)
+        parse_sec, ops_rec = timed(parse_per_ops_result, index, time_list)
+        timeline_sec, _ = timed(compute_memory_timeline, graph, None, param_names)
+        # the legacy time of a shared op name is the last node only, the new one sums all of its nodes
+        calls = sum(r['calls'] for r in ops_rec.values())
+        assert calls == num_ops and set(ops_rec) == set(legacy)
+        rows.append([num_ops, len(ops_rec), round(legacy_sec * 1e3, 2), round((index_sec + parse_sec) * 1e3, 2),
+                     round(legacy_sec / (index_sec + parse_sec), 1), round(timeline_sec * 1e3, 2)])
+    print(tabulate(rows, headers=['Ops', 'Op names', 'Legacy (ms)', 'Indexed (ms)', 'Speedup', 'Timeline (ms)']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import os
+import tty
+import json
+import time
+import asyncio
+import termios
+import subprocess
+
+from tabulate import tabulate
+from trial_protocol import TrialStreamDecoder, TrialTextDecoder, FRAME_TRIAL
+
+# end of the start prompt of per_model_eval in main.c
+PROMPT = b'to start >'
+DEFAULT_BAUDRATE = 115200
+PROMPT_TIMEOUT_SEC = 10.0
+# silence between two chunks, the whole run has no limit
+IDLE_TIMEOUT_SEC = 25.0
+RETRIES = 1
+
+def list_devices(board=None, application_directory='.'):
+    # every attached board as RIOT's ttys.py reports it, see list-ttys-json in the Makefile
+    env = dict(os.environ, BOARD=board) if board else None
+    output = subprocess.check_output(['make', 'list-ttys-json'], cwd=application_directory, env=env)
+    return [{'name': info.get('serial') or os.path.basename(info['path']), 'port': info['path'],
+             'serial': info.get('serial'), 'board': board} for info in json.loads(output)]
+
+class SerialPort:
+    # raw non-blocking tty read by the event loop, a USB serial adapter or a pty
+
+    def __init__(self, path, baudrate=DEFAULT_BAUDRATE):
+        self.path = path
+        self.baudrate = baudrate
+        self.fd = None
+        self.reader = None
+
+    def open(self):
+        speed = getattr(termios, f'B{self.baudrate}', None)
+        if speed is None:
+            raise ValueError(f"{self.path}: unsupported baudrate {self.baudrate}")
+        self.fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self.fd)
+        attrs = termios.tcgetattr(self.fd)
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        # output of an earlier run
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+        self.reader = asyncio.StreamReader()
+        asyncio.get_running_loop().add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: the device is gone, e.g. unplugged or the pty closed
+            data = b''
+        if data:
+            self.reader.feed_data(data)
+        else:
+            asyncio.get_running_loop().remove_reader(self.fd)
+            self.reader.feed_eof()
+
+    async def read(self, timeout):
+        try:
+            data = await asyncio.wait_for(self.reader.read(4096), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{self.path} silent for {round(timeout, 3)} s") from None
+        if not data:
+            raise ConnectionError(f"{self.path} closed")
+        return data
+
+    async def write(self, data):
+        while data:
+            try:
+                data = data[os.write(self.fd, data):]
+            except BlockingIOError:
+                await asyncio.sleep(0.001)
+
+    def close(self):
+        if self.fd is None:
+            return
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+        self.fd = None
+
+async def reset_device(device):
+    # device['reset']: a coroutine function, a blocking callable (run in a thread, e.g. RIOTCtrl.reset)
+    # or a command; boards without one are reset with `make reset`, SERIAL picks the debugger
+    reset = device.get('reset')
+    if reset is None and device.get('board'):
+        reset = ['make', 'reset', f"BOARD={device['board']}"] + ([f"SERIAL={device['serial']}"] if device.get('serial') else [])
+    if reset is None:
+        return False
+    if asyncio.iscoroutinefunction(reset):
+        await reset()
+    elif callable(reset):
+        await asyncio.get_running_loop().run_in_executor(None, reset)
+    else:
+        proc = await asyncio.create_subprocess_exec(*reset, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if await proc.wait() != 0:
+            raise RuntimeError(f"{' '.join(reset)} failed")
+    return True
+
+async def wait_for_prompt(port, timeout):
+    # returns what followed the prompt
+    buf = b''
+    deadline = time.monotonic() + timeout
+    while PROMPT not in buf:
+        buf += await port.read(max(deadline - time.monotonic(), 0))
+    return buf[buf.index(PROMPT) + len(PROMPT):]
+
+def decoder_trials_record(decoder):
+    if isinstance(decoder, TrialTextDecoder):
+        return decoder.results()
+    trials_record = decoder.results()
+    trials_record['warmup'] = decoder.warmup_results()
+    trials_record['burst'] = decoder.burst()
+    return trials_record
+
+async def collect_device(device, start_command, output_format='binary', prompt_timeout=PROMPT_TIMEOUT_SEC,
+                         idle_timeout=IDLE_TIMEOUT_SEC, retries=RETRIES, on_trial=None):
+    # start / collect handshake with one board, resets and tries again on a timeout
+    result = {'name': device['name'], 'port': device['port'], 'trials_record': None, 'error': None, 'attempts': 0}
+    start = time.time()
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        port = SerialPort(device['port'], device.get('baudrate', DEFAULT_BAUDRATE))
+        try:
+            port.open()
+            was_reset = await reset_device(device)
+            try:
+                rest = await wait_for_prompt(port, prompt_timeout)
+            except TimeoutError:
+                # without a reset the prompt may have been printed before the port was opened,
+                # the firmware still waits for the start command
+                if was_reset:
+                    raise
+                rest = b''
+            await port.write(start_command)
+            decoder = TrialStreamDecoder() if output_format == 'binary' else TrialTextDecoder()
+            events = decoder.feed(rest)
+            while True:
+                for frame_type, value in events:
+                    if frame_type == FRAME_TRIAL and on_trial is not None:
+                        on_trial(device, *value)
+                if decoder.finished:
+                    break
+                events = decoder.feed(await port.read(idle_timeout))
+            result['trials_record'] = decoder_trials_record(decoder)
+            result['error'] = None
+            break
+        except (TimeoutError, ConnectionError, OSError, RuntimeError) as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+            print(f"{device['name']}: {result['error']} (attempt {attempt + 1}/{retries + 1})")
+        except ValueError as e:
+            # a setting of the device, another attempt would not help
+            result['error'] = f"{type(e).__name__}: {e}"
+            print(f"{device['name']}: {result['error']}")
+            break
+        finally:
+            port.close()
+    result['elapsed_sec'] = time.time() - start
+    return result
+
+async def collect(devices, start_command, output_format='binary', **kwargs):
+    # one task per device, a stuck or failing board does not hold up the others
+    async def run(device):
+        result = await collect_device(device, start_command, output_format, **kwargs)
+        trials = len(result['trials_record']['usec']) if result['trials_record'] else 0
+        status = 'done' if result['error'] is None else f"failed: {result['error']}"
+        print(f"{device['name']}: {trials} trials in {round(result['elapsed_sec'], 3)} s...{status}")
+        return result
+    return await asyncio.gather(*[run(d) for d in devices])
+
+def collect_trials(devices, start_command, output_format='binary', **kwargs):
+    return asyncio.run(collect(devices, start_command, output_format, **kwargs))
+
+def print_collection(results):
+    import analysis
+    headers = ['Device', 'Port', 'Trials', 'Mean (ms)', 'Median (ms)', 'Attempts', 'Time (s)', 'Status']
+    output_list = []
+    for r in results:
+        usec = r['trials_record']['usec'] if r['trials_record'] else []
+        stats = analysis.analysis_compute_jitter(r['trials_record']) if len(usec) else None
+        output_list.append([r['name'], r['port'], len(usec), round(float(usec.mean()) / 1e3, 6) if stats else None,
+                            round(stats['p50'] / 1e3, 6) if stats else None, r['attempts'],
+                            round(r['elapsed_sec'], 3), 'ok' if r['error'] is None else r['error']])
+    print(tabulate(output_list, headers=headers))
@@ -0,0 +1,129 @@
+import os
+import glob
+import json
+
+from tabulate import tabulate
+import analysis
+from compile_cache import hash_file
+from results_db import ResultsDB, CONFIG_ENV_DEFAULTS
+from utils import NpEncoder
+
+def load_run_set(path):
+    # path: a results database (.db), a log folder or a single JSON log of save_evaluation_record / save_sweep_records
+    if path.endswith('.db'):
+        return ResultsDB(path).load_records()
+    files = sorted(glob.iglob(f'{path}/*.json')) if os.path.isdir(path) else [path]
+    records = []
+    for filepath in files:
+        with open(filepath, 'r') as f:
+            recs = json.load(f)
+        records += recs if isinstance(recs, list) else [recs]
+    return records
+
+# settings that change what a trial measures. Compile config, trial count, seed, warm-up etc. may differ between
+# the run sets, that difference is what is being compared
+MATCH_CONFIG_KEYS = ('UTOE_TIMER', 'UTOE_GRANULARITY', 'shape_dict')
+
+def measurement_settings(rec):
+    config = dict(CONFIG_ENV_DEFAULTS, **(rec.get('config') or {}))
+    return json.dumps({k: config.get(k) for k in MATCH_CONFIG_KEYS}, sort_keys=True)
+
+def record_key(rec):
+    # logs written before the results database have no model hash, see ResultsDB.import_logs
+    if 'model_hash' not in rec:
+        if not os.path.isfile(rec.get('model_path', '')):
+            return None
+        rec['model_hash'] = hash_file(rec['model_path'])
+    return (rec['model_hash'], rec['board'], measurement_settings(rec))
+
+def config_diff(baseline, candidate):
+    # {key: (baseline, candidate)} of the compile and runtime settings that differ between two matched runs
+    base, cand = baseline.get('config') or {}, candidate.get('config') or {}
+    return {k: (base.get(k), cand.get(k)) for k in sorted(set(base) | set(cand)) if base.get(k) != cand.get(k)}
+
+def index_run_set(records):
+    # latest per-model record of each (model hash, board, timer, granularity, input shape)
+    runs = {}
+    for rec in records:
+        if rec.get('mode') != 'per-model' or not rec.get('trials_record'):
+            continue
+        key = record_key(rec)
+        if key is not None and (key not in runs or rec['datetime'] > runs[key]['datetime']):
+            runs[key] = rec
+    return runs
+
+def _size_change(baseline, candidate):
+    if not baseline or candidate is None:
+        return None
+    return (candidate - baseline) / baseline
+
+def compare_records(baseline, candidate, alpha=0.05, latency_threshold=0.02, memory_threshold=0.0,
+                    storage_threshold=0.0, test='mannwhitney'):
+    latency = analysis.analysis_compare_latency(baseline['trials_record']['usec'], candidate['trials_record']['usec'])
+    p = latency['welch_p' if test == 'welch' else 'mannwhitney_p']
+    # with thousands of trials tiny changes are significant, only a change above the threshold counts
+    significant = p < alpha and abs(latency['rel_change']) > latency_threshold
+    regressions = []
+    if significant and latency['rel_change'] > 0:
+        regressions.append('latency')
+    memory_change = _size_change(baseline.get('memory'), candidate.get('memory'))
+    storage_change = _size_change(baseline.get('storage'), candidate.get('storage'))
+    if memory_change is not None and memory_change > memory_threshold:
+        regressions.append('memory')
+    if storage_change is not None and storage_change > storage_threshold:
+        regressions.append('storage')
+    if regressions:
+        verdict = 'regression'
+    elif (significant or (memory_change or 0) < -memory_threshold
+          or (storage_change or 0) < -storage_threshold):
+        verdict = 'improvement'
+    else:
+        verdict = 'unchanged'
+    return {'model_path': candidate.get('model_path'), 'board': candidate['board'],
+            'config_hash': candidate.get('config_hash'), 'config_diff': config_diff(baseline, candidate),
+            'latency': latency, 'test': test, 'p': p,
+            'memory': (baseline.get('memory'), candidate.get('memory')), 'memory_change': memory_change,
+            'storage': (baseline.get('storage'), candidate.get('storage')), 'storage_change': storage_change,
+            'regressions': regressions, 'verdict': verdict}
+
+def compare_run_sets(baseline_records, candidate_records, **kwargs):
+    baseline, candidate = index_run_set(baseline_records), index_run_set(candidate_records)
+    results = [compare_records(baseline[key], candidate[key], **kwargs)
+               for key in sorted(set(baseline) & set(candidate), key=lambda k: (str(candidate[k].get('model_path')), k))]
+    return {'results': results,
+            'missing': [baseline[k].get('model_path') or k[0] for k in set(baseline) - set(candidate)],
+            'new': [candidate[k].get('model_path') or k[0] for k in set(candidate) - set(baseline)]}
+
+def _percent(change):
+    return None if change is None else round(change * 100, 2)
+
+def print_comparison(report):
+    headers = ['Model', 'Board', 'Config', 'Base (ms)', 'Cand. (ms)', 'Change (%)', 'p',
+               "Hedges' g", "Cliff's d", 'Memory (%)', 'Storage (%)', 'Verdict']
+    output_list = []
+    for r in report['results']:
+        lat = r['latency']
+        output_list.append([os.path.basename(r['model_path'] or ''), r['board'], (r['config_hash'] or '')[:8],
+                            round(lat['baseline_mean'] / 1e3, 6), round(lat['candidate_mean'] / 1e3, 6),
+                            _percent(lat['rel_change']), float(f"{r['p']:.3g}"),
+                            round(lat['hedges_g'], 3), round(lat['cliffs_delta'], 3),
+                            _percent(r['memory_change']), _percent(r['storage_change']),
+                            r['verdict'] + (f" ({', '.join(r['regressions'])})" if r['regressions'] else '')])
+    print(tabulate(output_list, headers=headers))
+    for r in report['results']:
+        for key, (base, cand) in r['config_diff'].items():
+            print(f"Config change: {os.path.basename(r['model_path'] or '')} on {r['board']}: {key}: {base} -> {cand}")
+    for path in report['missing']:
+        print(f"Missing in candidate: {path}")
+    for path in report['new']:
+        print(f"Not in baseline: {path}")
+
+def run_compare(baseline_path, candidate_path, output=None, **kwargs):
+    report = compare_run_sets(load_run_set(baseline_path), load_run_set(candidate_path), **kwargs)
+    print_comparison(report)
+    regressions = [r for r in report['results'] if r['regressions']]
+    print(f"{len(report['results'])} compared, {len(regressions)} regressions")
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, cls=NpEncoder)
+    return report
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+CACHE_DIR = os.getenv('UTOE_CACHE_DIR', os.path.expanduser('~/.cache/u-toe'))
+CACHE_MAX_BYTES = int(os.getenv('UTOE_CACHE_MAX_MB', '2048')) * 1024 * 1024
+
+MLF_FILE = 'model.tar'
+META_FILE = 'artifact.json'
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def copy_if_changed(src, dst):
+    # keeps the mtime of an unchanged destination, so make does not rebuild what depends on it
+    if os.path.isfile(dst) and os.path.getsize(src) == os.path.getsize(dst) and hash_file(src) == hash_file(dst):
+        return False
+    shutil.copyfile(src, dst)
+    return True
+
+def _dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+class CompileCache:
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, model_path, shape_dict, target, executor, runtime, pass_context, tvm_version):
+        h = hashlib.sha256()
+        h.update(hash_file(model_path).encode())
+        h.update(json.dumps({'shape_dict': shape_dict, 'target': str(target),
+                             'executor': executor, 'runtime': runtime,
+                             'pass_context': pass_context, 'tvm': tvm_version},
+                            sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key, mlf_path=None):
+        entry = self._entry_dir(key)
+        meta_path = os.path.join(entry, META_FILE)
+        if not os.path.isfile(meta_path):
+            return None
+        with open(meta_path, 'r') as f:
+            artifact = json.load(f)
+        if mlf_path is not None:
+            tar_path = os.path.join(entry, MLF_FILE)
+            if not os.path.isfile(tar_path):
+                return None
+            copy_if_changed(tar_path, mlf_path)
+        os.utime(meta_path) # mark as recently used for LRU eviction
+        return artifact
+
+    def put(self, key, artifact, mlf_path=None):
+        entry = self._entry_dir(key)
+        tmp_entry = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            if mlf_path is not None:
+                shutil.copyfile(mlf_path, os.path.join(tmp_entry, MLF_FILE))
+            with open(os.path.join(tmp_entry, META_FILE), 'w') as f:
+                json.dump(artifact, f)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # another process stored the same entry concurrently
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, key, META_FILE)
+            if key.startswith('.') or not os.path.isfile(meta_path):
+                continue
+            entries.append({'key': key, 'last_used': os.path.getmtime(meta_path),
+                            'bytes': _dir_size(self._entry_dir(key))})
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda e: e['last_used'])
+        total = sum(e['bytes'] for e in entries)
+        while entries and total > self.max_bytes:
+            e = entries.pop(0)
+            shutil.rmtree(self._entry_dir(e['key']), ignore_errors=True)
+            total -= e['bytes']
+
+    def clear(self):
+        for e in self.entries():
+            shutil.rmtree(self._entry_dir(e['key']), ignore_errors=True)
+
+def get_compile_cache(use_cache=True):
+    return CompileCache() if use_cache else None
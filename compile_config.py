@@ -0,0 +1,67 @@
+import os
+import json
+import itertools
+
+from compile_cache import hash_file
+
+PINNED_CONFIG_PATH = os.getenv('UTOE_PINNED_CONFIGS', './pinned_configs.json')
+
+# keys understood by model_converter.get_per_model_options
+DEFAULT_SEARCH_SPACE = {
+    'opt_level': [2, 3],
+    'usmp_algorithm': ['greedy_by_size', 'greedy_by_conflicts', 'hill_climb'],
+    'workspace_byte_alignment': [4, 8, 16],
+}
+
+def load_search_space(path=None):
+    # JSON object of option -> list of values, e.g. {"usmp_algorithm": ["greedy_by_size", "hill_climb"]}
+    if path is None:
+        return dict(DEFAULT_SEARCH_SPACE)
+    with open(path, 'r') as f:
+        space = json.load(f)
+    unknown = set(space) - set(DEFAULT_SEARCH_SPACE)
+    if unknown:
+        raise ValueError(f"unknown compile options in {path}: {', '.join(sorted(unknown))}")
+    return {k: v if isinstance(v, list) else [v] for k, v in space.items()}
+
+def enumerate_configs(space):
+    keys = sorted(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+def config_name(compile_config):
+    return '_'.join(f'{v}' for _, v in sorted(compile_config.items()))
+
+def _pin_key(model_hash, board):
+    return f'{model_hash}/{board}'
+
+def load_pinned_configs(path=PINNED_CONFIG_PATH):
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _save_pinned_configs(pinned, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(pinned, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def get_pinned_config(model_path, board, path=PINNED_CONFIG_PATH):
+    pinned = load_pinned_configs(path)
+    if not pinned:
+        return None
+    entry = pinned.get(_pin_key(hash_file(model_path), board))
+    return entry['compile_config'] if entry is not None else None
+
+def pin_config(model_path, board, compile_config, path=PINNED_CONFIG_PATH, result=None):
+    pinned = load_pinned_configs(path)
+    pinned[_pin_key(hash_file(model_path), board)] = {'model_path': model_path, 'board': board,
+                                                      'compile_config': compile_config, 'result': result}
+    _save_pinned_configs(pinned, path)
+
+def unpin_config(model_path, board, path=PINNED_CONFIG_PATH):
+    pinned = load_pinned_configs(path)
+    if pinned.pop(_pin_key(hash_file(model_path), board), None) is None:
+        return False
+    _save_pinned_configs(pinned, path)
+    return True
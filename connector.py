@@ -1,8 +1,25 @@
-from riotctrl.ctrl import RIOTCtrl
 from types import MethodType
+import subprocess
+from energy import parse_iotlab_exp_id
+from iotlab_pool import IotlabPool, pool_enabled
+from tracing import span
+
+def make_riot_ctrl(env):
+    # riotctrl is only imported once a board is built or flashed
+    from riotctrl.ctrl import RIOTCtrl
+    return RIOTCtrl(application_directory='.', env=env)
+
+def set_stop_exp(ctrl, stop):
+    # run paths call stop_exp in a finally and the transport on close, the lease or experiment ends once
+    def stop_exp(self):
+        if not self.exp_stopped:
+            self.exp_stopped = True
+            stop(self)
+    ctrl.exp_stopped = False
+    ctrl.stop_exp = MethodType(stop_exp, ctrl)
 
 def get_local_controller(env, application_directory='.'):
-    ctrl =  RIOTCtrl(application_directory='.', env=env)
+    ctrl =  make_riot_ctrl(env)
     ctrl.stop_exp = MethodType(lambda self: None, ctrl)
     ctrl.cosy = MethodType(lambda self: self.make_run(['cosy']), ctrl)
     return ctrl
@@ -10,22 +27,40 @@ def get_local_controller(env, application_directory='.'):
 
 def get_fit_iotlab_controller(env, application_directory='.', iotlab_node=None):
     
-    # no node specified, create experiment automatically
-    if iotlab_node is None:
+    # no node specified, lease one from the pool of running experiments (see u-toe.py pool)
+    if iotlab_node is None and pool_enabled():
+        pool = IotlabPool()
+        with span('iotlab_pool.lease', board=env['BOARD']) as args:
+            iotlab_node, exp_id = pool.lease(env['BOARD'], job=env.get('UTOE_BUILD_DIR'))
+            args['node'] = iotlab_node
+        env['IOTLAB_NODE'] = iotlab_node
+        env['IOTLAB_EXP_ID'] = exp_id
+        ctrl = make_riot_ctrl(env)
+        set_stop_exp(ctrl, lambda self: pool.release(self.env['IOTLAB_NODE']))
+    # or create experiment automatically
+    elif iotlab_node is None:
         env['IOTLAB_NODES'] = '1'
         env['IOTLAB_DURATION'] = '10'
         env['IOTLAB_TYPE'] = '$(IOTLAB_ARCHI)'
-        ctrl = RIOTCtrl(application_directory='.', env=env)
+        ctrl = make_riot_ctrl(env)
         ctrl.FLASH_TARGETS = ('iotlab-flash',)
         ctrl.TERM_TARGETS = ('iotlab-term', )
         ctrl.RESET_TARGETS = ('iotlab-reset',)
-        ctrl.stop_exp = MethodType(lambda self: self.make_run(['iotlab-stop']), ctrl)
+        set_stop_exp(ctrl, lambda self: self.make_run(['iotlab-stop']))
         print("String FIT IoT-lab Experiment...")
-        ctrl.make_run(['elffile', 'binfile', 'hexfile', 'iotlab-exp',])
+        # submits, waits for the node and flashes it
+        with span('iotlab_experiment', board=env['BOARD']):
+            output = ctrl.make_run(['elffile', 'binfile', 'hexfile', 'iotlab-exp',],
+                                   stdout=subprocess.PIPE, universal_newlines=True).stdout
+        print(output)
+        # the id locates the consumption traces of the experiment, see energy.fetch_iotlab_consumption
+        exp_id = parse_iotlab_exp_id(output)
+        if exp_id is not None:
+            ctrl.env['IOTLAB_EXP_ID'] = exp_id
         print("String FIT IoT-lab Experiment...done")
     else:
         env['IOTLAB_NODE'] = iotlab_node
-        ctrl = RIOTCtrl(application_directory='.', env=env)
+        ctrl = make_riot_ctrl(env)
         ctrl.stop_exp = MethodType(lambda self: None, ctrl)
     return ctrl
 
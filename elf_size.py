@@ -0,0 +1,191 @@
+import os
+import re
+import bisect
+import struct
+
+SHT_NOBITS = 8
+SHT_SYMTAB = 2
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+STT_OBJECT = 1
+STT_FUNC = 2
+
+# static libraries of utvm_runtime, see utvm_runtime/Makefile
+TVM_RUNTIME_ARCHIVES = ('libcommon', 'libmemory', 'libaot_executor', 'libaot_executor_module',
+                        'libgraph_executor', 'libgraph_executor_module',
+                        'libmicrotvm_rpc_common', 'libmicrotvm_rpc_server')
+
+# checked in order, before the module of the symbol
+SYMBOL_CATEGORIES = [
+    ('model_io', re.compile(r'^(input|output)$')),             # model_io_vars.h
+    ('tvm_workspace', re.compile(r'workspace|_pool$|^g_aot_memory$|^g_crt_workspace$')),
+    ('tvm_params', re.compile(r'constant|__tvm_param__|_params?_\d*$')),
+    ('riot_kernel', re.compile(r'^(_?isr_stack|main_stack|idle_stack|sched_\w+|_?thread_\w+|kernel_init)$')),
+]
+
+def _unpack(fmt, data, offset):
+    return struct.unpack_from(fmt, data, offset)
+
+def read_elf(path):
+    # section headers and symbol table of an ELF32/ELF64 file, little or big endian
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != b'\x7fELF':
+        raise ValueError(f"{path} is not an ELF file")
+    is64 = data[4] == 2
+    e = '<' if data[5] == 1 else '>'
+    if is64:
+        shoff, = _unpack(e + 'Q', data, 0x28)
+        shentsize, shnum, shstrndx = _unpack(e + 'HHH', data, 0x3A)
+        sh_fmt, sym_fmt = e + 'IIQQQQIIQQ', e + 'IBBHQQ'
+    else:
+        shoff, = _unpack(e + 'I', data, 0x20)
+        shentsize, shnum, shstrndx = _unpack(e + 'HHH', data, 0x2E)
+        sh_fmt, sym_fmt = e + 'IIIIIIIIII', e + 'IIIBBH'
+
+    headers = [_unpack(sh_fmt, data, shoff + i * shentsize) for i in range(shnum)]
+    def c_str(table_offset, index):
+        start = table_offset + index
+        return data[start:data.index(b'\0', start)].decode(errors='replace')
+
+    shstr_offset = headers[shstrndx][4]
+    sections = [{'name': c_str(shstr_offset, h[0]), 'type': h[1], 'flags': h[2], 'addr': h[3],
+                 'offset': h[4], 'size': h[5], 'link': h[6], 'entsize': h[9]} for h in headers]
+
+    symbols = []
+    for sec in sections:
+        if sec['type'] != SHT_SYMTAB:
+            continue
+        str_offset = sections[sec['link']]['offset']
+        for i in range(1, sec['size'] // sec['entsize']):
+            fields = _unpack(sym_fmt, data, sec['offset'] + i * sec['entsize'])
+            if is64:
+                name, info, _, shndx, value, size = fields
+            else:
+                name, value, size, info, _, shndx = fields
+            if size == 0 or shndx == 0 or shndx >= len(sections) or (info & 0xf) not in (STT_OBJECT, STT_FUNC):
+                continue
+            symbols.append({'name': c_str(str_offset, name), 'addr': value, 'size': size,
+                            'type': info & 0xf, 'section': sections[shndx]['name'],
+                            'shndx': shndx})
+    return sections, symbols
+
+def section_kind(sec):
+    # same split as the berkeley format of `size`, which info-buildsize prints
+    if not sec['flags'] & SHF_ALLOC:
+        return None
+    if sec['type'] == SHT_NOBITS:
+        return 'bss'
+    if sec['flags'] & SHF_WRITE and not sec['flags'] & SHF_EXECINSTR:
+        return 'data'
+    return 'text'
+
+def section_sizes(sections):
+    sizes = {'text': 0, 'data': 0, 'bss': 0}
+    for sec in sections:
+        kind = section_kind(sec)
+        if kind is not None:
+            sizes[kind] += sec['size']
+    return sizes
+
+def read_map_objects(map_path):
+    # (start, end, object) of every input section placed by the linker, from a GNU ld map file
+    regions = []
+    pending = None
+    one_line = re.compile(r'^ (\.\S+)\s+0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)\s+(\S.*)$')
+    continued = re.compile(r'^\s+0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)\s+(\S.*)$')
+    with open(map_path, 'r', errors='replace') as f:
+        for line in f:
+            m = one_line.match(line)
+            if m is None and pending is not None:
+                m = continued.match(line)
+                groups = m.groups() if m is not None else None
+            else:
+                groups = m.groups()[1:] if m is not None else None
+            pending = line.strip() if line.startswith(' .') and len(line.split()) == 1 else None
+            if groups is None:
+                continue
+            start, size, obj = int(groups[0], 16), int(groups[1], 16), groups[2].strip()
+            if size > 0 and start > 0:
+                regions.append((start, start + size, obj))
+    regions.sort()
+    return regions
+
+def object_module(obj, model_names=('default',)):
+    m = re.match(r'(.*?)([^/]+)\.a\(', obj)
+    if m is not None:
+        archive = m.group(2)
+        return 'tvm_runtime' if archive in TVM_RUNTIME_ARCHIVES else 'toolchain'
+    module = os.path.basename(os.path.dirname(obj))
+    if module in model_names:
+        return 'tvm_ops'
+    if module == 'core' or module.startswith('core_'):
+        return 'riot_kernel'
+    if module.startswith('application_'):
+        return 'application'
+    return 'riot'
+
+def classify_symbol(sym, regions=None, model_names=('default',)):
+    for category, pattern in SYMBOL_CATEGORIES:
+        if pattern.search(sym['name']):
+            return category
+    if regions:
+        # thumb functions have bit 0 set
+        addr = sym['addr'] & ~1 if sym['type'] == STT_FUNC else sym['addr']
+        i = bisect.bisect_right(regions, (addr, float('inf'), '')) - 1
+        if i >= 0 and regions[i][0] <= addr < regions[i][1]:
+            return object_module(regions[i][2], model_names)
+    if sym['name'].startswith('tvmgen_'):
+        return 'tvm_ops'
+    if sym['name'].startswith(('TVM', 'tvm_', 'MemoryManager', 'PageAllocator', 'MicroTVM', 'utvm_')):
+        return 'tvm_runtime'
+    return 'other'
+
+def analyze_elf(elf_path, map_path=None, model_names=('default',), top=20):
+    sections, symbols = read_elf(elf_path)
+    sizes = section_sizes(sections)
+    regions = read_map_objects(map_path) if map_path is not None and os.path.isfile(map_path) else None
+
+    breakdown = {}
+    per_model = {}
+    attributed = {'ram': 0, 'flash': 0}
+    seen = set()
+    sym_list = []
+    for sym in symbols:
+        # aliases share one address
+        if (sym['addr'], sym['shndx']) in seen:
+            continue
+        seen.add((sym['addr'], sym['shndx']))
+        kind = section_kind(sections[sym['shndx']])
+        if kind is None:
+            continue
+        ram = sym['size'] if kind in ('data', 'bss') else 0
+        flash = sym['size'] if kind in ('text', 'data') else 0
+        category = classify_symbol(sym, regions, model_names)
+        entry = breakdown.setdefault(category, {'ram': 0, 'flash': 0, 'symbols': 0})
+        entry['ram'] += ram
+        entry['flash'] += flash
+        entry['symbols'] += 1
+        attributed['ram'] += ram
+        attributed['flash'] += flash
+        sym_list.append({'name': sym['name'], 'category': category, 'section': sym['section'],
+                         'ram': ram, 'flash': flash})
+        # share of each model of a multi-model image, by the tvmgen_<mod_name>_ prefix
+        for name in model_names:
+            if sym['name'].startswith(f'tvmgen_{name}_'):
+                entry = per_model.setdefault(name, {'ram': 0, 'flash': 0})
+                entry['ram'] += ram
+                entry['flash'] += flash
+
+    memory = sizes['data'] + sizes['bss']
+    storage = sizes['text'] + sizes['data']
+    # alignment padding, literal pools and symbols without size information
+    breakdown['unattributed'] = {'ram': memory - attributed['ram'], 'flash': storage - attributed['flash'],
+                                 'symbols': 0}
+    sym_list.sort(key=lambda s: s['ram'] + s['flash'], reverse=True)
+    return {'sections': sizes, 'memory': memory, 'storage': storage,
+            'breakdown': breakdown, 'models': per_model, 'top_symbols': sym_list[:top]}
+
+def get_elf_path(board, build_dir='.', application='U-TOE'):
+    return os.path.join(build_dir, 'bin', board, f'{application}.elf')
@@ -0,0 +1,182 @@
+import os
+import re
+import csv
+import subprocess
+
+import numpy as np
+from tabulate import tabulate
+
+import analysis
+
+# IoT-LAB monitoring profile with power measurement, created once per account (see README)
+IOTLAB_PROFILE = os.getenv('UTOE_IOTLAB_PROFILE', 'utoe_energy')
+# idle time before each trial, so the trials show up as separate active windows in the trace
+DEFAULT_TRIAL_GAP_MS = 20
+
+CSV_TIME_COLUMNS = ('time', 'time_s', 'timestamp', 't')
+CSV_POWER_COLUMNS = ('power', 'power_w', 'p')
+CSV_CURRENT_COLUMNS = ('current', 'current_a', 'i')
+CSV_VOLTAGE_COLUMNS = ('voltage', 'voltage_v', 'v')
+
+def read_oml_trace(path):
+    # IoT-LAB consumption file: text OML header, then one tab separated row per sample
+    columns = None
+    times, power = [], []
+    with open(path, 'r') as f:
+        for line in f:
+            if columns is None:
+                if line.startswith('schema:') and 'consumption' in line:
+                    # schema: 1 control_node_measures_consumption timestamp_s:uint32 timestamp_us:uint32 power:double ...
+                    columns = [c.split(':')[0] for c in line.split()[3:]]
+                continue
+            fields = line.split('\t')
+            # the first three fields are the OML timestamp, schema id and sequence number
+            if len(fields) < len(columns) + 3:
+                continue
+            row = dict(zip(columns, fields[3:]))
+            times.append(int(row['timestamp_s']) + int(row['timestamp_us']) / 1e6)
+            power.append(float(row['power']))
+    if columns is None:
+        raise ValueError(f"{path} has no consumption schema")
+    return np.array(times), np.array(power)
+
+def _find_column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+def read_csv_trace(path, voltage=None):
+    # power analyzer export: a time column in seconds and power in W, or current in A with a voltage
+    # column or a fixed supply voltage
+    with open(path, 'r', newline='') as f:
+        rows = list(csv.reader(f))
+    header = [h.strip().lower() for h in rows[0]]
+    t_col = _find_column(header, CSV_TIME_COLUMNS)
+    p_col = _find_column(header, CSV_POWER_COLUMNS)
+    i_col = _find_column(header, CSV_CURRENT_COLUMNS)
+    v_col = _find_column(header, CSV_VOLTAGE_COLUMNS)
+    if t_col is None or (p_col is None and (i_col is None or (v_col is None and voltage is None))):
+        raise ValueError(f"{path}: need a time column and a power column, or current and voltage")
+    data = np.array([[float(x) for x in r] for r in rows[1:] if r], dtype=np.float64)
+    if p_col is not None:
+        power = data[:, p_col]
+    else:
+        power = data[:, i_col] * (data[:, v_col] if v_col is not None else voltage)
+    return data[:, t_col], power
+
+def load_power_trace(path, voltage=None):
+    if path.endswith('.oml'):
+        return read_oml_trace(path)
+    return read_csv_trace(path, voltage)
+
+def detect_active_windows(t, power, threshold=None):
+    # (start, end) of every run of samples above the midpoint between the idle and the active level
+    idle, active = np.percentile(power, [10, 90])
+    if threshold is None:
+        if active - idle <= 0.05 * max(abs(active), 1e-12):
+            raise ValueError("no active windows in the power trace, the runs need a trial gap")
+        threshold = idle + (active - idle) / 2
+    above = np.concatenate(([False], power > threshold, [False]))
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2] - 1
+    # a window ends where the next sample would have started
+    period = np.median(np.diff(t)) if t.size > 1 else 0.0
+    windows = np.stack([t[starts], t[ends] + period], axis=1) if starts.size else np.empty((0, 2))
+    return windows, threshold
+
+def align_trials(windows, durations):
+    # index of the first window of the trials: the offset whose window lengths fit the measured trial
+    # durations best. Warm-up runs come before, the burst and the output after the trials. Each window
+    # also holds the output of its trial, which only shifts all ratios alike.
+    n = len(durations)
+    if len(windows) < n:
+        raise ValueError(f"{len(windows)} active windows for {n} trials, increase the trial gap or the sample rate")
+    lengths = windows[:, 1] - windows[:, 0]
+    log_d = np.log(np.maximum(durations, 1e-9))
+    costs = [np.abs(np.log(np.maximum(lengths[k:k + n], 1e-9)) - log_d).sum() for k in range(len(windows) - n + 1)]
+    return int(np.argmin(costs))
+
+def integrate_energy(t, power, start, duration):
+    # trapezoid integral of the power over [start, start + duration], in J
+    end = start + duration
+    mask = (t >= start) & (t <= end)
+    ts = np.concatenate(([start], t[mask], [end]))
+    ps = np.interp(ts, t, power)
+    return np.trapezoid(ps, ts) if hasattr(np, 'trapezoid') else np.trapz(ps, ts)
+
+def analyze_energy(t, power, trials_usec, burst=None):
+    # energy per inference from the samples inside each trial, and from the burst if there is one.
+    # dynamic energy is what the inference adds on top of the idle power of the board.
+    windows, threshold = detect_active_windows(t, power)
+    durations = np.asarray(trials_usec, dtype=np.float64) / 1e6
+    first = align_trials(windows, durations)
+    idle_power = np.median(power[power <= threshold])
+    energy = np.array([integrate_energy(t, power, windows[first + k][0], d) for k, d in enumerate(durations)])
+    period = np.median(np.diff(t))
+    result = {'idle_power_w': idle_power, 'sample_period_usec': period * 1e6, 'threshold_w': threshold,
+              'trial_windows': windows[first:first + len(durations)],
+              'energy_uj': energy * 1e6, 'dynamic_energy_uj': (energy - idle_power * durations) * 1e6,
+              'energy_stats_in_uj': analysis.analysis_compute_energy(energy * 1e6),
+              'dynamic_energy_stats_in_uj': analysis.analysis_compute_energy((energy - idle_power * durations) * 1e6),
+              'burst': None}
+    if np.median(durations) < 4 * period:
+        print(f"Trials are shorter than 4 power samples ({round(period * 1e6)} us), use a burst for the energy")
+    if burst:
+        # the burst is the window after the trials closest to its measured length
+        burst_sec = burst['usec'] / 1e6
+        after = windows[first + len(durations):]
+        if len(after):
+            start = after[np.argmin(np.abs(after[:, 1] - after[:, 0] - burst_sec))][0]
+            burst_energy = integrate_energy(t, power, start, burst_sec)
+            result['burst'] = {'energy_per_inference_uj': burst_energy / burst['count'] * 1e6,
+                               'dynamic_energy_per_inference_uj':
+                                   (burst_energy - idle_power * burst_sec) / burst['count'] * 1e6,
+                               'mean_power_w': burst_energy / burst_sec}
+    return result
+
+def energy_from_record(rec, trace_path, voltage=None):
+    # also used offline on a saved record, see u-toe.py energy
+    t, power = load_power_trace(trace_path, voltage)
+    throughput = rec.get('throughput')
+    burst = {'count': throughput['inferences'], 'usec': throughput['usec']} if throughput else None
+    result = analyze_energy(t, power, rec['trials_record']['usec'], burst)
+    result['trace'] = trace_path
+    return result
+
+def print_energy_summary(rec):
+    energy = rec.get('energy')
+    if not energy:
+        return
+    stats, dynamic = energy['energy_stats_in_uj'], energy['dynamic_energy_stats_in_uj']
+    output_list = [['Energy / inference (uJ)', round(stats['mean'], 3), [float(round(x, 3)) for x in stats['95ci']],
+                    round(stats['median'], 3)],
+                   ['Above idle (uJ)', round(dynamic['mean'], 3), [float(round(x, 3)) for x in dynamic['95ci']],
+                    round(dynamic['median'], 3)]]
+    if energy['burst']:
+        output_list.append(['Sustained (uJ)', round(energy['burst']['energy_per_inference_uj'], 3), None, None])
+    print(tabulate(output_list, headers=['Energy', 'Mean', '95-CI', 'Median']))
+    print(f"Idle power: {round(energy['idle_power_w'] * 1e3, 3)} mW, "
+          f"sample period: {round(energy['sample_period_usec'])} us")
+
+def parse_iotlab_exp_id(output):
+    m = re.search(r'"id":\s*(\d+)|[Ee]xperiment (\d+)', output)
+    return (m.group(1) or m.group(2)) if m is not None else None
+
+def get_iotlab_exp_nodes(exp_id):
+    output = subprocess.check_output(['iotlab-experiment', 'get', '-i', str(exp_id), '-r']).decode()
+    return re.findall(r'"network_address":\s*"([^"]+)"', output)
+
+def iotlab_user():
+    # first field of the credentials written by iotlab-auth
+    with open(os.path.expanduser('~/.iotlabrc'), 'r') as f:
+        return f.read().split(':')[0].strip()
+
+def fetch_iotlab_consumption(exp_id, node, dest_dir='./logs', user=None):
+    # node: network address, e.g. m3-10.grenoble.iot-lab.info; the file shows up once the experiment ended
+    name, site = node.split('.')[:2]
+    os.makedirs(dest_dir, exist_ok=True)
+    dest = os.path.join(dest_dir, f"consumption_{exp_id}_{name.replace('-', '_')}.oml")
+    subprocess.check_call(['scp', f"{user or iotlab_user()}@{site}.iot-lab.info:"
+                                  f".iot-lab/{exp_id}/consumption/{name.replace('-', '_')}.oml", dest])
+    return dest
@@ -1,274 +1,466 @@
-from riotctrl.ctrl import RIOTCtrl
-import re
 import analysis
-from tabulate import tabulate
 from datetime import datetime
 from connector import get_local_controller, get_fit_iotlab_controller
 import json
-from model_converter import load_model, compile_per_model_eval, load_from_tflite, compile_per_ops_eval
-from utils import generate_model_io_vars_header, extract_io_vars_from_module, _shape_to_size
-from microtvm_transport import UTOETransport
-import tvm
-from functools import reduce
-
-LOG_DIR = './logs'
+import os
+import time
+from compile_cache import get_compile_cache, hash_file, copy_if_changed
+from compile_config import get_pinned_config
+from results_db import ResultsDB, make_evaluation_config, get_config_hash
+from elf_size import analyze_elf, get_elf_path
+from incremental_build import (firmware_up_to_date, seed_build_dir, write_build_stamp, update_build_base,
+                               model_names)
+from utils import generate_model_io_vars_header, NpEncoder
+from aot_profiler import instrument_aot_mlf, parse_aot_profile
+from memory_timeline import compute_memory_timeline, op_live_memory, print_memory_timeline
+from per_ops import index_graph, parse_per_ops_result
+from energy import (energy_from_record, print_energy_summary, fetch_iotlab_consumption, get_iotlab_exp_nodes,
+                    IOTLAB_PROFILE, DEFAULT_TRIAL_GAP_MS)
+from trial_protocol import (read_trial_stream, parse_per_model_output, make_start_command, CMD_NEXT, CMD_QUIT)
+from tracing import span
+from report import (print_memory_analysis, print_per_model_evaluation, print_benchmark_summary,
+                    load_logs_from_folder, print_per_ops_evaluation, LOG_DIR)
+
+# TVM (model_converter, microtvm_transport) is imported by the functions that compile or talk to a model
+
+DEFAULT_BUILD_DIR = '.'
+OUTPUT_FORMATS = {'text': '0', 'binary': '1'}
 
 def evaluate_per_model(model_path, board='stm32f746g-disco', trials_num=10, use_iotlab=False,
                        iotlab_node=None, random_seed=42,
-                       shape_dict=None):
+                       shape_dict=None, use_cache=True, build_dir=DEFAULT_BUILD_DIR, output_format=None,
+                       early_stopping=None, timer=None, compile_config=None, warmup=0, burst=0, input_sets=None,
+                       energy=None, baudrate=None):
+    # energy: {'trace': power trace file or None for the IoT-LAB consumption file, 'voltage': ..., 'gap_ms': ...}
+    if compile_config is None:
+        compile_config = get_pinned_config(model_path, board)
+        if compile_config is not None:
+            print(f"Using pinned compile config: {compile_config}")
     print("Load Model and Code Gen...")
-    mod, params = load_model(model_path, shape_dict)
-    moudle = compile_per_model_eval(mod, params, board, './models/default/default.tar')
-    input_vars, output_vars = extract_io_vars_from_module(moudle)
-    generate_model_io_vars_header(input_vars=input_vars, output_vars=output_vars)
+    codegen_per_model(model_path, board, build_dir, shape_dict, use_cache, compile_config)
     print("Load Model and Code Gen...done")
 
-    env = {'BOARD': board, 'UTOE_TRIAL_NUM': str(trials_num), 'UTOE_RANDOM_SEED': str(random_seed)}
+    output_format = output_format or default_output_format(use_iotlab or iotlab_node is not None)
+    env = make_per_model_env(board, build_dir, trials_num, random_seed, output_format, early_stopping, timer,
+                             warmup, burst, input_sets,
+                             energy.get('gap_ms', DEFAULT_TRIAL_GAP_MS) if energy is not None else 0, baudrate)
+    if energy is not None and (use_iotlab or iotlab_node is not None):
+        env['IOTLAB_PROFILE'] = IOTLAB_PROFILE
     print('Compile and Flashing...')
+    riot_ctrl = get_flashed_controller(env, use_iotlab, iotlab_node)
+    print('Compile and Flashing...done')
+
+    trials_record = run_per_model_trials(riot_ctrl, output_format, early_stopping)
+    evaluation_record = make_per_model_record(model_path, env, random_seed, trials_record, compile_config, shape_dict)
+    if energy is not None:
+        evaluation_record['energy'] = measure_energy(riot_ctrl.env, evaluation_record, energy)
+
+    print_per_model_evaluation(evaluation_record.copy())
+    print_benchmark_summary(evaluation_record)
+    print_energy_summary(evaluation_record)
+    save_evaluation_record(evaluation_record)
+    ResultsDB().insert(evaluation_record)
+    return evaluation_record
+
+def prepare_build_dir(build_dir, mod_name='default'):
+    if os.path.abspath(build_dir) == os.path.abspath(DEFAULT_BUILD_DIR) and mod_name == 'default':
+        return
+    pkg_dir = os.path.join(build_dir, 'models', mod_name)
+    os.makedirs(pkg_dir, exist_ok=True)
+    for f in ('Makefile', 'Makefile.include'):
+        copy_if_changed(os.path.join(DEFAULT_BUILD_DIR, 'models', 'default', f), os.path.join(pkg_dir, f))
 
+def get_mlf_path(build_dir, mod_name='default'):
+    return os.path.join(build_dir, 'models', mod_name, f'{mod_name}.tar')
+
+def get_mlf_paths(env):
+    build_dir = get_build_dir(env)
+    return [get_mlf_path(build_dir, name) for name in model_names(env)]
+
+def make_build_env(board, build_dir=DEFAULT_BUILD_DIR, extra=None):
+    env = {'BOARD': board}
+    if os.path.abspath(build_dir) != os.path.abspath(DEFAULT_BUILD_DIR):
+        env['UTOE_BUILD_DIR'] = os.path.abspath(build_dir)
+    env.update(extra or {})
+    return env
+
+def make_per_model_env(board, build_dir=DEFAULT_BUILD_DIR, trials_num=10, random_seed=42, output_format='text',
+                       early_stopping=None, timer=None, warmup=0, burst=0, input_sets=None, trial_gap_ms=0,
+                       baudrate=None):
+    if early_stopping is not None:
+        if output_format != 'binary':
+            raise ValueError("early stopping needs the binary output format")
+        trials_num = 0 # the host stops the trials
+    env = make_build_env(board, build_dir, {'UTOE_TRIAL_NUM': str(trials_num), 'UTOE_RANDOM_SEED': str(random_seed),
+                                            'UTOE_OUTPUT_FORMAT': OUTPUT_FORMATS[output_format]})
+    if timer is not None:
+        env['UTOE_TIMER'] = timer
+    # left out at their defaults, so older results keep their config hash
+    if warmup:
+        env['UTOE_WARMUP'] = str(warmup)
+    if burst:
+        env['UTOE_BURST'] = str(burst)
+    if input_sets is not None:
+        env['UTOE_INPUT_SETS'] = str(input_sets)
+    if trial_gap_ms:
+        env['UTOE_TRIAL_GAP_MS'] = str(trial_gap_ms)
+    if baudrate is not None:
+        env['UTOE_BAUDRATE'] = str(baudrate)
+    return env
+
+def codegen_per_model(model_path, board, build_dir=DEFAULT_BUILD_DIR, shape_dict=None, use_cache=True,
+                      compile_config=None):
+    from model_converter import compile_model
+    prepare_build_dir(build_dir)
+    with span('codegen', model=model_path, board=board):
+        artifact = compile_model(model_path, board, 'per-model', get_mlf_path(build_dir),
+                                 shape_dict, cache=get_compile_cache(use_cache), compile_config=compile_config)
+    generate_model_io_vars_header(input_vars=artifact['input_vars'], output_vars=artifact['output_vars'],
+                                  output_path=os.path.join(build_dir, 'model_io_vars.h'))
+    return artifact
+
+def get_build_dir(env):
+    return env.get('UTOE_BUILD_DIR', DEFAULT_BUILD_DIR)
+
+def build_firmware(env):
+    # rebuilds only when the model package, model_io_vars.h, the build flags or the sources changed
+    build_dir = get_build_dir(env)
+    mlf_paths = get_mlf_paths(env)
+    with span('riot_build', board=env['BOARD'], build_dir=build_dir) as args:
+        if firmware_up_to_date(env, build_dir, mlf_paths):
+            print("Firmware up to date, skipping build")
+            args['skipped'] = True
+            return False
+        if seed_build_dir(env, build_dir):
+            print("Reusing prebuilt RIOT and runtime objects")
+            args['seeded'] = True
+        get_local_controller(env).make_run(['all'])
+        write_build_stamp(env, build_dir, mlf_paths)
+        update_build_base(env, build_dir)
+    return True
+
+def get_flashed_controller(env, use_iotlab=False, iotlab_node=None):
+    build_firmware(env)
     if use_iotlab or iotlab_node is not None:
         riot_ctrl = get_fit_iotlab_controller(env, iotlab_node=iotlab_node)
-        if iotlab_node is not None:
-            riot_ctrl.flash(stdout=None)
+        # given or leased node of a running experiment, an automatic experiment flashed on submit
+        if 'IOTLAB_NODE' in riot_ctrl.env:
+            try:
+                with span('flash', board=env['BOARD'], node=riot_ctrl.env['IOTLAB_NODE']):
+                    riot_ctrl.flash(stdout=None)
+            except Exception:
+                # hands a leased node back to the pool
+                riot_ctrl.stop_exp()
+                raise
     else:
         riot_ctrl = get_local_controller(env)
-        riot_ctrl.flash(stdout=None, stderr=None)
+        riot_ctrl.FLASH_TARGETS = ('flash-only',) # built above
+        with span('flash', board=env['BOARD'], port=env.get('PORT')):
+            riot_ctrl.flash(stdout=None, stderr=None)
+    return riot_ctrl
+
+def default_output_format(use_iotlab):
+    # binary records are read straight from the local serial port,
+    # IoT-LAB nodes are reached through the text terminal
+    return 'text' if use_iotlab else 'binary'
+
+def run_per_model_trials(riot_ctrl, output_format='text', early_stopping=None):
+    with span('measure', board=riot_ctrl.env['BOARD'], output_format=output_format) as args:
+        if output_format == 'binary':
+            trials_record = run_per_model_trials_binary(riot_ctrl, early_stopping=early_stopping)
+        elif is_iotlab_controller(riot_ctrl):
+            trials_record = parse_per_model_output(run_per_model_trials_text(riot_ctrl))
+        else:
+            trials_record = collect_per_model_trials_text(riot_ctrl)
+        args['trials'] = len(trials_record['usec'])
+        if args['trials'] == 0:
+            # e.g. UTOE_MODEL_INDEX out of range of a multi-model image
+            raise RuntimeError(f"{riot_ctrl.env['BOARD']}: the firmware ended the run without trials")
+    return trials_record
+
+def get_start_command(env):
+    # trial count, seed, warm-up and burst length are runtime parameters of the firmware
+    trials_num = env.get('UTOE_TRIAL_NUM', env.get('UTOE_PROF_REPEAT'))
+    return make_start_command(trials_num, env.get('UTOE_RANDOM_SEED'), env.get('UTOE_MODEL_INDEX'),
+                              env.get('UTOE_WARMUP'), env.get('UTOE_BURST'), env.get('UTOE_TRIAL_GAP_MS'))
+
+def read_binary_stream(riot_ctrl, baudrate=None, idle_timeout=10.0, on_trial=None):
+    try:
+        import serial
+        from microtvm_transport import get_local_serial_port, get_baudrate
+        baudrate = baudrate or get_baudrate(riot_ctrl.env)
+        port = riot_ctrl.env.get('PORT') or get_local_serial_port()
+        with serial.Serial(port, baudrate=baudrate, timeout=5) as ser:
+            riot_ctrl.reset()
+            ser.read_until(b'start >')
+            ser.write(get_start_command(riot_ctrl.env))
+            with span('serial_read', port=port, baudrate=baudrate) as args:
+                decoder = read_trial_stream(ser, idle_timeout=idle_timeout, on_trial=on_trial)
+                args['crc_errors'] = decoder.crc_errors
+    finally:
+        # also on a timeout or a serial error, the experiment or the node lease must not outlive the run
+        riot_ctrl.stop_exp()
+    if decoder.crc_errors:
+        print(f"Dropped {decoder.crc_errors} corrupted frames")
+    return decoder
+
+def run_per_model_trials_binary(riot_ctrl, baudrate=None, idle_timeout=10.0, early_stopping=None):
+    # early_stopping: dict of analysis.EarlyStopping arguments, the firmware must be started with UTOE_TRIAL_NUM=0
+    on_trial = None
+    if early_stopping is not None:
+        stats = analysis.StreamingLatencyStats()
+        stopping = analysis.EarlyStopping(**early_stopping)
+        start_time = time.time()
+        def on_trial(trial, elapsed, ret):
+            stats.update(elapsed)
+            return CMD_QUIT if stopping.should_stop(stats, time.time() - start_time) else CMD_NEXT
+
+    decoder = read_binary_stream(riot_ctrl, baudrate, idle_timeout, on_trial)
+    trials_record = decoder.results()
+    trials_record['warmup'] = decoder.warmup_results()
+    trials_record['burst'] = decoder.burst()
+    if early_stopping is not None:
+        trials_record['early_stopping'] = {'reason': stopping.reason, 'trials': stats.n,
+                                           'relative_precision': stats.relative_precision(),
+                                           'target': early_stopping}
+        print(f"Stopped after {stats.n} trials: {stopping.reason}, "
+              f"relative CI half-width {round(stats.relative_precision() * 100, 3)} %")
+    return trials_record
+
+def is_iotlab_controller(riot_ctrl):
+    return 'IOTLAB_NODE' in riot_ctrl.env or 'IOTLAB_NODES' in riot_ctrl.env
+
+def collect_per_model_trials_text(riot_ctrl):
+    # boards on a local serial port are read by the asyncio collector instead of the pexpect terminal
+    from collector import collect_trials
+    from microtvm_transport import get_local_serial_port, get_baudrate
+    device = {'name': riot_ctrl.env['BOARD'], 'port': riot_ctrl.env.get('PORT') or get_local_serial_port(),
+              'baudrate': get_baudrate(riot_ctrl.env), 'reset': riot_ctrl.reset}
+    try:
+        with span('terminal_wait', board=riot_ctrl.env['BOARD'], port=device['port']) as args:
+            result = collect_trials([device], get_start_command(riot_ctrl.env), 'text')[0]
+            args['retries'] = result['attempts'] - 1
+    finally:
+        riot_ctrl.stop_exp()
+    if result['error'] is not None:
+        raise RuntimeError(f"{riot_ctrl.env['BOARD']}: {result['error']}")
+    return result['trials_record']
 
-    print('Compile and Flashing...done')
+def run_per_model_trials_text(riot_ctrl):
     term_retry_times = 2
-    with riot_ctrl.run_term(reset=True): #reset should be false for risc v
-        while term_retry_times > 0 :
-            try:
-                # riot_ctrl.term.expect_exact('start >')
-                riot_ctrl.term.sendline('s')
-                riot_ctrl.term.expect_exact('finished >',timeout=25)
-                break
-            except:
-                print("Exception Occured, term buffer:")
-                print(riot_ctrl.term.before)
-                term_retry_times -= 1
-                print("Retrying...")
-        raw_output = riot_ctrl.term.before
+    try:
+        with riot_ctrl.run_term(reset=True): #reset should be false for risc v
+            with span('terminal_wait', board=riot_ctrl.env['BOARD']) as args:
+                while term_retry_times > 0 :
+                    try:
+                        # riot_ctrl.term.expect_exact('start >')
+                        riot_ctrl.term.sendline(get_start_command(riot_ctrl.env).decode().strip())
+                        riot_ctrl.term.expect_exact('finished >',timeout=25)
+                        break
+                    except:
+                        print("Exception Occured, term buffer:")
+                        print(riot_ctrl.term.before)
+                        term_retry_times -= 1
+                        print("Retrying...")
+                raw_output = riot_ctrl.term.before
+                args['retries'] = 2 - term_retry_times
+                args['bytes'] = len(raw_output)
+    finally:
+        # also when the terminal does not start, a leased node is handed back to the pool
         riot_ctrl.stop_exp()
+    return raw_output
+
+def make_per_model_record(model_path, env, random_seed, trials_record, compile_config=None, shape_dict=None):
+    with span('postprocess', board=env['BOARD'], model=model_path, profile=True):
+        return _make_per_model_record(model_path, env, random_seed, trials_record, compile_config, shape_dict)
 
+def _make_per_model_record(model_path, env, random_seed, trials_record, compile_config=None, shape_dict=None):
     evaluation_record = {'board' : env['BOARD'], 'datetime': datetime.now().strftime("%Y%m%d-%H%M%S"),
                          'memory': 0, 'storage': 0,
                          'trials_record': None, 'trials_stats': None,
                          'model_path': model_path, 'random_seed': random_seed, 'mode': 'per-model'}
 
-    evaluation_record['trials_record'] = parse_per_model_output(raw_output)
+    evaluation_record['early_stopping'] = trials_record.pop('early_stopping', None)
+    evaluation_record['model_hash'] = hash_file(model_path)
+    evaluation_record['config'] = make_evaluation_config(
+        env, evaluation_record['early_stopping']['target'] if evaluation_record['early_stopping'] else None,
+        compile_config, shape_dict)
+    evaluation_record['config_hash'] = get_config_hash(evaluation_record['config'])
+    evaluation_record['timer'] = trials_record.pop('timer', None)
+    warmup_record = trials_record.pop('warmup', None)
+    burst = trials_record.pop('burst', None)
+    evaluation_record['trials_record'] = trials_record
     evaluation_record['trials_stats_in_usec'] = analysis.analysis_compute_latency(evaluation_record['trials_record'])
+    evaluation_record['jitter_stats_in_usec'] = analysis.analysis_compute_jitter(trials_record)
+    # warm-up runs are kept apart from the statistics, the first one is the cold start
+    evaluation_record['warmup_record'] = warmup_record
+    evaluation_record['cold_start_usec'] = warmup_record['usec'][0] if warmup_record else None
+    evaluation_record['throughput'] = analysis.analysis_compute_throughput(burst)
     
-    memory, storage = get_memory_storage_from_buildsize(board)
-    evaluation_record['memory'] = memory
-    evaluation_record['storage'] = storage
-    
-    print_per_model_evaluation(evaluation_record.copy())
-    save_evaluation_record(evaluation_record)
-
-def parse_per_model_output(raw_output : str):
-    pattern = re.compile('trial: ([0-9]+), usec: ([0-9]+), ret: ([0-9]+)')
-    results_list = pattern.findall(raw_output)
-    return { 'trial' : [int(x[0]) for x in results_list],
-             'usec' : [int(x[1]) for x in results_list],
-             'ret' :  [int(x[2]) for x in results_list]  }
-
-import numpy as np
-
-class NpEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.floating):
-            return float(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super(NpEncoder, self).default(obj)
+    report = get_memory_analysis(env['BOARD'], env)
+    evaluation_record['memory'] = report['memory']
+    evaluation_record['storage'] = report['storage']
+    evaluation_record['memory_breakdown'] = report['breakdown']
+    return evaluation_record
 
 def save_evaluation_record(rec, log_dir=LOG_DIR):
     import os
     os.makedirs(log_dir, exist_ok=True)
     file_name = rec['board'] + '_' + str(rec['datetime']) + '.json'
-    file_path = LOG_DIR + '/' + file_name
+    file_path = log_dir + '/' + file_name
     with open(file_path, 'w') as f:
         json.dump(rec, f, cls=NpEncoder)
 
 
-def get_memory_storage_from_buildsize(board):
-    import subprocess
-    output = subprocess.check_output(f"make BOARD={board} info-buildsize", shell=True)
-    output = output.split(b'\n')
-    output = output[1].split(b'\t')
-    text = int(output[0].strip())
-    data = int(output[1].strip())
-    bss = int(output[2].strip())
-    memory = data + bss
-    storage = text + data
-    return memory, storage
-
+def get_memory_analysis(board, env=None):
+    build_dir = get_build_dir(env or {})
+    elf_path = get_elf_path(board, build_dir)
+    with span('memory_analysis', board=board, elf=elf_path):
+        return analyze_elf(elf_path, os.path.splitext(elf_path)[0] + '.map', model_names(env or {}))
 
-def print_per_model_evaluation(rec):
-    headers = ['Board', 'Memory (KB)', 'Storage (KB)', 
-               '95-CI (ms)', 'Mean (ms)', 'Median (ms)', 'Min. (ms)', 'Max. (ms)']
-    
-    if not isinstance(rec, list):
-        rec = [rec]
-    
-    output_list = []
-    for r in rec:
-        stats = r['trials_stats_in_usec']
-        ci = [0, 0]
-        ci[0] = int(stats['95ci'][0]) / 1e3
-        ci[1] = int(stats['95ci'][1]) / 1e3
-
-        mean = int(stats['mean']) / 1e3
-        median = int(stats['median']) / 1e3
-        min = int(stats['min']) / 1e3
-        max = int(stats['max']) / 1e3
-        output_list.append([r['board'], r['memory'] / 1e3, r['storage'] / 1e3,
-                                ci, mean, median, min ,max])
-    
-    tabular_output = tabulate(output_list, headers=headers)
-    print(tabular_output)
 
-def load_logs_from_folder(dir_path):
-    import glob
-    json_dict = []
-    for filepath in glob.iglob(f'{dir_path}/*'):
-        with open(filepath, 'r') as f:
-            json_dict.append(json.load(f))
-    print_per_model_evaluation(json_dict)
+def get_power_trace(env, energy):
+    if energy.get('trace'):
+        return energy['trace']
+    exp_id = env.get('IOTLAB_EXP_ID')
+    if exp_id is None:
+        print("No power trace: pass a trace file, or run on an IoT-LAB experiment started by U-TOE")
+        return None
+    node = env.get('IOTLAB_NODE') or get_iotlab_exp_nodes(exp_id)[0]
+    return fetch_iotlab_consumption(exp_id, node)
 
+def measure_energy(env, rec, energy):
+    with span('energy', board=env['BOARD']):
+        trace_path = get_power_trace(env, energy)
+        if trace_path is None:
+            return None
+        return energy_from_record(rec, trace_path, energy.get('voltage'))
 
 def evaluate_per_operator(model_path, board='stm32f746g-disco', use_iotlab=False, iotlab_node=None,
-                          shape_dict=None):
+                          shape_dict=None, use_cache=True, timer=None, baudrate=None, transport=None):
+    import tvm
+    from model_converter import compile_model
+    from microtvm_transport import UTOETransport, get_baudrate, make_stream_backend
     print("Load Model and Code Gen...")
-    mod, params = load_model(model_path, shape_dict)
     # import logging
     # logging.basicConfig(level=logging.DEBUG)
-    module = compile_per_ops_eval(mod, params, board, './models/default/default.tar')
-    dummy_mod = compile_per_ops_eval(mod, params, board,link_params=False)
+    # param shapes come from the graph JSON of the same build, the linked params keep their nodes
+    with span('codegen', model=model_path, board=board):
+        artifact = compile_model(model_path, board, 'per-ops', './models/default/default.tar',
+                                 shape_dict, cache=get_compile_cache(use_cache))
     print("Load Model and Code Gen...done")
     env = {'BOARD': board, 'UTOE_GRANULARITY' : '1'}
+    if timer is not None:
+        env['UTOE_TIMER'] = timer
+    if baudrate is not None:
+        env['UTOE_BAUDRATE'] = str(baudrate)
     
     print('Compile and Flashing...')
-    if use_iotlab or iotlab_node is not None:
-        riot_ctrl = get_fit_iotlab_controller(env, iotlab_node=iotlab_node)
-        if iotlab_node is not None:
-            riot_ctrl.flash(stdout=None)
-    else:
-        riot_ctrl = get_local_controller(env)
-        riot_ctrl.flash(stdout=None, stderr=None)
+    riot_ctrl = get_flashed_controller(env, use_iotlab, iotlab_node)
     print('Compile and Flashing...done')
-    with tvm.micro.Session(UTOETransport(riot_ctrl=riot_ctrl)) as session:
-        debug_module = tvm.micro.create_local_debug_executor(
-            module.get_graph_json(), session.get_system_lib(), session.device
-        )
-        debug_module.run()
-        nodes_list = debug_module.debug_datum.get_graph_nodes()
-        time_list = debug_module.debug_datum._time_list
-
-    eval_data = parse_per_ops_result(nodes_list, time_list)
-
-    from tvm.contrib.debugger.debug_result import DebugResult
-
-    dbg_rslt = DebugResult(dummy_mod.get_graph_json(), '.')
-
-    nodes_info = dbg_rslt.get_graph_nodes()
-    ops_rec = {}
-
-    params_info = get_params_info(nodes_info)
-    for node_data in eval_data:
-        op = node_data[1]
-        if op == "__nop":
-            continue
-
-        op_node = [n for n in nodes_info if n["op"] == op][0]
-        op_params = list(filter(lambda x : x != "reshape_nop",op_node["inputs"]))
-        ops_rec[op] = {'time_us': node_data[2], 'time_percent': node_data[3],
-                                    'params': op_params, 'memory': None, 'storage': None}
-        
-        workspace_sizes = module.function_metadata[op].workspace_sizes
-        workspace_sizes = reduce(lambda x,y: x + y, workspace_sizes.values())
-        io_sizes = module.function_metadata[op].io_sizes
-        io_sizes = reduce(lambda x,y: x + y, io_sizes.values())
-
-        #TODO: seperate const and input / output var
-        ops_rec[op]['memory'] = workspace_sizes + io_sizes
-        ops_rec[op]['storage'] = sum(map(lambda x: params_info[x]['bytes'] 
-                                         if params_info.get(x) is not None else 0, 
-                                         op_params))
+    try:
+        backend = make_stream_backend(transport, get_baudrate(env)) if transport is not None else None
+        utoe_transport = UTOETransport(riot_ctrl=riot_ctrl, backend=backend)
+        with span('rpc_session', board=board, model=model_path) as args:
+            with tvm.micro.Session(utoe_transport) as session:
+                debug_module = tvm.micro.create_local_debug_executor(
+                    artifact['graph_json'], session.get_system_lib(), session.device
+                )
+                debug_module.run()
+                time_list = debug_module.debug_datum._time_list
+            transport_stats = utoe_transport.stats()
+            args['bytes'] = transport_stats['bytes_read'] + transport_stats['bytes_written']
+            args['bytes_read'] = transport_stats['bytes_read']
+            args['bytes_written'] = transport_stats['bytes_written']
+    finally:
+        # closing the transport ends the experiment, not when the session never opened it
+        riot_ctrl.stop_exp()
+    print(f"Transport: {transport_stats['bytes_read']} B read, {transport_stats['bytes_written']} B written, "
+          f"{round(transport_stats['read_throughput_Bps'])} B/s read throughput, "
+          f"{round(transport_stats['mean_read_wait_sec'] * 1e3, 3)} ms mean read wait")
+
+    graph = json.loads(artifact['graph_json'])
+    index = index_graph(graph, artifact.get('param_names'))
+    ops_rec = parse_per_ops_result(index, time_list)
+    params_info = index['params_info']
+    timeline = compute_memory_timeline(graph, artifact['function_metadata'], artifact.get('param_names'))
+    live_memory = op_live_memory(timeline)
+    for op, op_rec in ops_rec.items():
+        # RAM live while the op runs: every activation still needed plus its own workspace,
+        # the constants are counted in storage
+        live = live_memory.get(op, {'total': 0, 'activations': 0, 'workspace': 0})
+        op_rec['memory'] = live['total']
+        op_rec['activations'] = live['activations']
+        op_rec['workspace'] = live['workspace']
 
-    
     print_per_ops_evaluation(ops_rec)
+    print()
+    print_memory_timeline(timeline, top=10)
 
     rec = {'board' : env['BOARD'], 'datetime': datetime.now().strftime("%Y%m%d-%H%M%S"),
-        'ops_record': ops_rec, 'params_info': params_info,
-        'model_path': model_path, 'mode': 'per-ops',
+        'ops_record': ops_rec, 'params_info': params_info, 'memory_timeline': timeline,
+        'model_path': model_path, 'mode': 'per-ops', 'transport_stats': transport_stats,
         }
     
     # save_evaluation_record(rec)
 
-def print_per_ops_evaluation(rec):
-    headers = ['Ops', 'Time (us)', 'Time (%)', 
-               'Params', 'Memory (KB)', 'Storage (KB)'] 
-    output_list = []
-    for k,v in rec.items():
-        output = [k, v['time_us'], v['time_percent'], v['params'], v['memory'] / 1e3 , v['storage'] / 1e3]
-        output_list.append(output)
-    tabular_output = tabulate(output_list, headers=headers)
-    print(tabular_output)
-
-def parse_per_ops_result(nodes_list, time_list):
-    eid = 0
-    data = []
-    total_time = sum([np.mean(time) for time in time_list])
-    for node, time in zip(nodes_list, time_list):
-        time_mean = np.mean(time)
-        num_outputs = 1 if node["op"] == "param" else int(node["attrs"]["num_outputs"])
-        for j in range(num_outputs):
-            op = node["op"]
-            if node["op"] == "param":
-                eid += 1
-                continue
-            name = node["name"]
-            shape = None
-            time_us = round(time_mean * 1e6, 3)
-            time_percent = round(((time_mean / total_time) * 100), 3)
-            inputs = str(node["attrs"]["num_inputs"])
-            outputs = str(node["attrs"]["num_outputs"])
-            measurements = str([round(repeat_data * 1e6, 3) for repeat_data in time])
-            node_data = [name, op, time_us, time_percent, shape, inputs, outputs, measurements]
-            data.append(node_data)
-            eid += 1
-    return data
-
-def get_params_info(nodes_info):
-    params_info = {}
-    for n in nodes_info:
-        if n['op'] != 'param':
-            continue
-        name = n['name']
-        dtype = n['attrs']['T'][6:]
-        shape = n['shape']
-        params_info[name] = {'dtype': dtype, 'shape': shape,
-                            'bytes': _shape_to_size(shape, dtype),
-                            }
-    return params_info
+def evaluate_per_operator_aot(model_path, board='stm32f746g-disco', repeat=10, random_seed=42,
+                              shape_dict=None, use_cache=True, build_dir=DEFAULT_BUILD_DIR, timer=None, baudrate=None):
+    print("Load Model and Code Gen...")
+    artifact = codegen_per_model(model_path, board, build_dir, shape_dict, use_cache)
+    call_sites = instrument_aot_mlf(get_mlf_path(build_dir))
+    print("Load Model and Code Gen...done")
+
+    env = make_build_env(board, build_dir, {'UTOE_GRANULARITY': '2', 'UTOE_RANDOM_SEED': str(random_seed),
+                                            'UTOE_PROF_NUM_CALLS': str(len(call_sites)),
+                                            'UTOE_PROF_REPEAT': str(repeat)})
+    if timer is not None:
+        env['UTOE_TIMER'] = timer
+    if baudrate is not None:
+        env['UTOE_BAUDRATE'] = str(baudrate)
+    print('Compile and Flashing...')
+    riot_ctrl = get_flashed_controller(env)
+    print('Compile and Flashing...done')
+
+    decoder = read_binary_stream(riot_ctrl)
+    ops_rec = parse_aot_profile(call_sites, decoder.profile(), decoder.timer()['hz'],
+                                artifact['function_metadata'])
+    print_per_ops_evaluation(ops_rec)
+
+    rec = {'board' : env['BOARD'], 'datetime': datetime.now().strftime("%Y%m%d-%H%M%S"),
+           'ops_record': ops_rec, 'call_sites': call_sites, 'timer': decoder.timer(),
+           'model_path': model_path, 'mode': 'per-ops-aot', 'repeat': repeat,
+           }
+    return rec
+
+def memory_timeline_analysis(model_path, board='stm32f746g-disco', shape_dict=None, use_cache=True):
+    # offline, only needs the graph JSON of the per-ops build
+    from model_converter import compile_model
+    print("Load Model and Code Gen...")
+    artifact = compile_model(model_path, board, 'per-ops', None, shape_dict, cache=get_compile_cache(use_cache))
+    print("Load Model and Code Gen...done")
+    report = compute_memory_timeline(artifact['graph_json'], artifact['function_metadata'],
+                                     artifact.get('param_names'))
+    print_memory_timeline(report)
+    return report
 
 def memory_analysis(model_path, board='stm32f746g-disco',
-                       shape_dict=None):
+                       shape_dict=None, use_cache=True, use_cosy=False):
     print("Load Model and Code Gen...")
-    mod, params = load_model(model_path, shape_dict)
-    moudle = compile_per_model_eval(mod, params, board, './models/default/default.tar')
-    input_vars, output_vars = extract_io_vars_from_module(moudle)
-    generate_model_io_vars_header(input_vars=input_vars, output_vars=output_vars)
+    codegen_per_model(model_path, board, DEFAULT_BUILD_DIR, shape_dict, use_cache)
     print("Load Model and Code Gen...done")
 
     env = {'BOARD': board}
     print('Compiling...')
     riot_ctrl = get_local_controller(env)
-    riot_ctrl.cosy()
+    if use_cosy:
+        riot_ctrl.cosy()
+        return
+    build_firmware(env)
+    print('Compiling...done')
+    report = get_memory_analysis(board, env)
+    print_memory_analysis(report)
+    return report
 
 
     
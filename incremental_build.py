@@ -0,0 +1,106 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+from compile_cache import CACHE_DIR, hash_file
+
+BUILD_STAMP = '.utoe_build_stamp'
+BUILD_BASE_DIR = os.getenv('UTOE_BUILD_BASE_DIR', os.path.join(CACHE_DIR, 'riot-base'))
+
+# sent with the start command, see make_start_command
+RUNTIME_ENV = ('UTOE_TRIAL_NUM', 'UTOE_RANDOM_SEED', 'UTOE_WARMUP', 'UTOE_BURST', 'UTOE_TRIAL_GAP_MS')
+# only select the device to flash
+DEVICE_ENV = ('PORT', 'SERIAL', 'UTOE_BUILD_DIR')
+# everything under bin/<board> that depends on the models (plus one module per model package),
+# never shared between build directories
+MODEL_BUILD_PATHS = ('utvm', 'application_U-TOE')
+MODEL_HEADERS = ('model_io_vars.h', 'model_table.h')
+APP_SOURCES = ('main.c', 'platform.c', 'utoe_timer.h', 'Makefile', 'iotlab.site.mk')
+
+def file_changed(path, data):
+    if not os.path.isfile(path) or os.path.getsize(path) != len(data):
+        return True
+    with open(path, 'rb') as f:
+        return f.read() != data
+
+def write_if_changed(path, data):
+    # keeps the mtime of unchanged files, so make does not rebuild what depends on them
+    if isinstance(data, str):
+        data = data.encode()
+    if not file_changed(path, data):
+        return False
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+def _hash_json(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+def firmware_build_env(env):
+    # make variables that end up in the firmware
+    return {k: v for k, v in env.items()
+            if k not in RUNTIME_ENV and k not in DEVICE_ENV and not k.startswith('IOTLAB_')}
+
+def app_sources_hash(app_dir='.'):
+    return _hash_json({f: hash_file(os.path.join(app_dir, f)) for f in APP_SOURCES
+                       if os.path.isfile(os.path.join(app_dir, f))})
+
+def model_names(env):
+    return env.get('UTOE_MODELS', 'default').split()
+
+def build_inputs(env, build_dir, mlf_paths):
+    headers = [os.path.join(build_dir, h) for h in MODEL_HEADERS]
+    return {'env': firmware_build_env(env), 'app': app_sources_hash(),
+            'mlf': [hash_file(p) if os.path.isfile(p) else None for p in mlf_paths],
+            'headers': [hash_file(h) if os.path.isfile(h) else None for h in headers]}
+
+def _board_bin_dir(env, build_dir):
+    return os.path.join(build_dir, 'bin', env['BOARD'])
+
+def firmware_up_to_date(env, build_dir, mlf_paths):
+    stamp_path = os.path.join(build_dir, BUILD_STAMP)
+    elf_path = os.path.join(_board_bin_dir(env, build_dir), 'U-TOE.elf')
+    if not os.path.isfile(stamp_path) or not os.path.isfile(elf_path):
+        return False
+    with open(stamp_path, 'r') as f:
+        return json.load(f) == json.loads(json.dumps(build_inputs(env, build_dir, mlf_paths)))
+
+def write_build_stamp(env, build_dir, mlf_paths):
+    write_if_changed(os.path.join(build_dir, BUILD_STAMP), json.dumps(build_inputs(env, build_dir, mlf_paths),
+                                                                      sort_keys=True))
+
+def _base_dir(env):
+    # RIOT and CRT runtime objects only depend on the board, the build flags and the application sources
+    base_env = {k: v for k, v in firmware_build_env(env).items() if k != 'UTOE_MODELS'}
+    key = _hash_json({'env': base_env, 'app': app_sources_hash()})[:16]
+    return os.path.join(BUILD_BASE_DIR, f"{env['BOARD']}-{key}")
+
+def seed_build_dir(env, build_dir):
+    # start a fresh build directory from the prebuilt objects of an earlier build with the same flags
+    bin_dir = _board_bin_dir(env, build_dir)
+    base = _base_dir(env)
+    if os.path.isdir(bin_dir) or not os.path.isdir(base):
+        return False
+    shutil.copytree(base, bin_dir, symlinks=True) # copy2 keeps the mtimes, make sees the objects as up to date
+    return True
+
+def update_build_base(env, build_dir):
+    bin_dir = _board_bin_dir(env, build_dir)
+    base = _base_dir(env)
+    if os.path.isdir(base) or not os.path.isdir(bin_dir):
+        return False
+    tmp_base = base + f'.tmp-{os.getpid()}-{threading.get_ident()}'
+    excluded = MODEL_BUILD_PATHS + tuple(model_names(env))
+    shutil.copytree(bin_dir, tmp_base, symlinks=True,
+                    ignore=lambda d, names: [n for n in names if (d == bin_dir and n in excluded)
+                                             or n.startswith('U-TOE.')])
+    try:
+        os.replace(tmp_base, base)
+    except OSError:
+        # stored by a concurrent build
+        shutil.rmtree(tmp_base, ignore_errors=True)
+    return True
@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import time
+import fcntl
+import subprocess
+from contextlib import contextmanager
+
+from tabulate import tabulate
+from compile_cache import CACHE_DIR
+
+# shared by every U-TOE process of the user, leases of crashed processes are reclaimed
+POOL_STATE_PATH = os.getenv('UTOE_IOTLAB_POOL_STATE', os.path.join(CACHE_DIR, 'iotlab_pool.json'))
+# experiments without a lease for this long are stopped
+IDLE_TIMEOUT_SEC = 15 * 60
+# upper bound of a leaked experiment, IoT-LAB stops it after this many minutes
+EXPERIMENT_DURATION_MIN = 120
+LEASE_POLL_SEC = 5
+# experiment states that do not come back, anything else (or a failed query) keeps the experiment in the pool
+TERMINAL_STATES = ('Terminated', 'Error', 'Stopped')
+
+class IotlabCLI:
+    # Backend of the pool: the iotlab-cli tools. bin_dir (or UTOE_IOTLAB_CLI_DIR) selects other executables
+    # with the same interface, e.g. a local fake of iotlab-experiment and iotlab-node.
+
+    def __init__(self, bin_dir=None):
+        self.bin_dir = bin_dir or os.getenv('UTOE_IOTLAB_CLI_DIR')
+
+    def _run(self, tool, *args):
+        exe = os.path.join(self.bin_dir, tool) if self.bin_dir else tool
+        return subprocess.check_output([exe] + [str(a) for a in args]).decode()
+
+    def submit(self, name, duration_min, count, archi, site):
+        output = self._run('iotlab-experiment', 'submit', '-n', name, '-d', duration_min,
+                           '-l', f'{count},archi={archi}+site={site}')
+        return str(json.loads(output)['id'])
+
+    def wait(self, exp_id, timeout=600):
+        self._run('iotlab-experiment', 'wait', '-i', exp_id, '--timeout', timeout)
+
+    def state(self, exp_id):
+        return json.loads(self._run('iotlab-experiment', 'get', '-i', exp_id, '-s'))['state']
+
+    def nodes(self, exp_id):
+        return re.findall(r'"network_address":\s*"([^"]+)"', self._run('iotlab-experiment', 'get', '-i', exp_id, '-r'))
+
+    def stop(self, exp_id):
+        self._run('iotlab-experiment', 'stop', '-i', exp_id)
+
+    def reset(self, exp_id, node):
+        # {"0": [nodes that succeeded], "1": [nodes that failed]}
+        result = json.loads(self._run('iotlab-node', '--reset', '-i', exp_id, '-l', node_list_arg(node)))
+        return node in result.get('0', [])
+
+def node_list_arg(node):
+    # m3-10.grenoble.iot-lab.info -> grenoble,m3,10
+    name, site = node.split('.')[:2]
+    archi, _, num = name.rpartition('-')
+    return f'{site},{archi},{num}'
+
+def get_board_iotlab_info(board):
+    # IOTLAB_ARCHI and IOTLAB_SITE as the RIOT build system resolves them, see iotlab.site.mk
+    info = {}
+    for var in ('IOTLAB_ARCHI', 'IOTLAB_SITE'):
+        output = subprocess.check_output(f"make BOARD={board} info-debug-variable-{var}", shell=True,
+                                         stderr=subprocess.DEVNULL)
+        info[var.split('_')[1].lower()] = output.decode().strip().split('\n')[-1]
+    if not info['archi'] or not info['site']:
+        raise ValueError(f"{board} is not available in FIT IoT-LAB")
+    return info
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class IotlabPool:
+    # Reserves IoT-LAB nodes per board in long running experiments and leases them to evaluation jobs.
+    # State: {'boards': {board: {archi, site}}, 'experiments': {id: {board, nodes, submitted, last_used}},
+    #         'leases': {node: {pid, job, since}}, 'broken': [nodes]}
+
+    def __init__(self, path=POOL_STATE_PATH, backend=None, idle_timeout=IDLE_TIMEOUT_SEC,
+                 duration=EXPERIMENT_DURATION_MIN):
+        self.path = path
+        self.backend = backend or IotlabCLI()
+        self.idle_timeout = idle_timeout
+        self.duration = duration
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @contextmanager
+    def _state(self):
+        # read-modify-write under an exclusive lock, shared by the threads and processes using the pool
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = {'boards': {}, 'experiments': {}, 'leases': {}, 'broken': []}
+            if os.path.isfile(self.path):
+                with open(self.path, 'r') as f:
+                    state.update(json.load(f))
+            yield state
+            self._save(state)
+
+    def _save(self, state):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def _board_info(self, state, board):
+        if board not in state['boards']:
+            state['boards'][board] = get_board_iotlab_info(board)
+        return state['boards'][board]
+
+    def _cleanup(self, state):
+        # leases of dead processes and experiments that ended on their own
+        for node, lease in list(state['leases'].items()):
+            if lease['host'] == os.uname().nodename and not _pid_alive(lease['pid']):
+                print(f"Reclaiming {node} from crashed process {lease['pid']}")
+                del state['leases'][node]
+        for exp_id, exp in list(state['experiments'].items()):
+            try:
+                exp_state = self.backend.state(exp_id)
+                if exp_state == 'Running' and not exp['nodes']:
+                    # the process that submitted it died while waiting, see reserve
+                    exp['nodes'] = self.backend.nodes(exp_id)
+            except subprocess.CalledProcessError as e:
+                # e.g. the API is not reachable, the experiment may well be running
+                print(f"State of experiment {exp_id} unknown: {e}")
+                continue
+            if exp_state in TERMINAL_STATES:
+                self._drop(state, exp_id)
+
+    def _drop(self, state, exp_id):
+        exp = state['experiments'].pop(exp_id)
+        for node in exp['nodes']:
+            state['leases'].pop(node, None)
+            if node in state['broken']:
+                state['broken'].remove(node)
+
+    def reserve(self, board, count=1):
+        # makes sure count usable nodes of the board are reserved, submits one experiment for the missing ones
+        with self._state() as state:
+            self._cleanup(state)
+            info = self._board_info(state, board)
+            usable = [n for exp in state['experiments'].values() if exp['board'] == board
+                      for n in exp['nodes'] if n not in state['broken']]
+            missing = count - len(usable)
+            if missing <= 0:
+                return usable
+            print(f"Reserving {missing} {board} nodes in {info['site']}...")
+            exp_id = self.backend.submit(f'utoe-pool-{board}', self.duration, missing, info['archi'], info['site'])
+            # recorded before waiting, so it is stopped by `pool stop` even if this process dies while waiting
+            state['experiments'][exp_id] = {'board': board, 'nodes': [], 'submitted': time.time(),
+                                            'last_used': time.time()}
+            self._save(state)
+            try:
+                # the state lock is held while waiting, other processes would submit their own experiment otherwise
+                self.backend.wait(exp_id)
+                nodes = self.backend.nodes(exp_id)
+            except BaseException:
+                self._stop(state, exp_id)
+                self._save(state)
+                raise
+            state['experiments'][exp_id]['nodes'] = nodes
+            print(f"Reserving {missing} {board} nodes in {info['site']}...done: experiment {exp_id}, {nodes}")
+            return usable + nodes
+
+    def _try_lease(self, board, job):
+        with self._state() as state:
+            self._cleanup(state)
+            for exp_id, exp in state['experiments'].items():
+                if exp['board'] != board:
+                    continue
+                for node in exp['nodes']:
+                    if node in state['leases'] or node in state['broken']:
+                        continue
+                    state['leases'][node] = {'pid': os.getpid(), 'host': os.uname().nodename, 'job': job,
+                                             'since': time.time(), 'exp_id': exp_id}
+                    exp['last_used'] = time.time()
+                    return node, exp_id
+            has_nodes = any(exp['board'] == board for exp in state['experiments'].values())
+        return None, has_nodes
+
+    def lease(self, board, job=None, timeout=None):
+        # a free, healthy node of the board; reserves one if the pool has none, waits while all are leased
+        start = time.time()
+        while True:
+            node, exp_id = self._try_lease(board, job)
+            if node is not None:
+                if self.health_check(node, exp_id):
+                    return node, exp_id
+                self.release(node, healthy=False)
+                continue
+            if not exp_id:
+                self.reserve(board, 1)
+                continue
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError(f"no free {board} node in the IoT-LAB pool after {timeout} s")
+            time.sleep(LEASE_POLL_SEC)
+
+    def health_check(self, node, exp_id):
+        try:
+            return self.backend.reset(exp_id, node)
+        except subprocess.CalledProcessError:
+            return False
+
+    def release(self, node, healthy=True):
+        with self._state() as state:
+            lease = state['leases'].pop(node, None)
+            if lease is not None and lease['exp_id'] in state['experiments']:
+                state['experiments'][lease['exp_id']]['last_used'] = time.time()
+            if not healthy and node not in state['broken']:
+                print(f"IoT-LAB node {node} failed the health check, not leased again")
+                state['broken'].append(node)
+        self.release_idle()
+
+    def release_idle(self, idle_timeout=None):
+        # stops experiments whose nodes are all free (or broken) since idle_timeout
+        idle_timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        stopped = []
+        with self._state() as state:
+            for exp_id, exp in list(state['experiments'].items()):
+                leased = any(n in state['leases'] for n in exp['nodes'])
+                all_broken = exp['nodes'] and all(n in state['broken'] for n in exp['nodes'])
+                if not leased and (all_broken or time.time() - exp['last_used'] >= idle_timeout):
+                    self._stop(state, exp_id)
+                    stopped.append(exp_id)
+        return stopped
+
+    def _stop(self, state, exp_id):
+        try:
+            self.backend.stop(exp_id)
+        except subprocess.CalledProcessError as e:
+            print(f"Stopping experiment {exp_id} failed: {e}")
+        self._drop(state, exp_id)
+
+    def stop_all(self):
+        with self._state() as state:
+            for exp_id in list(state['experiments']):
+                self._stop(state, exp_id)
+
+    def status(self):
+        with self._state() as state:
+            self._cleanup(state)
+            return json.loads(json.dumps(state))
+
+    @contextmanager
+    def leased(self, board, job=None, timeout=None):
+        node, exp_id = self.lease(board, job, timeout)
+        try:
+            yield node, exp_id
+        finally:
+            self.release(node)
+
+def pool_enabled():
+    return os.getenv('UTOE_IOTLAB_POOL') == '1'
+
+def print_pool_status(state):
+    headers = ['Experiment', 'Board', 'Node', 'State', 'Job', 'Idle (s)']
+    output_list = []
+    for exp_id, exp in state['experiments'].items():
+        for node in exp['nodes']:
+            lease = state['leases'].get(node)
+            node_state = 'broken' if node in state['broken'] else ('leased' if lease else 'free')
+            output_list.append([exp_id, exp['board'], node, node_state, lease['job'] if lease else None,
+                                None if lease else round(time.time() - exp['last_used'])])
+    print(tabulate(output_list, headers=headers))
+
+def enable_pool(boards, count, devices=None):
+    # evaluations of this process lease their nodes from the pool, count nodes of each board are reserved up front.
+    # devices: device dict of the sweep pipeline, one worker per pool node of the boards without attached devices
+    os.environ['UTOE_IOTLAB_POOL'] = '1'
+    pool = IotlabPool()
+    for board in boards:
+        pool.reserve(board, count)
+        if devices is not None and board not in devices:
+            devices[board] = [{} for _ in range(count)]
+    return devices
@@ -19,27 +19,38 @@
  */
 
 #include <stdio.h>
+#include <stdlib.h>
 #include <string.h>
+#include "utoe_timer.h"
 #include "xtimer.h"
 #include "random.h"
 #include <tvm/runtime/crt/microtvm_rpc_server.h>
 #include <tvm/runtime/crt/logging.h>
 #include "stdio_base.h"
 
+/* defaults only, the host sends the seed and the trial count with the start command,
+ * so changing them does not need a rebuild */
 #ifndef UTOE_RANDOM_SEED
 #define UTOE_RANDOM_SEED 42
 #endif
 
+/* trial count 0 - run until the host stops the evaluation */
 #ifndef UTOE_TRIAL_NUM
 #define UTOE_TRIAL_NUM 10
 #endif
 
-/* UTOE_GRANULARITY 0 - Per Model, 1 - Per Operator*/
+/* host commands between trials when the trial count is 0 */
+#define UTOE_CMD_NEXT 'n'
+#define UTOE_CMD_QUIT 'q'
+
+/* UTOE_GRANULARITY 0 - Per Model, 1 - Per Operator (RPC), 2 - Per Operator (on-device AoT profiling) */
 #ifndef UTOE_GRANULARITY
 #define UTOE_GRANULARITY 0
 #endif
 
-#define UTOE_RPC_BUFFER_SIZE 128
+#ifndef UTOE_RPC_BUFFER_SIZE
+#define UTOE_RPC_BUFFER_SIZE 512
+#endif
 
 #ifndef UTOE_INPUT_SIZE
 #define UTOE_INPUT_SIZE 4
@@ -49,6 +60,49 @@
 #define UTOE_OUTPUT_SIZE 4
 #endif
 
+/* UTOE_MULTI_MODEL 1 - several models in one image, listed in the host generated model_table.h */
+#ifndef UTOE_MULTI_MODEL
+#define UTOE_MULTI_MODEL 0
+#endif
+
+/* UTOE_INPUT_SETS 0 - fresh random input before each trial,
+ * N - N random input sets generated before the first trial, trial i uses set i % N */
+#ifndef UTOE_INPUT_SETS
+#define UTOE_INPUT_SETS 0
+#endif
+
+/* UTOE_OUTPUT_FORMAT 0 - printf text lines, 1 - framed binary records */
+#ifndef UTOE_OUTPUT_FORMAT
+#define UTOE_OUTPUT_FORMAT 0
+#endif
+
+/* Binary record framing, see trial_protocol.py:
+ * SYNC0 SYNC1 | type (u8) | len (u8) | payload (len bytes, little endian) | CRC-16/CCITT (u16)
+ * The CRC covers type, len and payload. */
+#define UTOE_FRAME_SYNC0 0xA5
+#define UTOE_FRAME_SYNC1 0x5A
+#define UTOE_FRAME_HEADER 0x01
+#define UTOE_FRAME_TRIAL 0x02
+#define UTOE_FRAME_END 0x03
+#define UTOE_FRAME_PROFILE_INFO 0x04
+#define UTOE_FRAME_PROFILE_DATA 0x05
+#define UTOE_FRAME_WARMUP 0x06
+#define UTOE_FRAME_BURST 0x07
+#define UTOE_PROTOCOL_VERSION 3
+
+/* number of instrumented operator calls in the AoT main function, set by the host */
+#ifndef UTOE_PROF_NUM_CALLS
+#define UTOE_PROF_NUM_CALLS 1
+#endif
+
+/* runs of the whole model recorded in the profiling table */
+#ifndef UTOE_PROF_REPEAT
+#define UTOE_PROF_REPEAT 10
+#endif
+
+/* table entries per UTOE_FRAME_PROFILE_DATA frame */
+#define UTOE_PROF_ENTRIES_PER_FRAME 60
+
 // Called by TVM to write serial data to the UART.
 ssize_t write_serial(void* unused_context, const uint8_t* data, size_t size) {
     (void) unused_context;
@@ -56,28 +110,277 @@ ssize_t write_serial(void* unused_context, const uint8_t* data, size_t size) {
     return size;
 }
 
+#if ((UTOE_GRANULARITY==0) && (UTOE_OUTPUT_FORMAT==1)) || (UTOE_GRANULARITY==2)
+static uint16_t crc16_ccitt(uint16_t crc, const uint8_t *data, size_t len)
+{
+    while (len--) {
+        crc ^= (uint16_t)(*data++) << 8;
+        for (int i = 0; i < 8; i++) {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+        }
+    }
+    return crc;
+}
+
+static void put_u32(uint8_t *buf, uint32_t val)
+{
+    buf[0] = val & 0xff;
+    buf[1] = (val >> 8) & 0xff;
+    buf[2] = (val >> 16) & 0xff;
+    buf[3] = (val >> 24) & 0xff;
+}
+
+static void emit_frame(uint8_t type, const uint8_t *payload, uint8_t len)
+{
+    uint8_t head[4] = { UTOE_FRAME_SYNC0, UTOE_FRAME_SYNC1, type, len };
+    uint16_t crc = crc16_ccitt(0xFFFF, &head[2], 2);
+    crc = crc16_ccitt(crc, payload, len);
+    uint8_t tail[2] = { crc & 0xff, crc >> 8 };
+    stdio_write(head, sizeof(head));
+    stdio_write(payload, len);
+    stdio_write(tail, sizeof(tail));
+}
+
+static void emit_header(uint32_t trials_num, uint8_t model)
+{
+    uint8_t payload[11];
+    payload[0] = UTOE_PROTOCOL_VERSION;
+    put_u32(&payload[1], trials_num);
+    payload[5] = UTOE_TIMER;
+    put_u32(&payload[6], UTOE_TIMER_HZ);
+    payload[10] = model;
+    emit_frame(UTOE_FRAME_HEADER, payload, sizeof(payload));
+}
+
+static void emit_end(uint32_t trials_done)
+{
+    uint8_t payload[4];
+    put_u32(payload, trials_done);
+    emit_frame(UTOE_FRAME_END, payload, sizeof(payload));
+}
+#endif
+
+#if (UTOE_GRANULARITY==0) && (UTOE_OUTPUT_FORMAT==1)
+static void emit_trial(uint8_t type, uint32_t trial, uint32_t elapsed, int32_t ret)
+{
+    uint8_t payload[12];
+    put_u32(&payload[0], trial);
+    put_u32(&payload[4], elapsed);
+    put_u32(&payload[8], (uint32_t)ret);
+    emit_frame(type, payload, sizeof(payload));
+}
+
+static void emit_burst(uint32_t count, uint64_t ticks)
+{
+    uint8_t payload[12];
+    put_u32(&payload[0], count);
+    put_u32(&payload[4], (uint32_t)ticks);
+    put_u32(&payload[8], (uint32_t)(ticks >> 32));
+    emit_frame(UTOE_FRAME_BURST, payload, sizeof(payload));
+}
+#endif
+
+#if (UTOE_GRANULARITY==0)
+/* skip line endings left over from the previous command */
+static int read_cmd(void)
+{
+    int c;
+    do {
+        c = getchar();
+    } while (c == '\n' || c == '\r');
+    return c;
+}
+#endif
+
+#if (UTOE_GRANULARITY==0) || (UTOE_GRANULARITY==2)
+/* start command of the host: "s [trials [seed [model [warmup [burst [gap_ms]]]]]]",
+ * missing values keep the defaults in args */
+enum { UTOE_ARG_TRIALS, UTOE_ARG_SEED, UTOE_ARG_MODEL, UTOE_ARG_WARMUP, UTOE_ARG_BURST, UTOE_ARG_GAP_MS,
+       UTOE_NUM_ARGS };
+
+static void read_start_cmd(uint32_t *args)
+{
+    char line[64];
+    size_t len = 0;
+    int c;
+    while ((c = getchar()) != '\n' && c != EOF) {
+        if (c != '\r' && len < sizeof(line) - 1) {
+            line[len++] = c;
+        }
+    }
+    line[len] = '\0';
+
+    char *arg = strchr(line, ' ');
+    if (arg == NULL) {
+        return;
+    }
+    for (unsigned k = 0; k < UTOE_NUM_ARGS; k++) {
+        char *end;
+        unsigned long val = strtoul(arg, &end, 10);
+        if (end == arg) {
+            return;
+        }
+        args[k] = val;
+        arg = end;
+    }
+}
+#endif
+
 #if (UTOE_GRANULARITY==0)
+typedef struct {
+    const char *name;
+    int (*run)(void);
+    size_t input_size;
+} utoe_model_t;
+
+#if UTOE_MULTI_MODEL
+#include <model_table.h> /* resolved from UTOE_BUILD_DIR, see multi_model.py */
+#else
 #include <tvmgen_default.h>
+#include <model_io_vars.h> /* resolved from UTOE_BUILD_DIR */
+
+static int default_run(void)
+{
+    return tvmgen_default_run(&default_inputs, &default_outputs);
+}
+
+static const utoe_model_t utoe_models[] = { { "default", default_run, sizeof(input) } };
+#define UTOE_NUM_MODELS 1
+#endif
+
+#if (UTOE_INPUT_SETS > 1)
+static char input_sets[UTOE_INPUT_SETS][sizeof(input)];
+#endif
+
+static void prepare_inputs(const utoe_model_t *model)
+{
+#if (UTOE_INPUT_SETS == 1)
+    random_bytes(input, model->input_size);
+#elif (UTOE_INPUT_SETS > 1)
+    for (unsigned k = 0; k < UTOE_INPUT_SETS; k++) {
+        random_bytes(input_sets[k], model->input_size);
+    }
+#else
+    (void) model;
+#endif
+}
+
+/* idle period before each timed run, separates the runs in a power trace */
+static void trial_gap(uint32_t gap_ms)
+{
+    if (gap_ms > 0) {
+        xtimer_msleep(gap_ms);
+    }
+}
+
+/* called between two timed inferences, never inside the timed region */
+static void next_input(const utoe_model_t *model, uint32_t n)
+{
+#if (UTOE_INPUT_SETS == 0)
+    (void) n;
+    random_bytes(input, model->input_size);
+#elif (UTOE_INPUT_SETS > 1)
+    memcpy(input, input_sets[n % UTOE_INPUT_SETS], model->input_size);
+#else
+    (void) model;
+    (void) n;
+#endif
+}
 
 void per_model_eval(void)
 {       
-    #include "model_io_vars.h"
     (void) printf("U-TOE Per-Model Evaluation \n");
-    (void) printf("Press any key to start >\n");
-    (void) getchar();
+    for (unsigned m = 0; m < UTOE_NUM_MODELS; m++) {
+        (void) printf("model: %u, %s \n", m, utoe_models[m].name);
+    }
+    (void) printf("Send s [trials [seed [model [warmup [burst [gap_ms]]]]]] to start >\n");
 
-    random_init(UTOE_RANDOM_SEED);
+    uint32_t args[UTOE_NUM_ARGS] = { UTOE_TRIAL_NUM, UTOE_RANDOM_SEED, 0, 0, 0, 0 };
+    read_start_cmd(args);
+    uint32_t trials_num = args[UTOE_ARG_TRIALS];
+    uint32_t model_idx = args[UTOE_ARG_MODEL];
+    if (model_idx >= UTOE_NUM_MODELS) {
+        /* no fallback, the host would label the timings of another model with this index */
+        (void) printf("error: model %lu out of range, the image has %u models \n",
+                      (unsigned long)model_idx, (unsigned)UTOE_NUM_MODELS);
+#if (UTOE_OUTPUT_FORMAT==1)
+        emit_end(0);
+#else
+        (void) printf("Evaluation finished >\n");
+#endif
+        return;
+    }
+    const utoe_model_t *model = &utoe_models[model_idx];
+    random_init(args[UTOE_ARG_SEED]);
+    prepare_inputs(model);
     uint32_t start, end;
 
-    for(int i = 0; i < UTOE_TRIAL_NUM;i++) {
+#if (UTOE_OUTPUT_FORMAT==1)
+    emit_header(trials_num, model_idx);
+#else
+    printf("timer: %d, hz: %lu \n", UTOE_TIMER, (unsigned long)UTOE_TIMER_HZ);
+#endif
+    /* warm-up runs are reported separately and left out of the statistics,
+     * the first one shows the cold start (caches, flash wait states) */
+    for (uint32_t w = 0; w < args[UTOE_ARG_WARMUP]; w++) {
+        next_input(model, w);
+        trial_gap(args[UTOE_ARG_GAP_MS]);
+        start = utoe_timer_now();
+        int ret_val = model->run();
+        end = utoe_timer_now();
+#if (UTOE_OUTPUT_FORMAT==1)
+        emit_trial(UTOE_FRAME_WARMUP, w, end - start, ret_val);
+#else
+        printf("warmup: %lu, ticks: %lu, ret: %d \n", (unsigned long)w, (unsigned long)(end - start), ret_val);
+#endif
+    }
+
+    int i = 0;
+    for(;;) {
         
-        random_bytes(&input, sizeof(input));
-        start =  xtimer_now_usec();
-        int ret_val = tvmgen_default_run(&default_inputs, &default_outputs);
-        end =  xtimer_now_usec();
-        printf("trial: %d, usec: %ld, ret: %d \n", i, (long int)(end - start), ret_val);
+        next_input(model, i);
+        trial_gap(args[UTOE_ARG_GAP_MS]);
+        start = utoe_timer_now();
+        int ret_val = model->run();
+        end = utoe_timer_now();
+#if (UTOE_OUTPUT_FORMAT==1)
+        emit_trial(UTOE_FRAME_TRIAL, i, end - start, ret_val);
+#else
+        printf("trial: %d, ticks: %lu, ret: %d \n", i, (unsigned long)(end - start), ret_val);
+#endif
+        i++;
+        if (trials_num == 0) {
+            if (read_cmd() != UTOE_CMD_NEXT) {
+                break;
+            }
+        }
+        else if ((uint32_t)i >= trials_num) {
+            break;
+        }
     }
+
+    /* sustained throughput: back-to-back inferences on the current input, no output in between */
+    if (args[UTOE_ARG_BURST] > 0) {
+        uint64_t ticks = 0;
+        trial_gap(args[UTOE_ARG_GAP_MS]);
+        for (uint32_t b = 0; b < args[UTOE_ARG_BURST]; b++) {
+            start = utoe_timer_now();
+            (void) model->run();
+            ticks += utoe_timer_now() - start;
+        }
+#if (UTOE_OUTPUT_FORMAT==1)
+        emit_burst(args[UTOE_ARG_BURST], ticks);
+#else
+        printf("burst: %lu, ticks_hi: %lu, ticks_lo: %lu \n", (unsigned long)args[UTOE_ARG_BURST],
+               (unsigned long)(ticks >> 32), (unsigned long)(ticks & 0xffffffff));
+#endif
+    }
+    trial_gap(args[UTOE_ARG_GAP_MS]);
+#if (UTOE_OUTPUT_FORMAT==1)
+    emit_end(i);
+#else
     (void) printf("Evaluation finished >\n");
+#endif
 }
 #endif
 
@@ -106,14 +409,83 @@ void per_ops_eval(void)
 }
 #endif
 
+#if (UTOE_GRANULARITY==2)
+#include <tvmgen_default.h>
+
+/* ticks of each instrumented operator call, one row per run */
+static uint32_t prof_table[UTOE_PROF_REPEAT][UTOE_PROF_NUM_CALLS];
+static uint32_t prof_start;
+static unsigned prof_run;
+
+/* called around each operator call by the instrumented AoT main function, see aot_profiler.py */
+void utoe_prof_begin(unsigned call)
+{
+    (void) call;
+    prof_start = utoe_timer_now();
+}
+
+void utoe_prof_end(unsigned call)
+{
+    uint32_t end = utoe_timer_now();
+    if (call < UTOE_PROF_NUM_CALLS) {
+        prof_table[prof_run][call] = end - prof_start;
+    }
+}
+
+static void emit_profile(void)
+{
+    uint8_t payload[4 + 4 * UTOE_PROF_ENTRIES_PER_FRAME];
+    const uint32_t *entries = &prof_table[0][0];
+    uint32_t num_entries = UTOE_PROF_REPEAT * UTOE_PROF_NUM_CALLS;
+
+    put_u32(&payload[0], UTOE_PROF_NUM_CALLS);
+    put_u32(&payload[4], UTOE_PROF_REPEAT);
+    emit_frame(UTOE_FRAME_PROFILE_INFO, payload, 8);
+
+    for (uint32_t offset = 0; offset < num_entries; offset += UTOE_PROF_ENTRIES_PER_FRAME) {
+        uint32_t n = num_entries - offset;
+        if (n > UTOE_PROF_ENTRIES_PER_FRAME) {
+            n = UTOE_PROF_ENTRIES_PER_FRAME;
+        }
+        put_u32(&payload[0], offset);
+        for (uint32_t i = 0; i < n; i++) {
+            put_u32(&payload[4 + 4 * i], entries[offset + i]);
+        }
+        emit_frame(UTOE_FRAME_PROFILE_DATA, payload, 4 + 4 * n);
+    }
+}
+
+void per_ops_aot_eval(void)
+{
+    #include <model_io_vars.h> /* resolved from UTOE_BUILD_DIR */
+    (void) printf("U-TOE Per-Operator AoT Profiling \n");
+    (void) printf("Send s [trials [seed]] to start >\n");
+
+    /* the trial count is fixed by the size of the profiling table */
+    uint32_t args[UTOE_NUM_ARGS] = { UTOE_PROF_REPEAT, UTOE_RANDOM_SEED, 0, 0, 0, 0 };
+    read_start_cmd(args);
+    random_init(args[UTOE_ARG_SEED]);
+    emit_header(UTOE_PROF_REPEAT, 0);
+    for (prof_run = 0; prof_run < UTOE_PROF_REPEAT; prof_run++) {
+        random_bytes(&input, sizeof(input));
+        (void) tvmgen_default_run(&default_inputs, &default_outputs);
+    }
+    /* the whole table goes out in one burst after the last run */
+    emit_profile();
+    emit_end(UTOE_PROF_REPEAT);
+}
+#endif
+
 int main(void)
 {
-    xtimer_init();	
+    utoe_timer_init();
 
 #if (UTOE_GRANULARITY==1)
     per_ops_eval();
 #elif (UTOE_GRANULARITY==0)
     per_model_eval();
+#elif (UTOE_GRANULARITY==2)
+    per_ops_aot_eval();
 #endif
 
     return 0;
@@ -0,0 +1,126 @@
+import re
+import json
+
+from tabulate import tabulate
+from utils import _shape_to_size
+
+# relay names the bound constants p0, p1, ... in the graph JSON, used when the artifact has no param_names
+_PARAM_NAME_RE = re.compile(r'^p\d+$')
+
+def _graph_attr(graph, key):
+    # attrs are stored as [type, values], e.g. "storage_id": ["list_int", [0, 1, ...]]
+    return graph['attrs'][key][1]
+
+def graph_entries(graph, param_names=None):
+    # one entry per node output: (node id, eid, storage id, bytes, kind)
+    nodes = graph['nodes']
+    row_ptr = graph['node_row_ptr']
+    storage_ids = _graph_attr(graph, 'storage_id')
+    shapes = _graph_attr(graph, 'shape')
+    dtypes = _graph_attr(graph, 'dltype')
+    param_names = set(param_names) if param_names is not None else None
+    entries = []
+    for nid, node in enumerate(nodes):
+        if node['op'] == 'null':
+            is_param = node['name'] in param_names if param_names is not None else bool(_PARAM_NAME_RE.match(node['name']))
+            kind = 'constant' if is_param else 'input'
+        else:
+            kind = 'activation'
+        for eid in range(row_ptr[nid], row_ptr[nid + 1]):
+            entries.append({'nid': nid, 'eid': eid, 'sid': storage_ids[eid],
+                            'bytes': _shape_to_size(shapes[eid], dtypes[eid]), 'kind': kind})
+    return entries
+
+def compute_memory_timeline(graph_json, function_metadata=None, param_names=None):
+    # Walks the operators in execution order (node order of the graph executor) and sums the storage
+    # that is live while each one runs: a storage id lives from the operator that writes it first to
+    # the last operator that reads it, model inputs from the start and outputs until the end.
+    # The scratch workspace of an operator only lives during its own call.
+    graph = json.loads(graph_json) if isinstance(graph_json, str) else graph_json
+    function_metadata = function_metadata or {}
+    nodes = graph['nodes']
+    row_ptr = graph['node_row_ptr']
+    entries = graph_entries(graph, param_names)
+
+    pool_bytes = {}
+    pool_kind = {}
+    for e in entries:
+        pool_bytes[e['sid']] = max(pool_bytes.get(e['sid'], 0), e['bytes'])
+        # constants get a storage id of their own, otherwise the first writer decides
+        if e['sid'] not in pool_kind or e['kind'] == 'constant':
+            pool_kind[e['sid']] = e['kind']
+    eid_sid = {e['eid']: e['sid'] for e in entries}
+
+    op_nids = [nid for nid, n in enumerate(nodes) if n['op'] != 'null']
+    first_use, last_use = {}, {}
+    for sid, kind in pool_kind.items():
+        if kind == 'input':
+            first_use[sid] = 0
+    for step, nid in enumerate(op_nids):
+        for eid in range(row_ptr[nid], row_ptr[nid + 1]):
+            first_use.setdefault(eid_sid[eid], step)
+            last_use[eid_sid[eid]] = max(last_use.get(eid_sid[eid], step), step)
+        for inp in nodes[nid]['inputs']:
+            sid = eid_sid[row_ptr[inp[0]] + inp[1]]
+            last_use[sid] = max(last_use.get(sid, step), step)
+    end = max(len(op_nids) - 1, 0)
+    for head in graph['heads']:
+        last_use[eid_sid[row_ptr[head[0]] + head[1]]] = end
+
+    live_pools = [sid for sid, kind in pool_kind.items() if kind != 'constant' and sid in first_use]
+    # bytes and storage ids coming alive / dying at each step, a running sum gives the live set
+    delta_bytes = [0] * (len(op_nids) + 1)
+    delta_count = [0] * (len(op_nids) + 1)
+    for sid in live_pools:
+        last = last_use.get(sid, first_use[sid])
+        delta_bytes[first_use[sid]] += pool_bytes[sid]
+        delta_bytes[last + 1] -= pool_bytes[sid]
+        delta_count[first_use[sid]] += 1
+        delta_count[last + 1] -= 1
+    timeline = []
+    activations = live_tensors = 0
+    for step, nid in enumerate(op_nids):
+        node = nodes[nid]
+        func_name = node.get('attrs', {}).get('func_name', node['name'])
+        activations += delta_bytes[step]
+        live_tensors += delta_count[step]
+        meta = function_metadata.get(func_name) or {}
+        workspace = meta.get('workspace_sizes', 0)
+        timeline.append({'step': step, 'node': node['name'], 'op': func_name,
+                         'activations': activations, 'workspace': workspace,
+                         'total': activations + workspace, 'live_tensors': live_tensors})
+
+    constants = sum(pool_bytes[sid] for sid, kind in pool_kind.items() if kind == 'constant')
+    peak = max(timeline, key=lambda t: t['total']) if timeline else None
+    return {'timeline': timeline,
+            'peak': peak['total'] if peak else 0,
+            'peak_op': peak['op'] if peak else None,
+            'peak_step': peak['step'] if peak else None,
+            'peak_activations': peak['activations'] if peak else 0,
+            'peak_workspace': peak['workspace'] if peak else 0,
+            'max_workspace': max([t['workspace'] for t in timeline] or [0]),
+            'constants': constants,
+            # the graph executor allocates every storage id up front, this is its actual RAM use
+            'static_storage': sum(pool_bytes[sid] for sid in live_pools)}
+
+def op_live_memory(report):
+    # largest live memory of each fused op, several nodes can call the same op
+    ops = {}
+    for t in report['timeline']:
+        if t['total'] >= ops.get(t['op'], {'total': -1})['total']:
+            ops[t['op']] = t
+    return ops
+
+def print_memory_timeline(report, top=None):
+    headers = ['Step', 'Ops', 'Activations (KB)', 'Workspace (KB)', 'Live (KB)', 'Tensors', '']
+    rows = report['timeline']
+    if top is not None:
+        rows = sorted(rows, key=lambda t: t['total'], reverse=True)[:top]
+    print(tabulate([[t['step'], t['op'], t['activations'] / 1e3, t['workspace'] / 1e3, t['total'] / 1e3,
+                     t['live_tensors'], '<- peak' if t['step'] == report['peak_step'] else '']
+                    for t in rows], headers=headers))
+    print()
+    print(f"Peak live memory: {report['peak'] / 1e3} KB at {report['peak_op']} "
+          f"(activations {report['peak_activations'] / 1e3} KB, workspace {report['peak_workspace'] / 1e3} KB)")
+    print(f"Constants: {report['constants'] / 1e3} KB, graph executor storage: {report['static_storage'] / 1e3} KB, "
+          f"largest workspace: {report['max_workspace'] / 1e3} KB")
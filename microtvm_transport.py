@@ -1,22 +1,137 @@
-from tvm.micro.transport import Transport, TransportTimeouts
+from tvm.micro.transport import Transport, TransportTimeouts, IoTimeoutError
 from riotctrl.ctrl import RIOTCtrl
+import os
+import pty
+import time
+import select
+import socket
+import subprocess
 import serial
+import tracing
+
+DEFAULT_BAUDRATE = 115200
+DEFAULT_READAHEAD = 4096
+
+class SerialStream:
+
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE):
+        self._serial = serial.Serial(port, baudrate=baudrate, timeout=0)
+
+    def read(self, n, timeout_sec):
+        # wait for the first byte only, then take whatever else already arrived (up to n)
+        waiting = self._serial.in_waiting
+        if waiting:
+            return self._serial.read(min(n, waiting))
+        # only touch the port settings when the timeout actually changes
+        if self._serial.timeout != timeout_sec:
+            self._serial.timeout = timeout_sec
+        data = self._serial.read(1)
+        if data and n > 1:
+            data += self._serial.read(min(n - 1, self._serial.in_waiting))
+        return data
+
+    def write(self, data, timeout_sec):
+        if self._serial.write_timeout != timeout_sec:
+            self._serial.write_timeout = timeout_sec
+        return self._serial.write(data)
+
+    def close(self):
+        self._serial.close()
+
+class _FdStream:
+
+    def _read_fd(self, fd, n, timeout_sec):
+        ready, _, _ = select.select([fd], [], [], timeout_sec)
+        if not ready:
+            return b''
+        return os.read(fd, n)
+
+class PtyStream(_FdStream):
+    # runs a process (e.g. the RIOT native board ELF) with its stdio on a pty
+
+    def __init__(self, cmd):
+        self._master, slave = pty.openpty()
+        self._proc = subprocess.Popen(cmd, stdin=slave, stdout=slave, stderr=subprocess.DEVNULL,
+                                      close_fds=True)
+        os.close(slave)
+
+    def read(self, n, timeout_sec):
+        try:
+            return self._read_fd(self._master, n, timeout_sec)
+        except OSError: # EIO once the process exited
+            return b''
+
+    def write(self, data, timeout_sec):
+        return os.write(self._master, data)
+
+    def close(self):
+        self._proc.terminate()
+        self._proc.wait()
+        os.close(self._master)
+
+class SocketStream(_FdStream):
+    # e.g. an IoT-LAB node serial port (node:20000) or a serial-to-TCP bridge
+
+    def __init__(self, host, port):
+        self._sock = socket.create_connection((host, int(port)))
+
+    def read(self, n, timeout_sec):
+        return self._read_fd(self._sock.fileno(), n, timeout_sec)
+
+    def write(self, data, timeout_sec):
+        self._sock.settimeout(timeout_sec)
+        self._sock.sendall(data)
+        return len(data)
+
+    def close(self):
+        self._sock.close()
+
+def make_stream_backend(spec, baudrate=DEFAULT_BAUDRATE):
+    # spec: serial:/dev/ttyACM0, socket:HOST:PORT or pty:/path/to/U-TOE.elf
+    kind, _, arg = spec.partition(':')
+    if kind == 'serial':
+        return lambda: SerialStream(arg, baudrate)
+    if kind == 'socket':
+        host, _, port = arg.rpartition(':')
+        return lambda: SocketStream(host, port)
+    if kind == 'pty':
+        return lambda: PtyStream(arg.split())
+    raise ValueError(f"unknown transport backend: {spec}")
+
+def get_baudrate(env):
+    return int(env.get('UTOE_BAUDRATE') or DEFAULT_BAUDRATE)
 
 class UTOETransport(Transport):
 
-    def __init__(self, riot_ctrl, timeouts=None):
+    def __init__(self, riot_ctrl, timeouts=None, backend=None, baudrate=None, readahead=DEFAULT_READAHEAD):
         self._riot_ctrl : RIOTCtrl = riot_ctrl
         self._timeouts = timeouts
-        self._serial = None
+        self._backend = backend
+        self._baudrate = baudrate or get_baudrate(riot_ctrl.env)
+        self._readahead = readahead
+        self._stream = None
+        self._buffer = bytearray()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {'bytes_read': 0, 'bytes_written': 0, 'read_calls': 0, 'write_calls': 0,
+                       'device_reads': 0, 'read_wait_sec': 0.0, 'write_sec': 0.0,
+                       'opened_at': None, 'closed_at': None}
 
     def timeouts(self):
         assert self._timeouts is not None, "Transport not yet opened"
         return self._timeouts
 
     def open(self):
-        port = get_local_serial_port()
-        self._serial = serial.Serial(port, baudrate=115200, timeout=10)
-        
+        if self._backend is not None:
+            self._stream = self._backend()
+        else:
+            port = self._riot_ctrl.env.get('PORT') or get_local_serial_port()
+            self._stream = SerialStream(port, self._baudrate)
+        self._buffer.clear()
+        self._reset_stats()
+        self._stats['opened_at'] = time.time()
+
         self._timeouts = TransportTimeouts(
             session_start_retry_timeout_sec=2.0,
             session_start_timeout_sec=15.0,
@@ -24,26 +139,64 @@ class UTOETransport(Transport):
         )
 
     def close(self):
-        if self._serial is None:
+        if self._stream is None:
             return
-        self._serial.close()
-        self._serial = None
+        self._stream.close()
+        self._stream = None
+        self._stats['closed_at'] = time.time()
         self._riot_ctrl.stop_exp()
 
     def write(self, data, timeout_sec):
-        if self._serial is None:
+        if self._stream is None:
             return
-        self._serial.write_timeout = timeout_sec
-        return self._serial.write(data)
+        start = time.time()
+        n = self._stream.write(data, timeout_sec)
+        end = time.time()
+        self._stats['write_sec'] += end - start
+        tracing.record('transport.write', start, end, 'transport', bytes=len(data))
+        self._stats['write_calls'] += 1
+        self._stats['bytes_written'] += len(data)
+        return n
 
     def read(self, n, timeout_sec):
-        if self._serial is None:
+        if self._stream is None:
             return
-        self._serial.timeout = timeout_sec
-        return self._serial.read(n)
-
-def get_local_serial_port():
-    import subprocess, json
-    output = subprocess.check_output(f"make list-ttys-json", shell=True)
-    tty_info = json.loads(output)
-    return tty_info[0]['path']
\ No newline at end of file
+        self._stats['read_calls'] += 1
+        if not self._buffer:
+            # read ahead so the following small reads of the RPC framing hit the buffer
+            start = time.time()
+            data = self._stream.read(max(n, self._readahead), timeout_sec)
+            end = time.time()
+            self._stats['read_wait_sec'] += end - start
+            self._stats['device_reads'] += 1
+            # only device reads are traced, the buffered ones take no time
+            tracing.record('transport.read', start, end, 'transport', bytes=len(data or b''))
+            if not data:
+                raise IoTimeoutError()
+            self._buffer += data
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        self._stats['bytes_read'] += len(data)
+        return data
+
+    def stats(self):
+        stats = dict(self._stats)
+        if stats['opened_at'] is not None:
+            elapsed = (stats['closed_at'] or time.time()) - stats['opened_at']
+            stats['session_sec'] = elapsed
+            stats['read_throughput_Bps'] = stats['bytes_read'] / elapsed if elapsed > 0 else 0.0
+            stats['write_throughput_Bps'] = stats['bytes_written'] / elapsed if elapsed > 0 else 0.0
+        stats['mean_read_wait_sec'] = stats['read_wait_sec'] / max(stats['device_reads'], 1)
+        return stats
+
+_serial_port_cache = {}
+
+def get_local_serial_port(refresh=False):
+    # `make list-ttys-json` pulls in the whole RIOT build system, only ask it once per process
+    cwd = os.getcwd()
+    if refresh or cwd not in _serial_port_cache:
+        import json
+        output = subprocess.check_output(f"make list-ttys-json", shell=True)
+        tty_info = json.loads(output)
+        _serial_port_cache[cwd] = tty_info[0]['path']
+    return _serial_port_cache[cwd]
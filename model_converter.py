@@ -1,6 +1,7 @@
 import sys
 import os
-sys.path.append(os.getenv("TVM_HOME") + '/python')
+if os.getenv("TVM_HOME"):
+    sys.path.append(os.getenv("TVM_HOME") + '/python')
 
 import tvm
 import tvm.micro
@@ -9,38 +10,68 @@ from tvm import relay
 import tvm.contrib.utils
 from tvm.micro import export_model_library_format
 from tvm.driver import tvmc
+from utils import extract_io_vars_from_module
+from tracing import span
 
+# (tvm.target.target helper, argument) or a target string, resolved on first use by get_target
 RIOT_BOARD_TO_TARGET = {
-    'stm32f746g-disco': tvm.target.target.stm32('stm32F7xx'),
+    'stm32f746g-disco': ('stm32', 'stm32F7xx'),
 
-    'iotlab-m3' : tvm.target.target.stm32('stm32F1xx'),
+    'iotlab-m3' : ('stm32', 'stm32F1xx'),
 
-    'samr21-xpro' : tvm.target.target.stm32('stm32L0xx'),
-    'samr30-xpro' : tvm.target.target.stm32('stm32L0xx'),
-    'samr34-xpro' : tvm.target.target.stm32('stm32L0xx'),
+    'samr21-xpro' : ('stm32', 'stm32L0xx'),
+    'samr30-xpro' : ('stm32', 'stm32L0xx'),
+    'samr34-xpro' : ('stm32', 'stm32L0xx'),
 
-    'arduino-zero' : tvm.target.target.stm32('stm32L0xx'),
+    'arduino-zero' : ('stm32', 'stm32L0xx'),
 
-    'firefly': tvm.target.target.stm32('stm32F2xx'),
+    'firefly': ('stm32', 'stm32F2xx'),
 
-    'b-l072z-lrwan1' : tvm.target.target.stm32('stm32L0xx'),
-    'b-l475e-iot01a' : tvm.target.target.stm32('stm32L4xx'),
+    'b-l072z-lrwan1' : ('stm32', 'stm32L0xx'),
+    'b-l475e-iot01a' : ('stm32', 'stm32L4xx'),
 
-    'nrf52dk' : tvm.target.target.micro('nrf52840'),
-    'nrf52840dk' : tvm.target.target.micro('nrf52840'),
+    'nrf52dk' : ('micro', 'nrf52840'),
+    'nrf52840dk' : ('micro', 'nrf52840'),
 
-    'nucleo-wl55jc' : tvm.target.target.stm32('stm32L0xx'),
-    'microbit' : tvm.target.target.stm32('stm32F0xx'),
-    'openmote-b' : tvm.target.target.stm32('stm32F2xx'),
-    'dwm1001' : tvm.target.target.micro('nrf52840'),
+    'nucleo-wl55jc' : ('stm32', 'stm32L0xx'),
+    'microbit' : ('stm32', 'stm32F0xx'),
+    'openmote-b' : ('stm32', 'stm32F2xx'),
+    'dwm1001' : ('micro', 'nrf52840'),
 
     'hifive1b' : 'c -keys=arm_cpu,cpu -device=arm_cpu -mcpu=sifive-e31 -model=sifive-e31',
 
-    'rpi-pico' : tvm.target.target.micro('rp2040'),
-    'esp32-wroom-32' : tvm.target.target.micro('esp32'),
+    'rpi-pico' : ('micro', 'rp2040'),
+    'esp32-wroom-32' : ('micro', 'esp32'),
 
 }
 
+OPT_LEVEL = 3
+
+PER_MODEL_RUNTIME_OPTIONS = {'system-lib': False} # should not use 'system-lib:true' while AoT
+PER_MODEL_EXECUTOR_OPTIONS = {
+    "unpacked-api": True,
+    "interface-api": "c",
+    "workspace-byte-alignment": 4,
+    "link-params": True,
+}
+PER_MODEL_PASS_CONFIG = {
+    "tir.disable_vectorize": True,
+    "tir.usmp.enable": True, # what is usmp? -> Enable Unified Static Memory Planning
+}
+
+PER_OPS_RUNTIME_OPTIONS = {"system-lib": True}
+PER_OPS_PASS_CONFIG = {
+    "tir.disable_vectorize": True,
+}
+
+_TARGETS = {}
+
+def get_target(riot_board):
+    if riot_board not in _TARGETS:
+        spec = RIOT_BOARD_TO_TARGET.get(riot_board, ('micro', 'host'))
+        _TARGETS[riot_board] = spec if isinstance(spec, str) else getattr(tvm.target.target, spec[0])(spec[1])
+    return _TARGETS[riot_board]
+
 def load_from_tflite(model_path : str):
     
     tflite_model_buf = open(model_path, "rb").read()
@@ -57,39 +88,96 @@ def load_from_tflite(model_path : str):
 
     return mod, params
     
-def compile_per_model_eval(relay_mod, params, riot_board=None, mlf_path=None):
-    RUNTIME = tvm.relay.backend.Runtime("crt", {'system-lib':False}) # should not use 'system-lib:true' while AoT
-    EXECUTOR = tvm.relay.backend.Executor(
-        "aot",
-        {
-        "unpacked-api": True, 
-        "interface-api": "c", 
-        "workspace-byte-alignment": 4,
-        "link-params": True,
-        },
-    )
-    TARGET = RIOT_BOARD_TO_TARGET.get(riot_board) or tvm.target.target.micro('host')
-    with tvm.transform.PassContext(opt_level=3, config={
-                                                    "tir.disable_vectorize": True, 
-                                                    "tir.usmp.enable": True
-                                                    }): # what is usmp? -> Enable Unified Static Memory Planning
-        module = relay.build(relay_mod, target=TARGET, runtime=RUNTIME, params=params, executor=EXECUTOR)
+def get_per_model_options(compile_config=None):
+    # compile_config overrides the defaults above, see compile_config.py
+    compile_config = compile_config or {}
+    executor_options = dict(PER_MODEL_EXECUTOR_OPTIONS)
+    pass_config = dict(PER_MODEL_PASS_CONFIG)
+    if 'workspace_byte_alignment' in compile_config:
+        executor_options['workspace-byte-alignment'] = compile_config['workspace_byte_alignment']
+    if 'usmp_algorithm' in compile_config:
+        pass_config['tir.usmp.algorithm'] = compile_config['usmp_algorithm']
+    return compile_config.get('opt_level', OPT_LEVEL), executor_options, pass_config
+
+def compile_per_model_eval(relay_mod, params, riot_board=None, mlf_path=None, compile_config=None,
+                           mod_name='default'):
+    opt_level, executor_options, pass_config = get_per_model_options(compile_config)
+    RUNTIME = tvm.relay.backend.Runtime("crt", PER_MODEL_RUNTIME_OPTIONS)
+    EXECUTOR = tvm.relay.backend.Executor("aot", executor_options)
+    TARGET = get_target(riot_board)
+    with span('relay.build', board=riot_board, executor='aot', profile=True), \
+            tvm.transform.PassContext(opt_level=opt_level, config=pass_config):
+        module = relay.build(relay_mod, target=TARGET, runtime=RUNTIME, params=params, executor=EXECUTOR,
+                             mod_name=mod_name)
     if mlf_path is not None:
-        export_model_library_format(module, mlf_path)
+        with span('export_model_library_format', path=mlf_path, profile=True):
+            export_model_library_format(module, mlf_path)
     return module
 
 def compile_per_ops_eval(relay_mod, params ,riot_board=None, mlf_path=None, link_params=True):
-    RUNTIME = tvm.relay.backend.Runtime("crt", {"system-lib": True})
+    RUNTIME = tvm.relay.backend.Runtime("crt", PER_OPS_RUNTIME_OPTIONS)
     EXECUTOR = tvm.relay.backend.Executor("graph", {"link-params": link_params})
-    TARGET = RIOT_BOARD_TO_TARGET.get(riot_board) or tvm.target.target.micro('host')
-    with tvm.transform.PassContext(opt_level=3, config={
-                                                    "tir.disable_vectorize": True, 
-                                                    }): # what is usmp? -> Enable Unified Static Memory Planning
+    TARGET = get_target(riot_board)
+    with span('relay.build', board=riot_board, executor='graph', profile=True), \
+            tvm.transform.PassContext(opt_level=OPT_LEVEL, config=PER_OPS_PASS_CONFIG):
         module = relay.build(relay_mod, target=TARGET, runtime=RUNTIME, params=params, executor=EXECUTOR)
     if mlf_path is not None:
-        export_model_library_format(module, mlf_path)
+        with span('export_model_library_format', path=mlf_path, profile=True):
+            export_model_library_format(module, mlf_path)
     return module
 
 def load_model(model_path: str, shape_dict=None):
-    model = tvmc.load(model_path, shape_dict=shape_dict)
+    with span('load_model', model=model_path, profile=True):
+        model = tvmc.load(model_path, shape_dict=shape_dict)
     return model.mod, model.params
+
+def module_to_artifact(module, mode):
+    function_metadata = {}
+    for name, info in module.function_metadata.items():
+        function_metadata[str(name)] = {
+            'workspace_sizes': sum(int(v) for v in info.workspace_sizes.values()),
+            'io_sizes': sum(int(v) for v in info.io_sizes.values()),
+            'constant_sizes': sum(int(v) for v in info.constant_sizes.values()),
+        }
+    artifact = {'mode': mode, 'function_metadata': function_metadata,
+                'input_vars': None, 'output_vars': None, 'graph_json': None}
+    if mode == 'per-model':
+        artifact['input_vars'], artifact['output_vars'] = extract_io_vars_from_module(module)
+    else:
+        artifact['graph_json'] = module.get_graph_json()
+        # bound constants in the graph JSON, see memory_timeline.graph_entries
+        artifact['param_names'] = sorted(module.get_params().keys())
+    return artifact
+
+def compile_model(model_path, riot_board=None, mode='per-model', mlf_path=None,
+                  shape_dict=None, link_params=True, cache=None, compile_config=None, mod_name='default'):
+    # mod_name prefixes the generated functions (tvmgen_<mod_name>_run), several models can share one firmware
+    if mode == 'per-model':
+        opt_level, executor_options, pass_config = get_per_model_options(compile_config)
+        runtime, executor = PER_MODEL_RUNTIME_OPTIONS, {'aot': executor_options}
+    else:
+        opt_level = OPT_LEVEL
+        runtime, executor = PER_OPS_RUNTIME_OPTIONS, {'graph': {"link-params": link_params}}
+        pass_config = PER_OPS_PASS_CONFIG
+
+    key = None
+    if cache is not None:
+        key = cache.make_key(model_path, shape_dict, get_target(riot_board), executor, runtime,
+                             {'opt_level': opt_level, 'config': pass_config, 'mod_name': mod_name}, tvm.__version__)
+        with span('compile_cache.get', model=model_path, board=riot_board) as args:
+            artifact = cache.get(key, mlf_path)
+            args['hit'] = artifact is not None
+        if artifact is not None:
+            print(f"Compilation cache hit: {key[:12]}")
+            return artifact
+
+    mod, params = load_model(model_path, shape_dict)
+    if mode == 'per-model':
+        module = compile_per_model_eval(mod, params, riot_board, mlf_path, compile_config, mod_name)
+    else:
+        module = compile_per_ops_eval(mod, params, riot_board, mlf_path, link_params)
+    artifact = module_to_artifact(module, mode)
+
+    if cache is not None:
+        cache.put(key, artifact, mlf_path)
+    return artifact
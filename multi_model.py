@@ -0,0 +1,208 @@
+import os
+import re
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from evaluate import (prepare_build_dir, get_mlf_path, make_per_model_env, build_firmware, get_flashed_controller,
+                      run_per_model_trials, make_per_model_record, default_output_format,
+                      print_per_model_evaluation, get_memory_analysis)
+from model_converter import compile_model
+from compile_cache import get_compile_cache, copy_if_changed, hash_file
+from compile_config import get_pinned_config
+from results_db import ResultsDB
+from sweep import SWEEP_BUILD_ROOT, save_sweep_records
+from utils import generate_model_table_header
+
+# RIOT, the CRT runtime and the application without any model
+BASE_FIRMWARE_FLASH = 48 * 1024
+BASE_FIRMWARE_RAM = 16 * 1024
+# generated operator code per model, when there is no measured size of an earlier single-model build
+MODEL_CODE_ESTIMATE = 16 * 1024
+# keep some headroom below the budget, the sizes are estimates
+BUDGET_MARGIN = 0.9
+
+def mod_name_for(model_path, used=()):
+    # C identifier for tvmgen_<mod_name>_run, stable across runs so the compile cache hits
+    name = re.sub(r'[^0-9a-zA-Z]+', '_', os.path.splitext(os.path.basename(model_path))[0]).strip('_').lower()
+    name = 'm_' + name if not name or name[0].isdigit() else name
+    unique, i = name, 1
+    while unique in used:
+        unique, i = f'{name}_{i}', i + 1
+    return unique
+
+def codegen_model(model):
+    # runs in a spawned worker process, see Pipeline
+    prepare_build_dir(model['stage_dir'], model['mod_name'])
+    return compile_model(model['model_path'], model['board'], 'per-model',
+                         get_mlf_path(model['stage_dir'], model['mod_name']), model['shape_dict'],
+                         cache=get_compile_cache(model['use_cache']), compile_config=model['compile_config'],
+                         mod_name=model['mod_name'])
+
+def parse_mem_len(value):
+    # ROM_LEN / RAM_LEN of the RIOT cpu makefiles: 512K, 1M, 0x80000 or 524288
+    value = value.strip()
+    m = re.fullmatch(r'(0x[0-9a-fA-F]+|\d+)\s*([KkMm]?)', value)
+    if m is None:
+        return None
+    size = int(m.group(1), 0)
+    return size * {'': 1, 'k': 1024, 'm': 1024 * 1024}[m.group(2).lower()]
+
+def get_board_memory(board):
+    # (flash, ram) bytes of the board, None where the RIOT build system does not know it
+    sizes = []
+    for var in ('ROM_LEN', 'RAM_LEN'):
+        try:
+            output = subprocess.check_output(f"make BOARD={board} info-debug-variable-{var}", shell=True,
+                                             stderr=subprocess.DEVNULL)
+            sizes.append(parse_mem_len(output.decode().strip().split('\n')[-1]))
+        except (subprocess.CalledProcessError, IndexError):
+            sizes.append(None)
+    return tuple(sizes)
+
+def estimate_model_size(model, artifact, db=None):
+    # (flash, ram) of the model part of a firmware, measured by an earlier single-model build where possible
+    if db is not None:
+        for rec in db.load_records(board=model['board'], model=hash_file(model['model_path'])[:16]):
+            breakdown = rec.get('memory_breakdown')
+            if not breakdown or rec.get('config', {}).get('UTOE_MULTI_MODEL'):
+                continue
+            parts = [breakdown.get(c, {'ram': 0, 'flash': 0}) for c in ('tvm_ops', 'tvm_params', 'tvm_workspace')]
+            return sum(p['flash'] for p in parts), sum(p['ram'] for p in parts)
+    meta = artifact['function_metadata']
+    main = meta.get(f"tvmgen_{model['mod_name']}___tvm_main__") or meta.get('__tvm_main__')
+    if main is not None:
+        constants, workspace = main['constant_sizes'], main['workspace_sizes']
+    else:
+        constants = sum(m['constant_sizes'] for m in meta.values())
+        workspace = max([m['workspace_sizes'] for m in meta.values()] or [0])
+    return constants + MODEL_CODE_ESTIMATE, workspace
+
+def pack_models(models, flash_budget, ram_budget=None):
+    # first-fit decreasing on flash, the workspace pools of all models in an image are allocated statically
+    images = []
+    for model in sorted(models, key=lambda m: m['flash'], reverse=True):
+        for image in images:
+            if (sum(m['flash'] for m in image) + model['flash'] <= flash_budget and
+                    (ram_budget is None or sum(m['ram'] for m in image) + model['ram'] <= ram_budget)):
+                image.append(model)
+                break
+        else:
+            # a model over the budget still gets its own image, the build tells whether it fits
+            images.append([model])
+    return images
+
+def image_build_dir(build_root, board, index):
+    return os.path.join(build_root, f'image{index}_{board}')
+
+def prepare_image(image, build_dir):
+    for model in image:
+        prepare_build_dir(build_dir, model['mod_name'])
+        copy_if_changed(get_mlf_path(model['stage_dir'], model['mod_name']), get_mlf_path(build_dir, model['mod_name']))
+    generate_model_table_header([{'name': m['mod_name'], 'input_vars': m['artifact']['input_vars'],
+                                  'output_vars': m['artifact']['output_vars']} for m in image],
+                                output_path=os.path.join(build_dir, 'model_table.h'))
+
+def make_image_env(image, board, build_dir, trials_num, random_seed, output_format, timer):
+    env = make_per_model_env(board, build_dir, trials_num, random_seed, output_format, None, timer)
+    env['UTOE_MULTI_MODEL'] = '1'
+    env['UTOE_MODELS'] = ' '.join(m['mod_name'] for m in image)
+    return env
+
+def run_image(image, env, use_iotlab, iotlab_node, random_seed, output_format):
+    riot_ctrl = get_flashed_controller(env, use_iotlab, iotlab_node)
+    # each run ends with stop_exp, the IoT-LAB experiment has to stay up for all models of the image
+    stop_exp = riot_ctrl.stop_exp
+    riot_ctrl.stop_exp = lambda: None
+    records = []
+    try:
+        report = get_memory_analysis(env['BOARD'], env)
+        for idx, model in enumerate(image):
+            print(f"Running {model['model_path']} ({idx + 1}/{len(image)})")
+            riot_ctrl.env['UTOE_MODEL_INDEX'] = str(idx)
+            trials_record = run_per_model_trials(riot_ctrl, output_format)
+            rec = make_per_model_record(model['model_path'], dict(riot_ctrl.env), random_seed, trials_record,
+                                        model['compile_config'], model['shape_dict'])
+            rec['image'] = {'models': [m['model_path'] for m in image], 'index': idx,
+                            'model_memory': report['models'].get(model['mod_name'])}
+            records.append(rec)
+    finally:
+        stop_exp()
+    return records
+
+def run_multi_model(model_paths, boards, trials_num=10, use_iotlab=False, random_seed=42, shape_dict=None,
+                    devices=None, compile_jobs=None, build_root=SWEEP_BUILD_ROOT, use_cache=True, timer=None,
+                    flash_budget=None, ram_budget=None):
+    # model_paths: paths or dicts with model_path and shape_dict, see batch.collect_models
+    output_format = default_output_format(use_iotlab)
+    db = ResultsDB()
+    models = []
+    used = set()
+    for model in model_paths:
+        if isinstance(model, str):
+            model = {'model_path': model, 'shape_dict': shape_dict}
+        name = mod_name_for(model['model_path'], used)
+        used.add(name)
+        models.append({'model_path': model['model_path'], 'shape_dict': model.get('shape_dict'), 'mod_name': name})
+
+    all_records, failures = [], []
+    for board in boards:
+        board_models = [dict(m, board=board, use_cache=use_cache, stage_dir=os.path.join(build_root, f'stage_{board}'),
+                             compile_config=get_pinned_config(m['model_path'], board)) for m in models]
+        print("Load Model and Code Gen...")
+        with ProcessPoolExecutor(max_workers=compile_jobs or multiprocessing.cpu_count(),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(codegen_model, m) for m in board_models]
+            for model, future in zip(list(board_models), futures):
+                try:
+                    model['artifact'] = future.result()
+                except Exception as e:
+                    print(f"Code Gen failed: {model['model_path']}: {e}")
+                    failures.append({'job': model['model_path'], 'board': board, 'stage': 'codegen', 'error': str(e)})
+                    board_models.remove(model)
+                    continue
+                model['flash'], model['ram'] = estimate_model_size(model, model['artifact'], db)
+        print("Load Model and Code Gen...done")
+        if not board_models:
+            continue
+
+        board_flash, board_ram = get_board_memory(board)
+        flash = flash_budget or (board_flash and board_flash * BUDGET_MARGIN - BASE_FIRMWARE_FLASH)
+        ram = ram_budget or (board_ram and board_ram * BUDGET_MARGIN - BASE_FIRMWARE_RAM)
+        if not flash:
+            raise ValueError(f"unknown flash size of {board}, set a flash budget")
+        images = pack_models(board_models, flash, ram or None)
+        print(f"{board}: {len(board_models)} models packed into {len(images)} images")
+
+        device = ((devices or {}).get(board) or [{}])[0]
+        iotlab_node = device.get('IOTLAB_NODE')
+        index = 0
+        while images:
+            image = images.pop(0)
+            build_dir = image_build_dir(build_root, board, index)
+            index += 1
+            prepare_image(image, build_dir)
+            env = make_image_env(image, board, build_dir, trials_num, random_seed, output_format, timer)
+            env.update({k: v for k, v in device.items() if k != 'IOTLAB_NODE'})
+            print(f"Compiling image {build_dir}: {env['UTOE_MODELS']}")
+            try:
+                build_firmware(env)
+            except Exception as e:
+                if len(image) > 1:
+                    # the estimate was off, most likely the image does not fit, try both halves
+                    print(f"Build failed, splitting the image: {e}")
+                    half = len(image) // 2
+                    images[:0] = [image[:half], image[half:]]
+                else:
+                    print(f"Build failed: {image[0]['model_path']}: {e}")
+                    failures.append({'job': image[0]['model_path'], 'board': board, 'stage': 'build', 'error': str(e)})
+                continue
+            for rec in run_image(image, env, use_iotlab, iotlab_node, random_seed, output_format):
+                db.insert(rec)
+                all_records.append(rec)
+
+    print_per_model_evaluation([r.copy() for r in all_records])
+    for failure in failures:
+        print(f"Failed: {failure['job']} on {failure['board']} ({failure['stage']}): {failure['error']}")
+    save_sweep_records(all_records)
+    return all_records
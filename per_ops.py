@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+
+from utils import _shape_to_size
+
+def index_graph(graph, param_names=None):
+    # one pass over the graph JSON: params by name, node ids by fused op, input names by node
+    graph = json.loads(graph) if isinstance(graph, str) else graph
+    nodes = graph['nodes']
+    row_ptr = graph['node_row_ptr']
+    shapes = graph['attrs']['shape'][1]
+    dtypes = graph['attrs']['dltype'][1]
+    param_names = set(param_names) if param_names is not None else None
+    params_info = {}
+    op_nodes = {}
+    node_inputs = {}
+    for nid, node in enumerate(nodes):
+        if node['op'] == 'null':
+            # model inputs are not stored in flash, older cached artifacts do not know the param names
+            if param_names is None or node['name'] in param_names:
+                eid = row_ptr[nid]
+                params_info[node['name']] = {'dtype': dtypes[eid], 'shape': shapes[eid],
+                                             'bytes': _shape_to_size(shapes[eid], dtypes[eid])}
+            continue
+        op_nodes.setdefault(node['attrs']['func_name'], []).append(nid)
+        node_inputs[nid] = [nodes[i[0]]['name'] for i in node['inputs']]
+    return {'params_info': params_info, 'op_nodes': op_nodes, 'node_inputs': node_inputs}
+
+def parse_per_ops_result(index, time_list):
+    # time_list: (nodes, repeat) seconds of the debug executor, params included.
+    # Nodes calling the same fused op are summed into one record, like parse_aot_profile.
+    times = np.asarray(time_list, dtype=np.float64)
+    node_mean = times.mean(axis=1)
+    total_time = node_mean.sum()
+    params_info = index['params_info']
+    ops_rec = {}
+    for op, nids in index['op_nodes'].items():
+        if op == '__nop':
+            continue
+        op_time = node_mean[nids].sum()
+        params = []
+        for nid in nids:
+            params += [p for p in index['node_inputs'][nid] if p != 'reshape_nop' and p not in params]
+        ops_rec[op] = {'time_us': round(op_time * 1e6, 3),
+                       'time_percent': round(op_time / total_time * 100, 3) if total_time > 0 else 0.0,
+                       'params': params, 'calls': len(nids),
+                       'measurements': np.round(times[nids] * 1e6, 3).tolist(),
+                       'memory': None,
+                       'storage': sum(params_info[p]['bytes'] for p in params if p in params_info)}
+    return ops_rec
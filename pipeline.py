@@ -0,0 +1,181 @@
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tabulate import tabulate
+from tracing import span
+from evaluate import (codegen_per_model, build_firmware, get_flashed_controller, run_per_model_trials,
+                      make_per_model_record)
+
+STAGES = ['codegen', 'build', 'flash', 'measure', 'postprocess']
+
+_DONE = None
+
+def codegen_job(job):
+    codegen_per_model(job['model_path'], job['board'], job['build_dir'], job['shape_dict'], job['use_cache'],
+                      job.get('compile_config'))
+    return job
+
+def build_job(job):
+    build_firmware(job['env'])
+    return job
+
+def flash_job(job, device):
+    env = dict(job['env'], **device)
+    iotlab_node = env.pop('IOTLAB_NODE', None)
+    job['device_env'] = env
+    return get_flashed_controller(env, job['use_iotlab'], iotlab_node)
+
+def measure_job(job, riot_ctrl):
+    job['trials_record'] = run_per_model_trials(riot_ctrl, job['output_format'], job.get('early_stopping'))
+    return job
+
+def postprocess_job(job):
+    return make_per_model_record(job['model_path'], job['device_env'], job['random_seed'], job.pop('trials_record'),
+                                 job.get('compile_config'), job.get('shape_dict'))
+
+class Pipeline:
+
+    def __init__(self, boards, devices=None, codegen_workers=None, build_workers=None,
+                 postprocess_workers=1, queue_depth=1, on_record=None):
+        devices = devices or {}
+        self.devices = {board: devices.get(board) or [{}] for board in boards}
+        self.codegen_workers = codegen_workers or multiprocessing.cpu_count()
+        self.build_workers = build_workers or multiprocessing.cpu_count()
+        self.postprocess_workers = postprocess_workers
+        # at most queue_depth built firmwares wait per device, so codegen cannot run away from the boards
+        self.queue_depth = queue_depth
+        # called from a post-process worker with each finished record, e.g. to store it right away
+        self.on_record = on_record
+        self.records = []
+        self.failures = []
+        self.stage_times = []
+        self._lock = threading.Lock()
+
+    def _timed(self, job, stage, fn, *args):
+        start = time.time()
+        try:
+            with span(stage, 'pipeline', job=job['name'], board=job['board']):
+                return fn(*args)
+        finally:
+            end = time.time()
+            with self._lock:
+                self.stage_times.append({'job': job['name'], 'stage': stage, 'start': start, 'end': end})
+
+    def _fail(self, job, stage, e):
+        print(f"{stage} Failed: {job['name']}: {e}")
+        with self._lock:
+            self.failures.append({'job': job['name'], 'stage': stage, 'error': str(e)})
+
+    def _codegen_worker(self, pool, in_q, out_q):
+        while (job := in_q.get()) is not _DONE:
+            try:
+                job = self._timed(job, 'codegen', lambda j: pool.submit(codegen_job, j).result(), job)
+                out_q.put(job)
+            except Exception as e:
+                self._fail(job, 'codegen', e)
+
+    def _build_worker(self, in_q, device_queues):
+        while (job := in_q.get()) is not _DONE:
+            try:
+                self._timed(job, 'build', build_job, job)
+                device_queues[job['board']].put(job) # blocks while the board is busy: backpressure
+            except Exception as e:
+                self._fail(job, 'build', e)
+
+    def _device_worker(self, device, in_q, out_q):
+        while (job := in_q.get()) is not _DONE:
+            try:
+                riot_ctrl = self._timed(job, 'flash', flash_job, job, device)
+            except Exception as e:
+                self._fail(job, 'flash', e)
+                continue
+            try:
+                out_q.put(self._timed(job, 'measure', measure_job, job, riot_ctrl))
+            except Exception as e:
+                self._fail(job, 'measure', e)
+
+    def _postprocess_worker(self, in_q):
+        while (job := in_q.get()) is not _DONE:
+            try:
+                rec = self._timed(job, 'postprocess', postprocess_job, job)
+                rec['stage_times'] = {t['stage']: t['end'] - t['start']
+                                      for t in self.stage_times if t['job'] == job['name']}
+                with self._lock:
+                    self.records.append(rec)
+                if self.on_record is not None:
+                    self.on_record(rec)
+            except Exception as e:
+                self._fail(job, 'postprocess', e)
+
+    def run(self, jobs):
+        self._start = time.time()
+        codegen_q, build_q, post_q = queue.Queue(), queue.Queue(maxsize=self.build_workers), queue.Queue()
+        device_queues = {board: queue.Queue(maxsize=len(devs) * self.queue_depth)
+                         for board, devs in self.devices.items()}
+
+        def spawn(target, n, *args):
+            threads = [threading.Thread(target=target, args=args) for _ in range(n)]
+            for t in threads:
+                t.start()
+            return threads
+
+        # TVM is not fork-safe, spawn fresh interpreters for the codegen workers
+        with ProcessPoolExecutor(max_workers=self.codegen_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            codegen_threads = spawn(self._codegen_worker, self.codegen_workers, pool, codegen_q, build_q)
+            build_threads = spawn(self._build_worker, self.build_workers, build_q, device_queues)
+            device_threads = []
+            for board, devs in self.devices.items():
+                for device in devs:
+                    device_threads += spawn(self._device_worker, 1, device, device_queues[board], post_q)
+            post_threads = spawn(self._postprocess_worker, self.postprocess_workers, post_q)
+
+            for job in jobs:
+                codegen_q.put(job)
+            for threads, q in [(codegen_threads, codegen_q), (build_threads, build_q)]:
+                for _ in threads:
+                    q.put(_DONE)
+                for t in threads:
+                    t.join()
+        for board, devs in self.devices.items():
+            for _ in devs:
+                device_queues[board].put(_DONE)
+        for t in device_threads:
+            t.join()
+        for _ in post_threads:
+            post_q.put(_DONE)
+        for t in post_threads:
+            t.join()
+        self._end = time.time()
+        return self.records
+
+    def stage_summary(self):
+        workers = {'codegen': self.codegen_workers, 'build': self.build_workers,
+                   'flash': sum(len(d) for d in self.devices.values()),
+                   'measure': sum(len(d) for d in self.devices.values()),
+                   'postprocess': self.postprocess_workers}
+        wall = max(self._end - self._start, 1e-9)
+        summary = []
+        for stage in STAGES:
+            durations = np.array([t['end'] - t['start'] for t in self.stage_times if t['stage'] == stage])
+            if durations.size == 0:
+                continue
+            summary.append({'stage': stage, 'jobs': durations.size, 'total': durations.sum(),
+                            'mean': durations.mean(), 'max': durations.max(),
+                            # busy time per worker relative to the wall time, the highest one is the bottleneck
+                            'utilization': durations.sum() / workers[stage] / wall})
+        return summary
+
+    def print_stage_summary(self):
+        summary = self.stage_summary()
+        headers = ['Stage', 'Jobs', 'Total (s)', 'Mean (s)', 'Max (s)', 'Utilization (%)']
+        output_list = [[s['stage'], s['jobs'], round(s['total'], 3), round(s['mean'], 3),
+                        round(s['max'], 3), round(s['utilization'] * 100, 1)] for s in summary]
+        print(tabulate(output_list, headers=headers))
+        if summary:
+            bottleneck = max(summary, key=lambda s: s['utilization'])
+            print(f"Wall time: {round(self._end - self._start, 3)} s, bottleneck stage: {bottleneck['stage']}")
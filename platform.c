@@ -29,7 +29,7 @@
 #include <tvm/runtime/crt/error_codes.h>
 #include <tvm/runtime/crt/page_allocator.h>
 #include <tvm/runtime/crt/logging.h>
-#include "xtimer.h"
+#include "utoe_timer.h"
 #include "random.h"
 
 // uint8_t memory[TVM_WORKSPACE_SIZE_BYTES];
@@ -67,7 +67,7 @@ tvm_crt_error_t TVMPlatformMemoryFree(void* ptr, DLDevice dev) {
   return kTvmErrorNoError;
 }
 
-unsigned long g_utvm_start_time_micros;
+uint32_t g_utvm_start_time_ticks;
 int g_utvm_timer_running = 0;
 // Start a device timer.
 tvm_crt_error_t TVMPlatformTimerStart(void) { 
@@ -75,20 +75,20 @@ tvm_crt_error_t TVMPlatformTimerStart(void) {
     return kTvmErrorPlatformTimerBadState;
   }
   g_utvm_timer_running = 1;
-  g_utvm_start_time_micros = xtimer_now_usec();
+  g_utvm_start_time_ticks = utoe_timer_now();
   return kTvmErrorNoError;
 
 }
 
-// Stop the running device timer and get the elapsed time (in microseconds).
+// Stop the running device timer and get the elapsed time (in seconds).
 tvm_crt_error_t TVMPlatformTimerStop(double* elapsed_time_seconds) { 
 
   if (!g_utvm_timer_running) {
     return kTvmErrorPlatformTimerBadState;
   }
   g_utvm_timer_running = 0;
-  unsigned long g_utvm_stop_time = xtimer_now_usec() - g_utvm_start_time_micros;
-  *elapsed_time_seconds = ((double)g_utvm_stop_time) / 1e6;
+  uint32_t g_utvm_stop_time = utoe_timer_now() - g_utvm_start_time_ticks;
+  *elapsed_time_seconds = ((double)g_utvm_stop_time) / UTOE_TIMER_HZ;
   return kTvmErrorNoError;
 
 }
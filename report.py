@@ -0,0 +1,89 @@
+import os
+import json
+
+from tabulate import tabulate
+
+# Printing of saved records, kept free of TVM and riotctrl so the reporting commands start fast
+
+LOG_DIR = './logs'
+
+def print_memory_analysis(report):
+    headers = ['Category', 'Memory (KB)', 'Storage (KB)', 'Symbols']
+    output_list = [[category, entry['ram'] / 1e3, entry['flash'] / 1e3, entry['symbols']]
+                   for category, entry in sorted(report['breakdown'].items(),
+                                                 key=lambda x: x[1]['ram'] + x[1]['flash'], reverse=True)]
+    output_list.append(['total', report['memory'] / 1e3, report['storage'] / 1e3, None])
+    print(tabulate(output_list, headers=headers))
+    print()
+    headers = ['Symbol', 'Category', 'Section', 'Memory (B)', 'Storage (B)']
+    print(tabulate([[s['name'], s['category'], s['section'], s['ram'], s['flash']] for s in report['top_symbols']],
+                   headers=headers))
+
+def print_per_model_evaluation(rec):
+    headers = ['Board', 'Memory (KB)', 'Storage (KB)', 
+               '95-CI (ms)', 'Mean (ms)', 'Median (ms)', 'Min. (ms)', 'Max. (ms)']
+    
+    if not isinstance(rec, list):
+        rec = [rec]
+    show_model = len(set(r.get('model_path') for r in rec)) > 1
+    if show_model:
+        headers = ['Model'] + headers
+    
+    output_list = []
+    for r in rec:
+        stats = r['trials_stats_in_usec']
+        ci = [0, 0]
+        # cycle counting timers resolve below one microsecond
+        ci[0] = round(stats['95ci'][0] / 1e3, 6)
+        ci[1] = round(stats['95ci'][1] / 1e3, 6)
+
+        mean = round(stats['mean'] / 1e3, 6)
+        median = round(stats['median'] / 1e3, 6)
+        min = round(stats['min'] / 1e3, 6)
+        max = round(stats['max'] / 1e3, 6)
+        row = [r['board'], r['memory'] / 1e3, r['storage'] / 1e3,
+                                ci, mean, median, min ,max]
+        if show_model:
+            row = [os.path.basename(r['model_path'])] + row
+        output_list.append(row)
+    
+    tabular_output = tabulate(output_list, headers=headers)
+    print(tabular_output)
+
+def print_benchmark_summary(rec):
+    # only shown for runs with warm-up or burst, see make_per_model_env
+    if not rec.get('warmup_record') and not rec.get('throughput'):
+        return
+    jitter = rec['jitter_stats_in_usec']
+    output_list = [['p50 / p95 / p99 (ms)', ' / '.join(str(round(jitter[k] / 1e3, 6)) for k in ('p50', 'p95', 'p99'))],
+                   ['Max. deviation from median (ms)', round(jitter['max_deviation'] / 1e3, 6)]]
+    if rec.get('warmup_record'):
+        output_list.append(['Warm-up runs', len(rec['warmup_record']['usec'])])
+        output_list.append(['Cold start (ms)', round(rec['cold_start_usec'] / 1e3, 6)])
+    if rec.get('throughput'):
+        output_list.append(['Sustained (inferences/s)', round(rec['throughput']['inferences_per_sec'], 3)])
+        output_list.append(['Sustained mean (ms)', round(rec['throughput']['mean_usec'] / 1e3, 6)])
+    print(tabulate(output_list, headers=['Benchmark', rec['board']]))
+
+def load_logs_from_folder(dir_path):
+    import glob
+    json_dict = []
+    for filepath in glob.iglob(f"{dir_path}/*.json"):
+        with open(filepath, 'r') as f:
+            rec = json.load(f)
+        # sweep logs hold a list of records
+        if isinstance(rec, list):
+            json_dict.extend(rec)
+        else:
+            json_dict.append(rec)
+    print_per_model_evaluation(json_dict)
+
+def print_per_ops_evaluation(rec):
+    headers = ['Ops', 'Time (us)', 'Time (%)', 
+               'Params', 'Memory (KB)', 'Storage (KB)'] 
+    output_list = []
+    for k,v in rec.items():
+        output = [k, v['time_us'], v['time_percent'], v['params'], v['memory'] / 1e3 , v['storage'] / 1e3]
+        output_list.append(output)
+    tabular_output = tabulate(output_list, headers=headers)
+    print(tabular_output)
@@ -0,0 +1,170 @@
+import os
+import glob
+import json
+import time
+import sqlite3
+import hashlib
+
+from utils import NpEncoder
+
+DB_PATH = './logs/results.db'
+
+# build settings that do not change the measurement
+CONFIG_ENV_EXCLUDE = ('UTOE_BUILD_DIR', 'UTOE_OUTPUT_FORMAT', 'UTOE_BAUDRATE')
+CONFIG_ENV_DEFAULTS = {'UTOE_TIMER': 'xtimer', 'UTOE_GRANULARITY': '0'}
+
+def make_evaluation_config(env, early_stopping=None, compile_config=None, shape_dict=None):
+    config = dict(CONFIG_ENV_DEFAULTS)
+    config.update({k: v for k, v in env.items() if k.startswith('UTOE_') and k not in CONFIG_ENV_EXCLUDE})
+    # the same model file compiled for another input shape is another measurement
+    if shape_dict is not None:
+        config['shape_dict'] = shape_dict
+    if early_stopping is not None:
+        config['early_stopping'] = early_stopping
+    if compile_config is not None:
+        config['compile'] = compile_config
+    return config
+
+def get_config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_hash TEXT NOT NULL,
+    model_path TEXT,
+    board TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    config TEXT,
+    mode TEXT,
+    datetime TEXT,
+    created_at REAL NOT NULL,
+    trials INTEGER,
+    mean_usec REAL,
+    median_usec REAL,
+    min_usec REAL,
+    max_usec REAL,
+    ci_low_usec REAL,
+    ci_high_usec REAL,
+    memory INTEGER,
+    storage INTEGER,
+    record TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_key ON results (model_hash, board, config_hash, created_at);
+CREATE INDEX IF NOT EXISTS idx_results_board ON results (board, created_at);
+"""
+
+COLUMNS = ['model_hash', 'model_path', 'board', 'config_hash', 'config', 'mode', 'datetime', 'created_at',
+           'trials', 'mean_usec', 'median_usec', 'min_usec', 'max_usec', 'ci_low_usec', 'ci_high_usec',
+           'memory', 'storage', 'record']
+
+class ResultsDB:
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # one short-lived connection per call, so pipeline worker threads can store results concurrently
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def insert(self, rec):
+        stats = rec.get('trials_stats_in_usec') or {}
+        ci = stats.get('95ci') or (None, None)
+        trials_record = rec.get('trials_record') or {}
+        row = {'model_hash': rec['model_hash'], 'model_path': rec.get('model_path'), 'board': rec['board'],
+               'config_hash': rec['config_hash'], 'config': json.dumps(rec.get('config'), sort_keys=True),
+               'mode': rec.get('mode'), 'datetime': rec.get('datetime'), 'created_at': time.time(),
+               'trials': len(trials_record.get('usec', [])),
+               'mean_usec': _float(stats.get('mean')), 'median_usec': _float(stats.get('median')),
+               'min_usec': _float(stats.get('min')), 'max_usec': _float(stats.get('max')),
+               'ci_low_usec': _float(ci[0]), 'ci_high_usec': _float(ci[1]),
+               'memory': rec.get('memory'), 'storage': rec.get('storage'),
+               'record': json.dumps(rec, cls=NpEncoder)}
+        with self._connect() as conn:
+            conn.execute(f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                         [row[c] for c in COLUMNS])
+
+    def latest(self, model_hash, board, config_hash):
+        with self._connect() as conn:
+            return conn.execute("SELECT * FROM results WHERE model_hash = ? AND board = ? AND config_hash = ? "
+                                "ORDER BY created_at DESC LIMIT 1", (model_hash, board, config_hash)).fetchone()
+
+    def has_record(self, model_hash, board, config_hash, datetime):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM results WHERE model_hash = ? AND board = ? AND config_hash = ? "
+                                "AND datetime IS ?", (model_hash, board, config_hash, datetime)).fetchone() is not None
+
+    def is_fresh(self, model_hash, board, config_hash, max_age_sec=None):
+        row = self.latest(model_hash, board, config_hash)
+        if row is None:
+            return False
+        return max_age_sec is None or time.time() - row['created_at'] <= max_age_sec
+
+    def query(self, board=None, model=None, latest_only=True):
+        where, args = [], []
+        if board is not None:
+            where.append("board = ?")
+            args.append(board)
+        if model is not None:
+            where.append("(model_path LIKE ? OR model_hash LIKE ?)")
+            args += [f'%{model}%', f'{model}%']
+        sql = "SELECT * FROM results"
+        if latest_only:
+            # only the newest result of each (model, board, config)
+            sql += (" WHERE id IN (SELECT id FROM results r WHERE created_at = "
+                    "(SELECT MAX(created_at) FROM results WHERE model_hash = r.model_hash "
+                    "AND board = r.board AND config_hash = r.config_hash))")
+            sql += (" AND " if where else "") + " AND ".join(where)
+        elif where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY model_path, board"
+        with self._connect() as conn:
+            return conn.execute(sql, args).fetchall()
+
+    def load_records(self, **kwargs):
+        return [json.loads(row['record']) for row in self.query(**kwargs)]
+
+    def import_logs(self, dir_path):
+        # migrate JSON logs written by save_evaluation_record / save_sweep_records
+        from compile_cache import hash_file
+        imported = 0
+        for filepath in glob.iglob(f'{dir_path}/*.json'):
+            with open(filepath, 'r') as f:
+                recs = json.load(f)
+            for rec in recs if isinstance(recs, list) else [recs]:
+                if rec.get('mode') != 'per-model':
+                    continue
+                if 'model_hash' not in rec:
+                    if not os.path.isfile(rec['model_path']):
+                        continue
+                    rec['model_hash'] = hash_file(rec['model_path'])
+                    rec['config'] = make_evaluation_config({'UTOE_TRIAL_NUM': str(len(rec['trials_record']['usec'])),
+                                                            'UTOE_RANDOM_SEED': str(rec['random_seed'])})
+                    rec['config_hash'] = get_config_hash(rec['config'])
+                # a log imported before, or the same run in a sweep log and its own log
+                if self.has_record(rec['model_hash'], rec['board'], rec['config_hash'], rec.get('datetime')):
+                    continue
+                self.insert(rec)
+                imported += 1
+        return imported
+
+def _float(x):
+    return None if x is None else float(x)
+
+def print_results(rows):
+    from tabulate import tabulate
+    headers = ['Model', 'Board', 'Config', 'Trials', 'Memory (KB)', 'Storage (KB)',
+               '95-CI (ms)', 'Mean (ms)', 'Median (ms)', 'Datetime']
+    output_list = [[os.path.basename(r['model_path'] or r['model_hash'][:12]), r['board'], r['config_hash'][:8],
+                    r['trials'], (r['memory'] or 0) / 1e3, (r['storage'] or 0) / 1e3,
+                    [round(r['ci_low_usec'] / 1e3, 6), round(r['ci_high_usec'] / 1e3, 6)]
+                    if r['ci_low_usec'] is not None else None,
+                    round(r['mean_usec'] / 1e3, 6), round(r['median_usec'] / 1e3, 6), r['datetime']]
+                   for r in rows]
+    print(tabulate(output_list, headers=headers))
@@ -0,0 +1,73 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+from evaluate import (make_per_model_env, print_per_model_evaluation, default_output_format,
+                      NpEncoder, LOG_DIR)
+from pipeline import Pipeline
+from compile_config import get_pinned_config
+
+SWEEP_BUILD_ROOT = './build'
+
+def job_build_dir(build_root, model_path, board, shape_dict=None):
+    # models of the same file name in other directories, or one model at several input shapes, get their own dir
+    model_name = os.path.splitext(os.path.basename(model_path))[0]
+    key = hashlib.sha256(json.dumps([os.path.abspath(model_path), shape_dict], sort_keys=True).encode()).hexdigest()[:8]
+    return os.path.join(build_root, f'{model_name}_{key}_{board}')
+
+def parse_devices(device_args):
+    # BOARD=PORT[,SERIAL] for local boards or BOARD=NODE_URL for IoT-LAB nodes
+    devices = {}
+    for arg in device_args or []:
+        board, spec = arg.split('=', 1)
+        if '.iot-lab.info' in spec:
+            dev = {'IOTLAB_NODE': spec}
+        else:
+            port, _, serial = spec.partition(',')
+            dev = {'PORT': port}
+            if serial:
+                dev['SERIAL'] = serial
+        devices.setdefault(board, []).append(dev)
+    return devices
+
+def make_sweep_jobs(models, boards, trials_num=10, use_iotlab=False, random_seed=42, shape_dict=None,
+                    build_root=SWEEP_BUILD_ROOT, use_cache=True, timer=None, early_stopping=None):
+    # models: model paths, or dicts with model_path and an own shape_dict
+    output_format = default_output_format(use_iotlab)
+    jobs = []
+    names = set()
+    for model in models:
+        if isinstance(model, str):
+            model = {'model_path': model, 'shape_dict': shape_dict}
+        for board in boards:
+            build_dir = job_build_dir(build_root, model['model_path'], board, model.get('shape_dict'))
+            if os.path.basename(build_dir) in names:
+                raise ValueError(f"{model['model_path']} is listed twice for {board} with the same input shape")
+            names.add(os.path.basename(build_dir))
+            env = make_per_model_env(board, build_dir, trials_num, random_seed, output_format, early_stopping, timer)
+            jobs.append({'name': os.path.basename(build_dir), 'model_path': model['model_path'], 'board': board,
+                         'build_dir': build_dir, 'env': env, 'shape_dict': model.get('shape_dict'),
+                         'use_cache': use_cache, 'use_iotlab': use_iotlab, 'random_seed': random_seed,
+                         'output_format': output_format, 'early_stopping': early_stopping,
+                         'compile_config': get_pinned_config(model['model_path'], board)})
+    return jobs
+
+def run_sweep(model_paths, boards, trials_num=10, use_iotlab=False, random_seed=42, shape_dict=None,
+              devices=None, compile_jobs=None, build_root=SWEEP_BUILD_ROOT, use_cache=True, timer=None):
+    jobs = make_sweep_jobs(model_paths, boards, trials_num, use_iotlab, random_seed, shape_dict,
+                           build_root, use_cache, timer)
+    pipeline = Pipeline(boards, devices, codegen_workers=compile_jobs)
+    records = pipeline.run(jobs)
+    pipeline.print_stage_summary()
+
+    print_per_model_evaluation([r.copy() for r in records])
+    save_sweep_records(records)
+    return records
+
+def save_sweep_records(records, log_dir=LOG_DIR):
+    os.makedirs(log_dir, exist_ok=True)
+    file_path = os.path.join(log_dir, 'sweep_' + datetime.now().strftime("%Y%m%d-%H%M%S") + '.json')
+    with open(file_path, 'w') as f:
+        json.dump(records, f, cls=NpEncoder)
+    return file_path
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules live in the repository root, next to u-toe.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
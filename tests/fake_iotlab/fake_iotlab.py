@@ -0,0 +1,73 @@
+# Stand-in for iotlab-experiment and iotlab-node (see IotlabCLI), the experiments live in the JSON file of
+# FAKE_IOTLAB_STATE: {'next_id', 'experiments': {id: {state, nodes, profile}}, 'broken': [nodes], 'fail': {command: n}}.
+# 'fail' makes the next n calls of a command (submit, wait, get, stop, reset) exit with an error.
+import os
+import sys
+import json
+import argparse
+
+def load():
+    with open(os.environ['FAKE_IOTLAB_STATE'], 'r') as f:
+        return json.load(f)
+
+def save(state):
+    with open(os.environ['FAKE_IOTLAB_STATE'], 'w') as f:
+        json.dump(state, f)
+
+def check_fail(state, command):
+    if state['fail'].get(command, 0) > 0:
+        state['fail'][command] -= 1
+        save(state)
+        sys.exit(f"fake {command} failed")
+
+def experiment(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command')
+    parser.add_argument('-i', dest='exp_id')
+    parser.add_argument('-n', dest='name')
+    parser.add_argument('-d', dest='duration')
+    parser.add_argument('-l', dest='resources')
+    parser.add_argument('-s', dest='get_state', action='store_true')
+    parser.add_argument('-r', dest='get_resources', action='store_true')
+    parser.add_argument('--timeout')
+    args = parser.parse_args(argv)
+    state = load()
+    check_fail(state, 'get' if args.command == 'get' else args.command)
+    if args.command == 'submit':
+        # 2,archi=m3:at86rf231+site=grenoble[+profile=...]
+        count, spec = args.resources.split(',', 1)
+        props = dict(p.split('=', 1) for p in spec.split('+'))
+        exp_id = str(state['next_id'])
+        state['next_id'] += 1
+        first = sum(len(e['nodes']) for e in state['experiments'].values()) + 1
+        nodes = [f"{props['archi'].split(':')[0]}-{first + k}.{props['site']}.iot-lab.info" for k in range(int(count))]
+        state['experiments'][exp_id] = {'state': 'Waiting', 'nodes': nodes, 'profile': props.get('profile')}
+        print(json.dumps({'id': int(exp_id)}))
+    elif args.command == 'wait':
+        state['experiments'][args.exp_id]['state'] = 'Running'
+        print('"Running"')
+    elif args.command == 'get' and args.get_state:
+        print(json.dumps({'state': state['experiments'][args.exp_id]['state']}))
+    elif args.command == 'get':
+        print(json.dumps({'items': [{'network_address': n} for n in state['experiments'][args.exp_id]['nodes']]}))
+    elif args.command == 'stop':
+        state['experiments'][args.exp_id]['state'] = 'Terminated'
+        print(json.dumps({'id': int(args.exp_id), 'status': 'Delete request registered'}))
+    save(state)
+
+def node(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reset', action='store_true')
+    parser.add_argument('-i', dest='exp_id')
+    parser.add_argument('-l', dest='nodes')
+    args = parser.parse_args(argv)
+    state = load()
+    check_fail(state, 'reset')
+    site, archi, num = args.nodes.split(',')
+    name = f'{archi}-{num}.{site}.iot-lab.info'
+    ok = state['experiments'][args.exp_id]['state'] == 'Running' and name not in state['broken']
+    print(json.dumps({'0' if ok else '1': [name]}))
+
+if __name__ == '__main__':
+    # invoked by the iotlab-experiment / iotlab-node wrappers next to this file with their own name first
+    {'iotlab-experiment': experiment, 'iotlab-node': node}[sys.argv[1]](sys.argv[2:])
@@ -0,0 +1,53 @@
+import os
+import json
+
+import pytest
+
+from batch import collect_models, filter_fresh_jobs
+from sweep import make_sweep_jobs
+from results_db import ResultsDB, make_evaluation_config, get_config_hash
+from compile_cache import hash_file
+
+@pytest.fixture
+def manifest(tmp_path):
+    # one model at two input shapes and a second model of the same file name in another directory
+    for d in ('a', 'b'):
+        (tmp_path / d).mkdir()
+        (tmp_path / d / 'net.onnx').write_bytes(d.encode())
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps([{'model_path': 'a/net.onnx', 'input_shape': [1, 3, 32, 32]},
+                                {'model_path': 'a/net.onnx', 'input_shape': [1, 3, 64, 64]},
+                                {'model_path': 'b/net.onnx', 'input_shape': [1, 3, 32, 32]}]))
+    return str(path)
+
+def test_collect_models_keeps_shapes(manifest):
+    models = collect_models(manifest)
+    assert [m['shape_dict'] for m in models] == [{'input': [1, 3, 32, 32]}, {'input': [1, 3, 64, 64]},
+                                                 {'input': [1, 3, 32, 32]}]
+    assert models[0]['model_path'] == models[1]['model_path']
+
+def test_jobs_of_one_model_at_two_shapes_get_own_build_dirs(manifest, tmp_path):
+    jobs = make_sweep_jobs(collect_models(manifest), ['native', 'nrf52840dk'], build_root=str(tmp_path / 'build'))
+    assert len(jobs) == 6
+    assert len({j['build_dir'] for j in jobs}) == 6
+    assert len({j['name'] for j in jobs}) == 6
+    assert all(j['env']['UTOE_BUILD_DIR'] == os.path.abspath(j['build_dir']) for j in jobs)
+    # stable across runs, so incremental builds find their dir again
+    again = make_sweep_jobs(collect_models(manifest), ['native', 'nrf52840dk'], build_root=str(tmp_path / 'build'))
+    assert [j['build_dir'] for j in again] == [j['build_dir'] for j in jobs]
+
+def test_duplicate_manifest_entry_is_rejected(manifest, tmp_path):
+    models = collect_models(manifest)
+    with pytest.raises(ValueError):
+        make_sweep_jobs(models + models[:1], ['native'], build_root=str(tmp_path / 'build'))
+
+def test_result_of_one_shape_does_not_make_the_other_fresh(manifest, tmp_path):
+    jobs = make_sweep_jobs(collect_models(manifest), ['native'], build_root=str(tmp_path / 'build'))
+    db = ResultsDB(str(tmp_path / 'results.db'))
+    done = jobs[0]
+    config = make_evaluation_config(done['env'], None, None, done['shape_dict'])
+    db.insert({'model_hash': hash_file(done['model_path']), 'model_path': done['model_path'], 'board': 'native',
+               'config': config, 'config_hash': get_config_hash(config), 'mode': 'per-model'})
+    todo, skipped = filter_fresh_jobs(jobs, db)
+    assert skipped == [done]
+    assert todo == jobs[1:]
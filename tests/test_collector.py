@@ -0,0 +1,152 @@
+import os
+import pty
+import tty
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+import collector
+from trial_protocol import encode_frame, make_start_command, FRAME_HEADER, FRAME_TRIAL, FRAME_BURST, FRAME_END
+
+class FakeBoard:
+    # the per-model firmware behind a pty: prints the prompt after each reset, reads the start command and
+    # sends its trials. hang_boots: the first boots that send one trial and then stay silent.
+
+    def __init__(self, output_format='binary', hang_boots=0, ticks=1000):
+        self.output_format = output_format
+        self.hang_boots = hang_boots
+        self.ticks = ticks
+        self.boots = 0
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._reset = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def reset(self):
+        self._reset.set()
+
+    def device(self, name, **kwargs):
+        return dict({'name': name, 'port': self.port, 'reset': self.reset}, **kwargs)
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _read_line(self):
+        line = b''
+        while not line.endswith(b'\n'):
+            line += os.read(self.master, 1)
+        return line
+
+    def _run(self):
+        try:
+            while True:
+                self._reset.wait()
+                self._reset.clear()
+                self.boots += 1
+                os.write(self.master, b'main(): This is RIOT!\nSend s [trials [seed]] to start >\n')
+                trials_num = int(self._read_line().split()[1])
+                hang = self.boots <= self.hang_boots
+                self._send(1 if hang else trials_num, finish=not hang)
+        except OSError:
+            # closed by the test
+            pass
+
+    def _send(self, trials_num, finish):
+        ticks = [self.ticks + i for i in range(trials_num)]
+        if self.output_format == 'binary':
+            out = encode_frame(FRAME_HEADER, struct.pack('<BIBIB', 3, trials_num, 2, 2000000, 0))
+            out += b''.join(encode_frame(FRAME_TRIAL, struct.pack('<IIi', i, t, 0)) for i, t in enumerate(ticks))
+            if finish:
+                out += encode_frame(FRAME_BURST, struct.pack('<III', 10, 20000, 0))
+                out += encode_frame(FRAME_END, struct.pack('<I', trials_num))
+        else:
+            out = b'timer: 2, hz: 2000000 \n'
+            out += b''.join(b'trial: %d, ticks: %d, ret: 0 \n' % (i, t) for i, t in enumerate(ticks))
+            if finish:
+                out += b'burst: 10, ticks_hi: 0, ticks_lo: 20000 \nEvaluation finished >\n'
+        # in small pieces, frames and lines are split across reads
+        for i in range(0, len(out), 7):
+            os.write(self.master, out[i:i + 7])
+
+@pytest.fixture
+def boards():
+    created = []
+    def make(*args, **kwargs):
+        created.append(FakeBoard(*args, **kwargs))
+        return created[-1]
+    yield make
+    for board in created:
+        board.close()
+
+@pytest.mark.parametrize('output_format', ['binary', 'text'])
+def test_collect_trials(boards, output_format):
+    board = boards(output_format)
+    result, = collector.collect_trials([board.device('a')], make_start_command(20), output_format,
+                                       prompt_timeout=2, idle_timeout=2)
+    assert result['error'] is None
+    assert result['attempts'] == 1
+    record = result['trials_record']
+    assert list(record['trial']) == list(range(20))
+    assert list(record['ticks']) == [1000 + i for i in range(20)]
+    # 2 MHz dwt ticks
+    assert record['timer'] == {'backend': 'dwt', 'hz': 2000000}
+    assert np.allclose(record['usec'], (1000 + np.arange(20)) / 2)
+    assert record['burst']['count'] == 10
+
+def test_trials_are_reported_as_they_arrive(boards):
+    board = boards('binary')
+    seen = []
+    collector.collect_trials([board.device('a')], make_start_command(5), 'binary', prompt_timeout=2, idle_timeout=2,
+                             on_trial=lambda device, trial, ticks, ret: seen.append((device['name'], trial, ticks)))
+    assert seen == [('a', i, 1000 + i) for i in range(5)]
+
+def test_silent_board_is_reset_while_others_finish(boards):
+    good, flaky, dead = boards('binary'), boards('binary', hang_boots=1, ticks=3000), boards('binary', hang_boots=9)
+    good_result, flaky_result, dead_result = collector.collect_trials(
+        [good.device('good'), flaky.device('flaky'), dead.device('dead')], make_start_command(50), 'binary',
+        prompt_timeout=2, idle_timeout=0.5, retries=1)
+    assert good_result['error'] is None and good_result['attempts'] == 1
+    assert len(good_result['trials_record']['usec']) == 50
+    # finished while the others were still waiting for their idle timeout
+    assert good_result['elapsed_sec'] < 0.5
+    # silent after one trial, reset and run again from the start
+    assert flaky_result['error'] is None and flaky_result['attempts'] == 2
+    assert flaky.boots == 2
+    assert list(flaky_result['trials_record']['ticks']) == [3000 + i for i in range(50)]
+    assert dead_result['trials_record'] is None
+    assert dead_result['attempts'] == 2 and 'TimeoutError' in dead_result['error']
+    assert dead.boots == 2
+
+def test_text_board_recovers_after_reset(boards):
+    board = boards('text', hang_boots=1)
+    result, = collector.collect_trials([board.device('a')], make_start_command(8), 'text', prompt_timeout=2,
+                                       idle_timeout=0.5, retries=1)
+    assert result['error'] is None
+    assert result['attempts'] == 2
+    assert board.boots == 2
+    assert len(result['trials_record']['usec']) == 8
+
+def test_board_without_reset_gets_the_start_command(boards):
+    # the prompt was printed before the port was opened, the firmware still waits for the start command
+    board = boards('binary')
+    board.reset()
+    result, = collector.collect_trials([{'name': 'a', 'port': board.port}], make_start_command(3), 'binary',
+                                       prompt_timeout=0.3, idle_timeout=2)
+    assert result['error'] is None
+    assert len(result['trials_record']['usec']) == 3
+
+def test_unsupported_baudrate_fails_only_that_device(boards):
+    good, bad = boards('binary'), boards('binary')
+    good_result, bad_result = collector.collect_trials(
+        [good.device('good'), bad.device('bad', baudrate=123456)], make_start_command(5), 'binary',
+        prompt_timeout=2, idle_timeout=2)
+    assert good_result['error'] is None
+    assert len(good_result['trials_record']['usec']) == 5
+    assert bad_result['trials_record'] is None
+    assert bad_result['attempts'] == 1
+    assert 'ValueError' in bad_result['error'] and '123456' in bad_result['error']
+    assert bad.boots == 0
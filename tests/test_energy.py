@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import DATA_DIR
+from energy import (read_oml_trace, read_csv_trace, load_power_trace, detect_active_windows, align_trials,
+                    analyze_energy)
+
+# Synthetic trace, 200 us samples, 0.10 W idle and 0.16 W active with 1 mW noise, 5 ms gaps:
+# 2 warm-up runs (4.0 and 3.2 ms), 5 trials and a 12 ms burst. Trial windows also hold 0.4 ms of output.
+OML_TRACE = os.path.join(DATA_DIR, 'consumption_m3_10.oml')
+CSV_TRACE = os.path.join(DATA_DIR, 'power_analyzer.csv')
+TRIALS_USEC = [2000, 2400, 1800, 2200, 2000]
+BURST = {'count': 6, 'usec': 12000}
+SAMPLES = 387
+
+def test_read_oml_trace():
+    t, power = read_oml_trace(OML_TRACE)
+    assert t.size == power.size == SAMPLES
+    assert t[0] == 1700000000
+    assert np.allclose(np.diff(t), 200e-6, atol=1e-6)
+    assert 0.095 < power.min() and power.max() < 0.165
+
+def test_read_oml_trace_without_consumption_schema(tmp_path):
+    path = tmp_path / 'radio.oml'
+    path.write_text("schema: 1 control_node_measures_radio timestamp_s:uint32 timestamp_us:uint32 rssi:int32\n")
+    with pytest.raises(ValueError):
+        read_oml_trace(str(path))
+
+def test_read_csv_trace_current_and_voltage():
+    t, power = read_csv_trace(CSV_TRACE, voltage=3.3)
+    t_oml, power_oml = read_oml_trace(OML_TRACE)
+    assert t.size == SAMPLES
+    assert np.allclose(t, t_oml - t_oml[0], atol=1e-6)
+    assert np.allclose(power, power_oml, atol=1e-5)
+
+def test_read_csv_trace_power_column(tmp_path):
+    path = tmp_path / 'trace.csv'
+    path.write_text("time_s, Power_W\n0.0,0.1\n0.001,0.2\n")
+    t, power = load_power_trace(str(path))
+    assert list(t) == [0.0, 0.001]
+    assert list(power) == [0.1, 0.2]
+
+def test_read_csv_trace_needs_voltage():
+    with pytest.raises(ValueError):
+        read_csv_trace(CSV_TRACE)
+
+def test_detect_active_windows():
+    t, power = read_oml_trace(OML_TRACE)
+    windows, threshold = detect_active_windows(t, power)
+    assert 0.12 < threshold < 0.14
+    # warm-up, trials and burst
+    assert len(windows) == 8
+    lengths = (windows[:, 1] - windows[:, 0]) * 1e3
+    assert np.allclose(lengths, [4.4, 3.6, 2.4, 2.8, 2.2, 2.6, 2.4, 12.0], atol=0.21)
+
+def test_detect_active_windows_flat_trace():
+    t = np.arange(100) * 1e-3
+    with pytest.raises(ValueError):
+        detect_active_windows(t, np.full(100, 0.1))
+
+def test_align_trials_skips_warmup():
+    t, power = read_oml_trace(OML_TRACE)
+    windows, _ = detect_active_windows(t, power)
+    assert align_trials(windows, np.array(TRIALS_USEC) / 1e6) == 2
+
+def test_align_trials_too_few_windows():
+    with pytest.raises(ValueError):
+        align_trials(np.array([[0.0, 0.002]]), np.array([0.002, 0.002]))
+
+def test_analyze_energy():
+    t, power = load_power_trace(OML_TRACE)
+    result = analyze_energy(t, power, TRIALS_USEC, BURST)
+    assert result['idle_power_w'] == pytest.approx(0.1, abs=2e-3)
+    assert len(result['trial_windows']) == len(TRIALS_USEC)
+    # 0.16 W over each trial, 0.06 W of it above idle
+    assert np.allclose(result['energy_uj'], np.array(TRIALS_USEC) * 0.16, rtol=0.06)
+    assert np.allclose(result['dynamic_energy_uj'], np.array(TRIALS_USEC) * 0.06, rtol=0.2)
+    # the burst is the 12 ms window after the trials, not a warm-up run
+    assert result['burst']['mean_power_w'] == pytest.approx(0.16, rel=0.03)
+    assert result['burst']['energy_per_inference_uj'] == pytest.approx(12000 * 0.16 / 6, rel=0.03)
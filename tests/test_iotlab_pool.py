@@ -0,0 +1,179 @@
+import os
+import json
+import subprocess
+
+import pytest
+
+import iotlab_pool
+from iotlab_pool import IotlabPool, IotlabCLI
+
+FAKE_CLI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_iotlab')
+BOARD = 'iotlab-m3'
+
+class FakeIotlab:
+    # the experiments of the fake iotlab CLI, see fake_iotlab/fake_iotlab.py
+
+    def __init__(self, path):
+        self.path = path
+        self.save({'next_id': 1, 'experiments': {}, 'broken': [], 'fail': {}})
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, state):
+        with open(self.path, 'w') as f:
+            json.dump(state, f)
+
+    def update(self, key, value):
+        state = self.load()
+        state[key] = value
+        self.save(state)
+
+    def experiments(self):
+        return self.load()['experiments']
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_IOTLAB_STATE', str(tmp_path / 'fake_iotlab.json'))
+    monkeypatch.setattr(iotlab_pool, 'LEASE_POLL_SEC', 0.01)
+    return FakeIotlab(str(tmp_path / 'fake_iotlab.json'))
+
+def make_pool(tmp_path, idle_timeout=900):
+    path = str(tmp_path / 'pool.json')
+    # IOTLAB_ARCHI / IOTLAB_SITE of the board as the RIOT build system would report them
+    with open(path, 'w') as f:
+        json.dump({'boards': {BOARD: {'archi': 'm3:at86rf231', 'site': 'grenoble'}}}, f)
+    return IotlabPool(path, IotlabCLI(FAKE_CLI_DIR), idle_timeout=idle_timeout)
+
+def test_reserve_submits_once(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    nodes = pool.reserve(BOARD, 2)
+    assert nodes == ['m3-1.grenoble.iot-lab.info', 'm3-2.grenoble.iot-lab.info']
+    assert pool.reserve(BOARD, 2) == nodes
+    assert list(fake.experiments()) == ['1']
+
+def test_lease_release(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    pool.reserve(BOARD, 2)
+    first, exp_id = pool.lease(BOARD, job='a')
+    second, _ = pool.lease(BOARD, job='b')
+    assert exp_id == '1'
+    assert {first, second} == {'m3-1.grenoble.iot-lab.info', 'm3-2.grenoble.iot-lab.info'}
+    with pytest.raises(TimeoutError):
+        pool.lease(BOARD, job='c', timeout=0)
+    pool.release(first)
+    assert pool.lease(BOARD, job='c', timeout=0)[0] == first
+    assert pool.status()['leases'][first]['job'] == 'c'
+
+def test_lease_reserves_when_empty(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    with pool.leased(BOARD, job='a') as (node, exp_id):
+        assert pool.status()['leases'][node]['pid'] == os.getpid()
+    assert pool.status()['leases'] == {}
+    assert fake.experiments()[exp_id]['state'] == 'Running'
+
+def test_health_check_failure_marks_node_broken(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    pool.reserve(BOARD, 2)
+    fake.update('broken', ['m3-1.grenoble.iot-lab.info'])
+    node, _ = pool.lease(BOARD, job='a')
+    assert node == 'm3-2.grenoble.iot-lab.info'
+    assert pool.status()['broken'] == ['m3-1.grenoble.iot-lab.info']
+    # the broken node is not leased again
+    with pytest.raises(TimeoutError):
+        pool.lease(BOARD, job='b', timeout=0)
+
+def test_dead_process_lease_is_reclaimed(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    pool.reserve(BOARD, 1)
+    proc = subprocess.Popen(['true'])
+    proc.wait()
+    with pool._state() as state:
+        state['leases']['m3-1.grenoble.iot-lab.info'] = {'pid': proc.pid, 'host': os.uname().nodename, 'job': 'crashed',
+                                                          'since': 0, 'exp_id': '1'}
+    node, _ = pool.lease(BOARD, job='a', timeout=0)
+    assert node == 'm3-1.grenoble.iot-lab.info'
+    assert pool.status()['leases'][node]['job'] == 'a'
+
+def test_release_idle_stops_unused_experiments(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    node, exp_id = pool.lease(BOARD, job='a')
+    # leased nodes keep their experiment
+    assert pool.release_idle(idle_timeout=0) == []
+    pool.release(node)
+    assert pool.release_idle(idle_timeout=3600) == []
+    assert pool.release_idle(idle_timeout=0) == [exp_id]
+    assert fake.experiments()[exp_id]['state'] == 'Terminated'
+    assert pool.status()['experiments'] == {}
+
+def test_all_broken_experiment_is_stopped(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    pool.reserve(BOARD, 1)
+    fake.update('broken', ['m3-1.grenoble.iot-lab.info'])
+    # the experiment has no usable node left, it is stopped and a new one reserved
+    assert pool.lease(BOARD, job='a', timeout=0) == ('m3-2.grenoble.iot-lab.info', '2')
+    assert fake.experiments()['1']['state'] == 'Terminated'
+
+def test_failed_state_query_keeps_experiment(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    node, exp_id = pool.lease(BOARD, job='a')
+    fake.update('fail', {'get': 1})
+    state = pool.status()
+    assert exp_id in state['experiments']
+    assert state['leases'][node]['job'] == 'a'
+    with pytest.raises(TimeoutError):
+        pool.lease(BOARD, job='b', timeout=0)
+    assert list(fake.experiments()) == [exp_id]
+
+def test_ended_experiment_is_dropped(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    node, exp_id = pool.lease(BOARD, job='a')
+    subprocess.check_call([os.path.join(FAKE_CLI_DIR, 'iotlab-experiment'), 'stop', '-i', exp_id],
+                          stdout=subprocess.DEVNULL)
+    assert pool.status() == {'boards': pool.status()['boards'], 'experiments': {}, 'leases': {}, 'broken': []}
+
+def test_failed_wait_stops_submitted_experiment(fake, tmp_path):
+    pool = make_pool(tmp_path)
+    fake.update('fail', {'wait': 1})
+    with pytest.raises(subprocess.CalledProcessError):
+        pool.reserve(BOARD, 1)
+    assert fake.experiments()['1']['state'] == 'Terminated'
+    assert pool.status()['experiments'] == {}
+
+def test_experiment_of_dead_reserving_process_is_kept(fake, tmp_path):
+    # a process died in reserve() while waiting: the experiment is in the pool without nodes
+    pool = make_pool(tmp_path)
+    subprocess.check_call([os.path.join(FAKE_CLI_DIR, 'iotlab-experiment'), 'submit', '-n', 'utoe-pool', '-d', '120',
+                           '-l', '1,archi=m3:at86rf231+site=grenoble'], stdout=subprocess.DEVNULL)
+    with pool._state() as state:
+        state['experiments']['1'] = {'board': BOARD, 'nodes': [], 'submitted': 0, 'last_used': 0}
+    assert pool.status()['experiments']['1']['nodes'] == []
+    subprocess.check_call([os.path.join(FAKE_CLI_DIR, 'iotlab-experiment'), 'wait', '-i', '1'],
+                          stdout=subprocess.DEVNULL)
+    assert pool.lease(BOARD, job='a', timeout=0) == ('m3-1.grenoble.iot-lab.info', '1')
+
+class FailingController:
+    # stands in for RIOTCtrl, the terminal of the leased node does not come up
+
+    def __init__(self, env):
+        self.env = env
+
+    def run_term(self, reset=True):
+        raise TimeoutError("iotlab-term did not start")
+
+def test_failed_run_releases_lease(fake, tmp_path, monkeypatch):
+    import connector
+    import evaluate
+    pool = make_pool(tmp_path)
+    pool.reserve(BOARD, 1)
+    monkeypatch.setenv('UTOE_IOTLAB_POOL', '1')
+    monkeypatch.setattr(connector, 'IotlabPool', lambda: pool)
+    monkeypatch.setattr(connector, 'make_riot_ctrl', FailingController)
+    riot_ctrl = connector.get_fit_iotlab_controller({'BOARD': BOARD})
+    with pytest.raises(TimeoutError):
+        evaluate.run_per_model_trials(riot_ctrl, 'text')
+    # the only node of the pool is free again, a second job does not wait for it forever
+    node, _ = pool.lease(BOARD, job='b', timeout=0.5)
+    assert node == riot_ctrl.env['IOTLAB_NODE']
+    assert list(fake.experiments()) == ['1']
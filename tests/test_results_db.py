@@ -0,0 +1,22 @@
+import json
+
+from results_db import ResultsDB
+
+def make_record(datetime, board='stm32f746g-disco'):
+    return {'mode': 'per-model', 'model_hash': 'ab' * 32, 'model_path': 'model.onnx', 'board': board,
+            'config_hash': 'cd' * 8, 'config': {'UTOE_TRIAL_NUM': '3'}, 'datetime': datetime,
+            'trials_record': {'usec': [1.0, 2.0, 3.0]}, 'trials_stats_in_usec': {'mean': 2.0, 'median': 2.0}}
+
+def test_import_logs_twice_keeps_one_row_per_run(tmp_path):
+    logs = tmp_path / 'logs'
+    logs.mkdir()
+    first, second = make_record('20260101-120000'), make_record('20260101-130000')
+    (logs / 'run.json').write_text(json.dumps(first))
+    # a sweep log repeats the runs it covered
+    (logs / 'sweep.json').write_text(json.dumps([first, second]))
+    db = ResultsDB(str(tmp_path / 'results.db'))
+    assert db.import_logs(str(logs)) == 2
+    assert db.import_logs(str(logs)) == 0
+    assert len(db.query(latest_only=False)) == 2
+    (logs / 'other.json').write_text(json.dumps(make_record('20260101-120000', board='nrf52840dk')))
+    assert db.import_logs(str(logs)) == 1
@@ -0,0 +1,195 @@
+import os
+import sys
+import glob
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+# Timed spans of the evaluation stages, written as Chrome trace (chrome://tracing, ui.perfetto.dev).
+# Enabled with --trace FILE or UTOE_TRACE=FILE; spawned codegen workers inherit the variable and append
+# their spans to FILE.<pid>.part, merged by the main process on exit.
+TRACE_ENV = 'UTOE_TRACE'
+PROFILE_ENV = 'UTOE_TRACE_PROFILE'
+_MAIN_PID_ENV = 'UTOE_TRACE_PID'
+
+_tracer = None
+
+class Tracer:
+
+    def __init__(self, path, profile=False):
+        self.path = path
+        self.profile = profile
+        self.main = os.environ.get(_MAIN_PID_ENV, str(os.getpid())) == str(os.getpid())
+        self.events = []
+        self.thread_names = {}
+        self.profiles = {}
+        self._profiling = False
+        self._lock = threading.Lock()
+
+    def add(self, name, cat, start, end, args):
+        tid = threading.get_ident()
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                 'pid': os.getpid(), 'tid': tid, 'args': args}
+        with self._lock:
+            if tid not in self.thread_names:
+                self.thread_names[tid] = threading.current_thread().name
+                self._emit({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                            'args': {'name': self.thread_names[tid]}})
+            self._emit(event)
+
+    def _emit(self, event):
+        if self.main:
+            self.events.append(event)
+        else:
+            # worker processes exit without atexit, every span is written right away
+            with open(f'{self.path}.{os.getpid()}.part', 'a') as f:
+                f.write(json.dumps(event, default=str) + '\n')
+
+    def start_profile(self):
+        # one cProfile at a time: nested or concurrent profiled spans are only timed
+        import cProfile
+        with self._lock:
+            if self._profiling:
+                return None
+            self._profiling = True
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            self._profiling = False
+            return None
+        return profiler
+
+    def stop_profile(self, name, profiler):
+        import pstats
+        profiler.disable()
+        with self._lock:
+            self._profiling = False
+            if name in self.profiles:
+                self.profiles[name].add(profiler)
+            else:
+                self.profiles[name] = pstats.Stats(profiler)
+            if not self.main:
+                self.profiles[name].dump_stats(f'{self.path}.{_safe_name(name)}.{os.getpid()}.prof.part')
+
+def _safe_name(name):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+
+def enable(path, profile=False):
+    global _tracer
+    if _tracer is None:
+        os.environ[TRACE_ENV] = path
+        os.environ.setdefault(_MAIN_PID_ENV, str(os.getpid()))
+        if profile:
+            os.environ[PROFILE_ENV] = '1'
+        _tracer = Tracer(path, profile)
+        _tracer._emit({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'tid': 0,
+                       'args': {'name': ' '.join(os.path.basename(a) for a in sys.argv[:2]) or 'worker'}})
+        if _tracer.main:
+            for part in glob.glob(f'{glob.escape(path)}.*.part'):
+                os.remove(part)
+            atexit.register(export)
+    return _tracer
+
+def active():
+    return _tracer is not None
+
+def record(name, start, end, cat='stage', **args):
+    # for hot paths that time themselves, e.g. the transport calls
+    if _tracer is not None:
+        _tracer.add(name, cat, start, end, args)
+
+@contextmanager
+def span(name, cat='stage', profile=False, **args):
+    # yields the args of the span, metadata known only at the end (bytes, cache hit) is added to it
+    if _tracer is None:
+        yield args
+        return
+    profiler = _tracer.start_profile() if profile and _tracer.profile else None
+    start = time.time()
+    try:
+        yield args
+    except BaseException as e:
+        args['error'] = repr(e)
+        raise
+    finally:
+        end = time.time()
+        if profiler is not None:
+            _tracer.stop_profile(name, profiler)
+        _tracer.add(name, cat, start, end, args)
+
+def merge_worker_parts(tracer):
+    import pstats
+    events = list(tracer.events)
+    for part in glob.glob(f'{glob.escape(tracer.path)}.*.part'):
+        if part.endswith('.prof.part'):
+            continue
+        with open(part, 'r') as f:
+            events += [json.loads(line) for line in f if line.strip()]
+        os.remove(part)
+    prof_paths = {}
+    for name, stats in tracer.profiles.items():
+        prof_paths.setdefault(_safe_name(name), []).append(stats)
+    for part in glob.glob(f'{glob.escape(tracer.path)}.*.prof.part'):
+        name = part[len(tracer.path) + 1:].rsplit('.', 3)[0]
+        prof_paths.setdefault(name, []).append(pstats.Stats(part))
+        os.remove(part)
+    return events, prof_paths
+
+def summarize(events):
+    spans = [e for e in events if e['ph'] == 'X']
+    if not spans:
+        return {'wall_sec': 0.0, 'spans': []}
+    wall = (max(e['ts'] + e['dur'] for e in spans) - min(e['ts'] for e in spans)) / 1e6
+    by_name = {}
+    for e in spans:
+        s = by_name.setdefault(e['name'], {'name': e['name'], 'cat': e['cat'], 'calls': 0, 'total_sec': 0.0,
+                                           'max_sec': 0.0, 'bytes': 0, 'errors': 0})
+        s['calls'] += 1
+        s['total_sec'] += e['dur'] / 1e6
+        s['max_sec'] = max(s['max_sec'], e['dur'] / 1e6)
+        s['bytes'] += e['args'].get('bytes', 0) or 0
+        s['errors'] += 'error' in e['args']
+    rows = sorted(by_name.values(), key=lambda s: s['total_sec'], reverse=True)
+    for s in rows:
+        s['mean_sec'] = s['total_sec'] / s['calls']
+        # spans of parallel workers overlap, the sum of a stage can exceed the wall time
+        s['wall_percent'] = s['total_sec'] / wall * 100 if wall > 0 else 0.0
+    return {'wall_sec': wall, 'spans': rows}
+
+def print_trace_summary(summary):
+    from tabulate import tabulate
+    headers = ['Span', 'Calls', 'Total (s)', 'Mean (ms)', 'Max (ms)', 'Wall (%)', 'Bytes', 'Errors']
+    print(tabulate([[s['name'], s['calls'], round(s['total_sec'], 3), round(s['mean_sec'] * 1e3, 3),
+                     round(s['max_sec'] * 1e3, 3), round(s['wall_percent'], 1), s['bytes'] or None,
+                     s['errors'] or None] for s in summary['spans']], headers=headers))
+    print(f"Traced wall time: {round(summary['wall_sec'], 3)} s")
+
+def export(path=None):
+    if _tracer is None or not _tracer.main:
+        return None
+    path = path or _tracer.path
+    events, profiles = merge_worker_parts(_tracer)
+    summary = summarize(events)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'summary': summary}, f, default=str)
+    print()
+    print_trace_summary(summary)
+    print(f"Trace written to {path}")
+    for name, stats in profiles.items():
+        merged = stats[0]
+        for s in stats[1:]:
+            merged.add(s)
+        prof_path = f'{os.path.splitext(path)[0]}.{name}.prof'
+        merged.dump_stats(prof_path)
+        print(f"Profile of {name} written to {prof_path} (python -m pstats {prof_path})")
+    _tracer.events = []
+    return summary
+
+# codegen workers and other child processes pick up the trace of their parent
+if os.getenv(TRACE_ENV):
+    enable(os.environ[TRACE_ENV], os.getenv(PROFILE_ENV) == '1')
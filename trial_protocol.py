@@ -0,0 +1,249 @@
+import re
+import struct
+import time
+import binascii
+from array import array
+
+import numpy as np
+
+# keep in sync with the UTOE_FRAME_* defines in main.c
+FRAME_SYNC = b'\xa5\x5a'
+FRAME_HEADER = 0x01
+FRAME_TRIAL = 0x02
+FRAME_END = 0x03
+FRAME_PROFILE_INFO = 0x04
+FRAME_PROFILE_DATA = 0x05
+FRAME_WARMUP = 0x06
+FRAME_BURST = 0x07
+
+# keep in sync with the UTOE_TIMER_* defines in utoe_timer.h
+TIMER_BACKENDS = {0: 'xtimer', 1: 'ztimer', 2: 'dwt', 3: 'mcycle'}
+
+# printf format, see per_model_eval in main.c
+TEXT_END = 'finished >'
+_TIMER_RE = re.compile('timer: ([0-9]+), hz: ([0-9]+)')
+# older firmwares print usec instead of ticks
+_TRIAL_RE = re.compile('trial: ([0-9]+), (?:usec|ticks): ([0-9]+), ret: (-?[0-9]+)')
+_WARMUP_RE = re.compile('warmup: ([0-9]+), ticks: ([0-9]+), ret: (-?[0-9]+)')
+_BURST_RE = re.compile('burst: ([0-9]+), ticks_hi: ([0-9]+), ticks_lo: ([0-9]+)')
+
+CMD_NEXT = b'n'
+CMD_QUIT = b'q'
+
+_FRAME_OVERHEAD = 6 # sync (2) + type (1) + len (1) + crc (2)
+
+# firmware defaults of the start command arguments, see per_model_eval in main.c
+START_DEFAULTS = (10, 42, 0, 0, 0, 0)
+
+def make_start_command(trials_num=None, random_seed=None, model=None, warmup=None, burst=None, gap_ms=None):
+    # the firmware reads "s [trials [seed [model [warmup [burst [gap_ms]]]]]]", see read_start_cmd in main.c
+    values = [trials_num, random_seed, model, warmup, burst, gap_ms]
+    while values and values[-1] is None:
+        values.pop()
+    args = [str(int(v if v is not None else d)) for v, d in zip(values, START_DEFAULTS)]
+    return ' '.join(['s'] + args).encode() + b'\n'
+
+def crc16_ccitt(data, crc=0xFFFF):
+    return binascii.crc_hqx(data, crc)
+
+def encode_frame(frame_type, payload):
+    body = bytes([frame_type, len(payload)]) + payload
+    return FRAME_SYNC + body + struct.pack('<H', crc16_ccitt(body))
+
+class TrialStreamDecoder:
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._trial = array('I')
+        self._elapsed = array('I')
+        self._ret = array('i')
+        self._warmup = array('I')
+        self._warmup_ret = array('i')
+        self.burst_frame = None
+        self.header = None
+        self.profile_shape = None
+        self._profile = None
+        self.finished = False
+        self.crc_errors = 0
+
+    def __len__(self):
+        return len(self._trial)
+
+    def feed(self, data):
+        self._buf += data
+        frames = []
+        while True:
+            start = self._buf.find(FRAME_SYNC)
+            if start < 0:
+                # keep a trailing first sync byte, the second one may follow in the next chunk
+                del self._buf[:max(len(self._buf) - 1, 0)]
+                return frames
+            del self._buf[:start]
+            if len(self._buf) < 4:
+                return frames
+            length = self._buf[3]
+            if len(self._buf) < length + _FRAME_OVERHEAD:
+                return frames
+            body = bytes(self._buf[2:4 + length])
+            crc, = struct.unpack_from('<H', self._buf, 4 + length)
+            if crc != crc16_ccitt(body):
+                # not a frame boundary (or corrupted), resync after this sync word
+                self.crc_errors += 1
+                del self._buf[:1]
+                continue
+            del self._buf[:length + _FRAME_OVERHEAD]
+            frames.append(self._handle(body[0], body[2:]))
+
+    def _handle(self, frame_type, payload):
+        if frame_type == FRAME_TRIAL:
+            trial, elapsed, ret = struct.unpack('<IIi', payload[:12])
+            self._trial.append(trial)
+            self._elapsed.append(elapsed)
+            self._ret.append(ret)
+            return (frame_type, (trial, elapsed, ret))
+        if frame_type == FRAME_WARMUP:
+            trial, elapsed, ret = struct.unpack('<IIi', payload[:12])
+            self._warmup.append(elapsed)
+            self._warmup_ret.append(ret)
+            return (frame_type, (trial, elapsed, ret))
+        if frame_type == FRAME_BURST:
+            count, ticks_lo, ticks_hi = struct.unpack('<III', payload[:12])
+            self.burst_frame = (count, ticks_hi << 32 | ticks_lo)
+            return (frame_type, self.burst_frame)
+        if frame_type == FRAME_HEADER:
+            version, trials_num = struct.unpack('<BI', payload[:5])
+            self.header = {'version': version, 'trials_num': trials_num,
+                           'timer': 'xtimer', 'timer_hz': 1000000}
+            if version >= 2:
+                timer, timer_hz = struct.unpack('<BI', payload[5:10])
+                self.header['timer'] = TIMER_BACKENDS.get(timer, str(timer))
+                self.header['timer_hz'] = timer_hz
+            if version >= 3:
+                self.header['model'] = payload[10]
+            return (frame_type, self.header)
+        if frame_type == FRAME_PROFILE_INFO:
+            num_calls, repeat = struct.unpack('<II', payload[:8])
+            self.profile_shape = (repeat, num_calls)
+            self._profile = np.zeros(repeat * num_calls, dtype=np.uint32)
+            return (frame_type, self.profile_shape)
+        if frame_type == FRAME_PROFILE_DATA:
+            offset, = struct.unpack('<I', payload[:4])
+            entries = np.frombuffer(bytes(payload[4:]), dtype='<u4')
+            self._profile[offset:offset + entries.size] = entries
+            return (frame_type, offset)
+        if frame_type == FRAME_END:
+            self.finished = True
+            return (frame_type, struct.unpack('<I', payload[:4])[0])
+        return (frame_type, bytes(payload))
+
+    def timer(self):
+        header = self.header or {'timer': 'xtimer', 'timer_hz': 1000000}
+        return {'backend': header['timer'], 'hz': header['timer_hz']}
+
+    def results(self):
+        ticks = np.frombuffer(self._elapsed, dtype=np.uint32).astype(np.int64)
+        return ticks_to_trials_record(np.frombuffer(self._trial, dtype=np.uint32).copy(), ticks,
+                                      np.frombuffer(self._ret, dtype=np.int32).copy(), self.timer())
+
+    def warmup_results(self):
+        if not self._warmup:
+            return None
+        ticks = np.frombuffer(self._warmup, dtype=np.uint32).astype(np.int64)
+        return ticks_to_trials_record(np.arange(ticks.size), ticks, np.frombuffer(self._warmup_ret, dtype=np.int32).copy(),
+                                      self.timer())
+
+    def burst(self):
+        if self.burst_frame is None:
+            return None
+        return burst_record(*self.burst_frame, self.timer())
+
+    def profile(self):
+        # (repeat, calls) ticks of each instrumented operator call
+        if self._profile is None:
+            return None
+        return self._profile.reshape(self.profile_shape).astype(np.int64)
+
+def ticks_to_trials_record(trial, ticks, ret, timer):
+    nsec = ticks * (1e9 / timer['hz'])
+    return {'trial': trial, 'ticks': ticks, 'nsec': nsec, 'usec': nsec / 1e3, 'ret': ret, 'timer': timer}
+
+def burst_record(count, ticks, timer):
+    return {'count': count, 'ticks': ticks, 'usec': ticks * 1e6 / timer['hz'], 'timer': timer}
+
+def parse_per_model_output(raw_output : str):
+    timer = {'backend': 'xtimer', 'hz': 1000000}
+    timer_match = _TIMER_RE.search(raw_output)
+    if timer_match is not None:
+        timer = {'backend': TIMER_BACKENDS.get(int(timer_match.group(1)), timer_match.group(1)),
+                 'hz': int(timer_match.group(2))}
+    results_list = _TRIAL_RE.findall(raw_output)
+    trials_record = ticks_to_trials_record(np.array([int(x[0]) for x in results_list]),
+                                           np.array([int(x[1]) for x in results_list], dtype=np.int64),
+                                           np.array([int(x[2]) for x in results_list]), timer)
+    warmup_list = _WARMUP_RE.findall(raw_output)
+    trials_record['warmup'] = None
+    if warmup_list:
+        trials_record['warmup'] = ticks_to_trials_record(np.array([int(x[0]) for x in warmup_list]),
+                                                         np.array([int(x[1]) for x in warmup_list], dtype=np.int64),
+                                                         np.array([int(x[2]) for x in warmup_list]), timer)
+    burst_match = _BURST_RE.search(raw_output)
+    trials_record['burst'] = None
+    if burst_match is not None:
+        ticks = int(burst_match.group(2)) << 32 | int(burst_match.group(3))
+        trials_record['burst'] = burst_record(int(burst_match.group(1)), ticks, timer)
+    return trials_record
+
+class TrialTextDecoder:
+    # printf format of UTOE_OUTPUT_FORMAT=0, fed in chunks like TrialStreamDecoder
+
+    def __init__(self):
+        self._text = []
+        self._line = ''
+        self.trials = 0
+        self.finished = False
+
+    def __len__(self):
+        return self.trials
+
+    def feed(self, data):
+        self._text.append(data.decode(errors='replace'))
+        lines = (self._line + self._text[-1]).split('\n')
+        self._line = lines.pop()
+        events = []
+        for line in lines + [self._line]:
+            if TEXT_END in line:
+                self.finished = True
+        for line in lines:
+            m = _TRIAL_RE.search(line)
+            if m is not None:
+                self.trials += 1
+                events.append((FRAME_TRIAL, tuple(int(x) for x in m.groups())))
+        return events
+
+    def text(self):
+        return ''.join(self._text)
+
+    def results(self):
+        # trials record with 'warmup', 'burst' and 'timer' like the binary path
+        return parse_per_model_output(self.text())
+
+def read_trial_stream(stream, decoder=None, idle_timeout=10.0, chunk_size=4096, on_trial=None):
+    # stream: an opened serial.Serial (or anything with read(n), write(data) and a timeout)
+    # There is no limit on the total duration, only on the silence between two chunks.
+    # on_trial(trial, elapsed, ret) may return a command to send back, used by host-controlled runs.
+    decoder = decoder or TrialStreamDecoder()
+    stream.timeout = 0.1
+    last_data = time.time()
+    while not decoder.finished:
+        # host-controlled runs must answer each trial right away instead of waiting for a full chunk
+        data = stream.read(getattr(stream, 'in_waiting', 0) or (1 if on_trial is not None else chunk_size))
+        if data:
+            for frame_type, value in decoder.feed(data):
+                if frame_type == FRAME_TRIAL and on_trial is not None:
+                    cmd = on_trial(*value)
+                    if cmd:
+                        stream.write(cmd)
+            last_data = time.time()
+        elif time.time() - last_data > idle_timeout:
+            raise TimeoutError(f"no trial data for {idle_timeout} s after {len(decoder)} trials")
+    return decoder
@@ -0,0 +1,87 @@
+import os
+import json
+from datetime import datetime
+
+from tabulate import tabulate
+from evaluate import make_per_model_env, default_output_format, LOG_DIR
+from utils import NpEncoder
+from compile_config import enumerate_configs, config_name, pin_config
+from sweep import job_build_dir, SWEEP_BUILD_ROOT
+from pipeline import Pipeline
+from results_db import ResultsDB
+
+def make_tuning_jobs(model_path, board, configs, trials_num=10, use_iotlab=False, random_seed=42,
+                     shape_dict=None, build_root=SWEEP_BUILD_ROOT, use_cache=True, timer=None):
+    output_format = default_output_format(use_iotlab)
+    jobs = []
+    for compile_config in configs:
+        build_dir = job_build_dir(build_root, model_path, board, shape_dict) + '_' + config_name(compile_config)
+        env = make_per_model_env(board, build_dir, trials_num, random_seed, output_format, None, timer)
+        jobs.append({'name': os.path.basename(build_dir), 'model_path': model_path, 'board': board,
+                     'build_dir': build_dir, 'env': env, 'shape_dict': shape_dict,
+                     'use_cache': use_cache, 'use_iotlab': use_iotlab, 'random_seed': random_seed,
+                     'output_format': output_format, 'early_stopping': None,
+                     'compile_config': compile_config})
+    return jobs
+
+def _objectives(rec):
+    return (rec['trials_stats_in_usec']['mean'], rec['memory'], rec['storage'])
+
+def pareto_front(records):
+    # indices of the records no other record beats in latency, RAM and flash at once
+    points = [_objectives(r) for r in records]
+    front = []
+    for i, p in enumerate(points):
+        dominated = any(all(q[k] <= p[k] for k in range(3)) and q != p for q in points)
+        if not dominated:
+            front.append(i)
+    return front
+
+def select_winner(records, front, objective='latency'):
+    # best record of the Pareto front in the given objective, ties broken by the others
+    order = {'latency': (0, 1, 2), 'memory': (1, 2, 0), 'storage': (2, 1, 0)}[objective]
+    return min(front, key=lambda i: tuple(_objectives(records[i])[k] for k in order))
+
+def print_tuning_results(records, front, failures, winner=None):
+    headers = ['Config', 'Memory (KB)', 'Storage (KB)', 'Mean (ms)', 'Median (ms)', 'Pareto']
+    order = sorted(range(len(records)), key=lambda i: _objectives(records[i]))
+    output_list = [[config_name(records[i]['config']['compile']), records[i]['memory'] / 1e3,
+                    records[i]['storage'] / 1e3, round(records[i]['trials_stats_in_usec']['mean'] / 1e3, 6),
+                    round(records[i]['trials_stats_in_usec']['median'] / 1e3, 6),
+                    ('*' if i in front else '') + (' (pinned)' if i == winner else '')] for i in order]
+    # variants that did not build usually do not fit into the RAM or flash of the board
+    output_list += [[f['job'], None, None, None, None, f"failed in {f['stage']}"] for f in failures]
+    print(tabulate(output_list, headers=headers))
+
+def run_tuning(model_path, board, space, trials_num=10, use_iotlab=False, random_seed=42, shape_dict=None,
+               devices=None, compile_jobs=None, build_root=SWEEP_BUILD_ROOT, use_cache=True, timer=None,
+               pin=None, log_dir=LOG_DIR):
+    configs = enumerate_configs(space)
+    print(f"Tuning: {len(configs)} compile configs of {model_path} on {board}")
+    jobs = make_tuning_jobs(model_path, board, configs, trials_num, use_iotlab, random_seed, shape_dict,
+                            build_root, use_cache, timer)
+    db = ResultsDB()
+    pipeline = Pipeline([board], devices, codegen_workers=compile_jobs, on_record=db.insert)
+    records = pipeline.run(jobs)
+    pipeline.print_stage_summary()
+    if not records:
+        print("No compile config could be measured")
+        return None
+
+    front = pareto_front(records)
+    winner = select_winner(records, front, pin) if pin is not None else None
+    print_tuning_results(records, front, pipeline.failures, winner)
+    if winner is not None:
+        rec = records[winner]
+        pin_config(model_path, board, rec['config']['compile'],
+                   result={'mean_usec': rec['trials_stats_in_usec']['mean'], 'memory': rec['memory'],
+                           'storage': rec['storage'], 'objective': pin})
+        print(f"Pinned compile config for {board}: {rec['config']['compile']}")
+
+    result = {'model_path': model_path, 'board': board, 'search_space': space, 'records': records,
+              'pareto_front': front, 'winner': winner, 'failures': pipeline.failures}
+    os.makedirs(log_dir, exist_ok=True)
+    file_path = os.path.join(log_dir, f'tune_{board}_' + datetime.now().strftime("%Y%m%d-%H%M%S") + '.json')
+    with open(file_path, 'w') as f:
+        json.dump(result, f, cls=NpEncoder)
+    return result
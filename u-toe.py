@@ -1,7 +1,327 @@
-from evaluate import evaluate_per_model, evaluate_per_operator, memory_analysis
 import argparse
+import sys
+import os
 
-if __name__ == '__main__':
+# evaluate pulls in TVM and riotctrl, the subcommands import what they need when they run
+TIMER_CHOICES = ['xtimer', 'ztimer', 'dwt', 'mcycle']
+
+def add_trace_args(parser):
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="write the timed stages as Chrome trace to FILE and print a summary. default: UTOE_TRACE")
+    parser.add_argument("--profile", help="with --trace, also record cProfile stats of the host-side Python stages "
+                                          "(FILE.<stage>.prof).", action="store_true")
+
+def start_trace(args):
+    if args.trace is not None:
+        from tracing import enable
+        enable(args.trace, args.profile)
+
+def sweep_main(argv):
+    from sweep import run_sweep, parse_devices, SWEEP_BUILD_ROOT
+    from iotlab_pool import enable_pool
+    parser = argparse.ArgumentParser(prog="u-toe.py sweep",
+                                     description="Per-Model evaluation of several models on several boards.")
+    parser.add_argument("--models", help="paths to machine learning model files.", nargs='+', required=True)
+    parser.add_argument("--boards", help="IoT board names.", nargs='+', required=True)
+    parser.add_argument("--use-iotlab", help="use remote boards in FIT IoT-LAB.",
+                        action="store_true")
+    parser.add_argument("--device", help="attached device of a board, format: BOARD=PORT[,SERIAL] or BOARD=IOTLAB_NODE_URL. "
+                                         "Repeat for several devices, one measurement runs per device at a time.",
+                        action="append", default=[])
+    parser.add_argument("--compile-jobs", default=None, type=int, help="number of compile processes, default: cpu count")
+    parser.add_argument("--build-root", default=SWEEP_BUILD_ROOT, help=f"default: {SWEEP_BUILD_ROOT}")
+    parser.add_argument("--random-seed", default=42, type=int, help="default: 42")
+    parser.add_argument("--trials-num", default=10, type=int, help="defalut: 10")
+    parser.add_argument("--input-shape", default=None, type=lambda s: [int(i) for i in s.split(',')], help="specify the input shape, mandatory for pytorch model. format: N,C,W,H default: None")
+    parser.add_argument("--no-cache", help="disable the compilation cache.", action="store_true")
+    parser.add_argument("--timer", choices=TIMER_CHOICES, default=None, help="on-board timer backend. default: xtimer")
+    parser.add_argument("--iotlab-pool", default=None, type=int, metavar="N",
+                        help="lease the IoT-LAB nodes from the node pool, N nodes per board are reserved up front "
+                             "and kept for the next runs (see u-toe.py pool). default: one experiment per run")
+    add_trace_args(parser)
+    args = parser.parse_args(argv)
+    start_trace(args)
+    devices = parse_devices(args.device)
+    if args.iotlab_pool:
+        args.use_iotlab = True
+        devices = enable_pool(args.boards, args.iotlab_pool, devices)
+    run_sweep(args.models, args.boards, args.trials_num, args.use_iotlab, args.random_seed,
+              {'input': args.input_shape} if args.input_shape is not None else None,
+              devices, args.compile_jobs, args.build_root, not args.no_cache, args.timer)
+
+def batch_main(argv):
+    from batch import run_batch
+    from sweep import parse_devices, SWEEP_BUILD_ROOT
+    from iotlab_pool import enable_pool
+    from results_db import DB_PATH
+    parser = argparse.ArgumentParser(prog="u-toe.py batch",
+                                     description="Per-Model evaluation of a model directory or manifest, "
+                                                 "skipping combinations with a fresh result in the results database.")
+    parser.add_argument("models", help="model directory (e.g. model_zoo) or manifest (.txt lines or .json list "
+                                       "of paths or {\"model_path\": ..., \"input_shape\": [...]}).")
+    parser.add_argument("--boards", help="IoT board names.", nargs='+', required=True)
+    parser.add_argument("--use-iotlab", help="use remote boards in FIT IoT-LAB.", action="store_true")
+    parser.add_argument("--device", help="attached device of a board, format: BOARD=PORT[,SERIAL] or BOARD=IOTLAB_NODE_URL.",
+                        action="append", default=[])
+    parser.add_argument("--compile-jobs", default=None, type=int, help="number of compile processes, default: cpu count")
+    parser.add_argument("--build-root", default=SWEEP_BUILD_ROOT, help=f"default: {SWEEP_BUILD_ROOT}")
+    parser.add_argument("--random-seed", default=42, type=int, help="default: 42")
+    parser.add_argument("--trials-num", default=10, type=int, help="defalut: 10")
+    parser.add_argument("--no-cache", help="disable the compilation cache.", action="store_true")
+    parser.add_argument("--timer", choices=TIMER_CHOICES, default=None, help="on-board timer backend. default: xtimer")
+    parser.add_argument("--db", default=DB_PATH, help=f"results database. default: {DB_PATH}")
+    parser.add_argument("--max-age", default=None, type=float,
+                        help="results older than this many hours are measured again. default: never")
+    parser.add_argument("--force", help="measure every combination again.", action="store_true")
+    parser.add_argument("--iotlab-pool", default=None, type=int, metavar="N",
+                        help="lease the IoT-LAB nodes from the node pool, N nodes per board are reserved up front "
+                             "and kept for the next runs (see u-toe.py pool). default: one experiment per run")
+    add_trace_args(parser)
+    args = parser.parse_args(argv)
+    start_trace(args)
+    devices = parse_devices(args.device)
+    if args.iotlab_pool:
+        args.use_iotlab = True
+        devices = enable_pool(args.boards, args.iotlab_pool, devices)
+    run_batch(args.models, args.boards, args.trials_num, args.use_iotlab, args.random_seed, devices,
+              args.compile_jobs, args.build_root, not args.no_cache, args.timer, args.db,
+              args.max_age * 3600 if args.max_age is not None else None, args.force)
+
+def report_main(argv):
+    from results_db import ResultsDB, DB_PATH, print_results
+    from report import LOG_DIR, load_logs_from_folder
+    parser = argparse.ArgumentParser(prog="u-toe.py report", description="Query the results database.")
+    parser.add_argument("--db", default=DB_PATH, help=f"results database. default: {DB_PATH}")
+    parser.add_argument("--board", default=None, help="only results of this board.")
+    parser.add_argument("--model", default=None, help="only results of models matching this path or hash prefix.")
+    parser.add_argument("--all", help="every stored result, not only the latest per (model, board, config).",
+                        action="store_true")
+    parser.add_argument("--import-logs", nargs='?', const=LOG_DIR, default=None,
+                        help=f"import the JSON logs of a folder first. default folder: {LOG_DIR}")
+    parser.add_argument("--logs", nargs='?', const=LOG_DIR, default=None,
+                        help=f"print the Per-Model records of the JSON logs of a folder instead of the database. "
+                             f"default folder: {LOG_DIR}")
+    args = parser.parse_args(argv)
+    if args.logs is not None:
+        load_logs_from_folder(args.logs)
+        return
+    db = ResultsDB(args.db)
+    if args.import_logs is not None:
+        print(f"Imported {db.import_logs(args.import_logs)} records from {args.import_logs}")
+    print_results(db.query(args.board, args.model, not args.all))
+
+def tune_main(argv):
+    from tuning import run_tuning
+    from sweep import parse_devices, SWEEP_BUILD_ROOT
+    from compile_config import load_search_space, unpin_config, DEFAULT_SEARCH_SPACE
+    parser = argparse.ArgumentParser(prog="u-toe.py tune",
+                                     description="Per-Model evaluation of every compile config of a search space, "
+                                                 "reports the latency / memory / storage Pareto front.")
+    parser.add_argument("model_file", help="path to machine leearning model file.", type=str)
+    parser.add_argument("--board", help="IoT board name", default="stm32f746g-disco", type=str)
+    parser.add_argument("--search-space", default=None,
+                        help=f"JSON file of compile option -> values. default: {DEFAULT_SEARCH_SPACE}")
+    parser.add_argument("--pin", choices=['latency', 'memory', 'storage'], default=None,
+                        help="pin the Pareto config that is best in this objective as default of the (model, board) pair.")
+    parser.add_argument("--unpin", help="remove the pinned config of the (model, board) pair and exit.",
+                        action="store_true")
+    parser.add_argument("--use-iotlab", help="use remote boards in FIT IoT-LAB.", action="store_true")
+    parser.add_argument("--device", help="attached device, format: BOARD=PORT[,SERIAL] or BOARD=IOTLAB_NODE_URL.",
+                        action="append", default=[])
+    parser.add_argument("--compile-jobs", default=None, type=int, help="number of compile processes, default: cpu count")
+    parser.add_argument("--build-root", default=SWEEP_BUILD_ROOT, help=f"default: {SWEEP_BUILD_ROOT}")
+    parser.add_argument("--random-seed", default=42, type=int, help="default: 42")
+    parser.add_argument("--trials-num", default=10, type=int, help="defalut: 10")
+    parser.add_argument("--input-shape", default=None, type=lambda s: [int(i) for i in s.split(',')], help="specify the input shape, mandatory for pytorch model. format: N,C,W,H default: None")
+    parser.add_argument("--no-cache", help="disable the compilation cache.", action="store_true")
+    parser.add_argument("--timer", choices=TIMER_CHOICES, default=None, help="on-board timer backend. default: xtimer")
+    add_trace_args(parser)
+    args = parser.parse_args(argv)
+    start_trace(args)
+    if args.unpin:
+        print("Unpinned" if unpin_config(args.model_file, args.board) else "Nothing pinned")
+        return
+    run_tuning(args.model_file, args.board, load_search_space(args.search_space), args.trials_num, args.use_iotlab,
+               args.random_seed, {'input': args.input_shape} if args.input_shape is not None else None,
+               parse_devices(args.device), args.compile_jobs, args.build_root, not args.no_cache, args.timer, args.pin)
+
+def pack_main(argv):
+    from multi_model import run_multi_model
+    from batch import collect_models, MODEL_EXTENSIONS
+    from sweep import parse_devices, SWEEP_BUILD_ROOT
+    parser = argparse.ArgumentParser(prog="u-toe.py pack",
+                                     description="Per-Model evaluation of several models from one firmware image per board. "
+                                                 "Models are packed into as few images as the flash budget allows.")
+    parser.add_argument("--models", help="model files, model directories or manifests.", nargs='+', required=True)
+    parser.add_argument("--boards", help="IoT board names.", nargs='+', required=True)
+    parser.add_argument("--flash-budget", default=None, type=float,
+                        help="flash in KB available for the models of one image. default: from the board ROM_LEN")
+    parser.add_argument("--ram-budget", default=None, type=float,
+                        help="RAM in KB available for the models of one image. default: from the board RAM_LEN")
+    parser.add_argument("--use-iotlab", help="use remote boards in FIT IoT-LAB.", action="store_true")
+    parser.add_argument("--device", help="attached device of a board, format: BOARD=PORT[,SERIAL] or BOARD=IOTLAB_NODE_URL.",
+                        action="append", default=[])
+    parser.add_argument("--compile-jobs", default=None, type=int, help="number of compile processes, default: cpu count")
+    parser.add_argument("--build-root", default=SWEEP_BUILD_ROOT, help=f"default: {SWEEP_BUILD_ROOT}")
+    parser.add_argument("--random-seed", default=42, type=int, help="default: 42")
+    parser.add_argument("--trials-num", default=10, type=int, help="defalut: 10")
+    parser.add_argument("--input-shape", default=None, type=lambda s: [int(i) for i in s.split(',')], help="specify the input shape, mandatory for pytorch model. format: N,C,W,H default: None")
+    parser.add_argument("--no-cache", help="disable the compilation cache.", action="store_true")
+    parser.add_argument("--timer", choices=TIMER_CHOICES, default=None, help="on-board timer backend. default: xtimer")
+    add_trace_args(parser)
+    args = parser.parse_args(argv)
+    start_trace(args)
+    models = []
+    for path in args.models:
+        if path.endswith(MODEL_EXTENSIONS):
+            models.append(path)
+        else:
+            models += collect_models(path)
+    run_multi_model(models, args.boards, args.trials_num, args.use_iotlab, args.random_seed,
+                    {'input': args.input_shape} if args.input_shape is not None else None,
+                    parse_devices(args.device), args.compile_jobs, args.build_root, not args.no_cache, args.timer,
+                    args.flash_budget * 1024 if args.flash_budget is not None else None,
+                    args.ram_budget * 1024 if args.ram_budget is not None else None)
+
+def compare_main(argv):
+    from compare import run_compare
+    parser = argparse.ArgumentParser(prog="u-toe.py compare",
+                                     description="Compare a candidate run set against a baseline, matched by "
+                                                 "(model hash, board, timer). Exits with 1 on regressions and "
+                                                 "baseline runs without a candidate.")
+    parser.add_argument("baseline", help="results database (.db), log folder or JSON log of the baseline runs.")
+    parser.add_argument("candidate", help="results database (.db), log folder or JSON log of the candidate runs.")
+    parser.add_argument("--test", choices=['mannwhitney', 'welch'], default='mannwhitney',
+                        help="significance test of the latency. default: mannwhitney")
+    parser.add_argument("--alpha", default=0.05, type=float, help="significance level. default: 0.05")
+    parser.add_argument("--latency-threshold", default=0.02, type=float,
+                        help="smallest relative change of the mean latency that counts. default: 0.02")
+    parser.add_argument("--memory-threshold", default=0.0, type=float,
+                        help="allowed relative memory increase. default: 0.0")
+    parser.add_argument("--storage-threshold", default=0.0, type=float,
+                        help="allowed relative storage increase. default: 0.0")
+    parser.add_argument("--allow-missing", help="do not fail when a baseline run has no candidate.",
+                        action="store_true")
+    parser.add_argument("--output", default=None, help="write the comparison as JSON to this file.")
+    args = parser.parse_args(argv)
+    report = run_compare(args.baseline, args.candidate, args.output, alpha=args.alpha,
+                         latency_threshold=args.latency_threshold, memory_threshold=args.memory_threshold,
+                         storage_threshold=args.storage_threshold, test=args.test)
+    failed = any(r['regressions'] for r in report['results']) or (not args.allow_missing and report['missing'])
+    return 1 if failed else 0
+
+def energy_main(argv):
+    import json
+    from energy import energy_from_record, print_energy_summary
+    from utils import NpEncoder
+    parser = argparse.ArgumentParser(prog="u-toe.py energy",
+                                     description="Energy per inference of a saved Per-Model record from a recorded "
+                                                 "power trace, the run needs a trial gap (--energy).")
+    parser.add_argument("trace", help="IoT-LAB .oml consumption file or CSV (time and power, or current and voltage).")
+    parser.add_argument("log", help="JSON log of the run.")
+    parser.add_argument("--index", default=0, type=int, help="record of a log with several records. default: 0")
+    parser.add_argument("--voltage", default=None, type=float, help="supply voltage of a CSV trace with current only.")
+    parser.add_argument("--update", help="store the result in the log.", action="store_true")
+    args = parser.parse_args(argv)
+    with open(args.log, 'r') as f:
+        recs = json.load(f)
+    rec = recs[args.index] if isinstance(recs, list) else recs
+    rec['energy'] = energy_from_record(rec, args.trace, args.voltage)
+    print_energy_summary(rec)
+    if args.update:
+        with open(args.log, 'w') as f:
+            json.dump(recs, f, cls=NpEncoder)
+
+def pool_main(argv):
+    from iotlab_pool import IotlabPool, print_pool_status
+    parser = argparse.ArgumentParser(prog="u-toe.py pool",
+                                     description="IoT-LAB node pool shared by the runs with --iotlab-pool: experiments "
+                                                 "stay up between evaluations, idle ones are stopped.")
+    parser.add_argument("action", choices=['reserve', 'status', 'release-idle', 'stop'])
+    parser.add_argument("--boards", help="IoT board names to reserve nodes for.", nargs='+', default=[])
+    parser.add_argument("--count", default=1, type=int, help="nodes per board to reserve. default: 1")
+    parser.add_argument("--idle-timeout", default=None, type=float,
+                        help="release-idle: stop experiments unused for this many minutes. default: 15")
+    parser.add_argument("--duration", default=None, type=int,
+                        help="reserve: experiment duration in minutes, bounds a leaked experiment. default: 120")
+    args = parser.parse_args(argv)
+    pool = IotlabPool() if args.duration is None else IotlabPool(duration=args.duration)
+    if args.action == 'reserve':
+        for board in args.boards:
+            pool.reserve(board, args.count)
+    elif args.action == 'release-idle':
+        stopped = pool.release_idle(args.idle_timeout * 60 if args.idle_timeout is not None else None)
+        print(f"Stopped {len(stopped)} idle experiments {stopped}")
+    elif args.action == 'stop':
+        pool.stop_all()
+    print_pool_status(pool.status())
+
+def memory_main(argv):
+    from elf_size import analyze_elf, get_elf_path
+    from report import print_memory_analysis
+    parser = argparse.ArgumentParser(prog="u-toe.py memory",
+                                     description="Memory consumption by symbol category of an already built firmware.")
+    parser.add_argument("elf", nargs='?', default=None, help="firmware ELF. default: the build of --board")
+    parser.add_argument("--board", help="IoT board name", default="stm32f746g-disco", type=str)
+    parser.add_argument("--build-dir", default='.', help="build directory of the firmware. default: .")
+    parser.add_argument("--map", default=None, help="linker map file. default: next to the ELF")
+    parser.add_argument("--models", nargs='+', default=['default'],
+                        help="model names of a multi-model firmware. default: default")
+    parser.add_argument("--top", default=20, type=int, help="largest symbols shown. default: 20")
+    args = parser.parse_args(argv)
+    elf_path = args.elf or get_elf_path(args.board, args.build_dir)
+    map_path = args.map or os.path.splitext(elf_path)[0] + '.map'
+    print_memory_analysis(analyze_elf(elf_path, map_path, args.models, args.top))
+
+def collect_main(argv):
+    parser = argparse.ArgumentParser(prog="u-toe.py collect",
+                                     description="Runs the flashed per-model firmware on every attached board at once.")
+    parser.add_argument("--port", action='append', default=None,
+                        help="serial port of a board, repeatable. default: all ports of `make list-ttys-json`")
+    parser.add_argument("--board", default=None, type=str, help="IoT board name, boards are reset with `make reset`")
+    parser.add_argument("--no-reset", action="store_true",
+                        help="do not reset the boards, they must be waiting for the start command")
+    parser.add_argument("--trials-num", default=None, type=int, help="trials per board. default: firmware default")
+    parser.add_argument("--random-seed", default=None, type=int, help="random seed of the model inputs")
+    parser.add_argument("--warmup", default=None, type=int, help="untimed warm-up runs before the trials")
+    parser.add_argument("--burst", default=None, type=int, help="back-to-back runs timed as a whole")
+    parser.add_argument("--output-format", choices=['binary', 'text'], default='binary',
+                        help="trial output of the firmware. default: binary")
+    parser.add_argument("--baudrate", default=115200, type=int, help="default: 115200")
+    parser.add_argument("--prompt-timeout", default=10.0, type=float,
+                        help="seconds to wait for the start prompt after a reset. default: 10")
+    parser.add_argument("--idle-timeout", default=25.0, type=float,
+                        help="seconds without output before a board is reset and retried. default: 25")
+    parser.add_argument("--retries", default=1, type=int, help="retries per board. default: 1")
+    parser.add_argument("--output", default=None, help="write the trials of every board to this JSON file")
+    args = parser.parse_args(argv)
+
+    import json
+    from collector import list_devices, collect_trials, print_collection
+    from trial_protocol import make_start_command
+    from utils import NpEncoder
+    if args.port:
+        devices = [{'name': os.path.basename(port), 'port': port, 'board': args.board} for port in args.port]
+    else:
+        devices = list_devices(args.board)
+    for device in devices:
+        device['baudrate'] = args.baudrate
+        if args.no_reset:
+            device['board'] = None
+    if not devices:
+        sys.exit("No serial ports found")
+    start_command = make_start_command(args.trials_num, args.random_seed, warmup=args.warmup, burst=args.burst)
+    print(f"Collecting from {len(devices)} boards...")
+    results = collect_trials(devices, start_command, args.output_format, prompt_timeout=args.prompt_timeout,
+                             idle_timeout=args.idle_timeout, retries=args.retries)
+    print_collection(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, cls=NpEncoder)
+        print(f"Trials written to {args.output}")
+    return 1 if any(r['error'] is not None for r in results) else 0
+
+def evaluate_main(argv):
     parser = argparse.ArgumentParser()
     parser.add_argument("model_file", help="path to machine leearning model file.",
                         type=str)
@@ -10,7 +330,11 @@ if __name__ == '__main__':
                             action="store_true")
     mode_group.add_argument("--per-ops", help="Per-Operator Evaluation.",
                             action="store_true")
-    mode_group.add_argument("--mem-analysis", help="Run memory consumption analysis using cosy.",
+    mode_group.add_argument("--per-ops-aot", help="Per-Operator Evaluation, profiled on the board with the AoT executor.",
+                            action="store_true")
+    mode_group.add_argument("--mem-analysis", help="Memory consumption analysis of the firmware by symbol category.",
+                            action="store_true")
+    mode_group.add_argument("--mem-timeline", help="Per-operator live memory timeline and peak, without a board.",
                             action="store_true")
     parser.add_argument("--board", help="IoT board name", default="stm32f746g-disco",
                         type=str)
@@ -18,14 +342,95 @@ if __name__ == '__main__':
                         action="store_true")
     parser.add_argument("--iotlab-node", help="remote node url. It will start an new experiment if this field is empty.",
                         default=None)
+    parser.add_argument("--iotlab-pool", default=None, type=int, metavar="N",
+                        help="lease the IoT-LAB nodes from the node pool, N nodes of the board are reserved up front "
+                             "and kept for the next runs (see u-toe.py pool). default: one experiment per run")
     parser.add_argument("--random-seed", default=42, type=int, help="default: 42")
     parser.add_argument("--trials-num", default=10, type=int, help="defalut: 10")
     parser.add_argument("--input-shape", default=None, type=lambda s: [int(i) for i in s.split(',')], help="specify the input shape, mandatory for pytorch model. format: N,C,W,H default: None")
-    args = parser.parse_args()
+    parser.add_argument("--no-cache", help="disable the compilation cache (UTOE_CACHE_DIR, default: ~/.cache/u-toe).",
+                        action="store_true")
+    parser.add_argument("--output-format", choices=['text', 'binary'], default=None,
+                        help="trial result format. default: binary for local boards, text for IoT-LAB")
+    parser.add_argument("--baudrate", default=None, type=int, help="stdio UART baudrate of the board and the host. default: 115200")
+    parser.add_argument("--transport", default=None,
+                        help="byte stream of the --per-ops RPC session: serial:PORT, socket:HOST:PORT or pty:ELF "
+                             "(e.g. pty:bin/native/U-TOE.elf for the native board). default: serial port of the board")
+    parser.add_argument("--cosy", help="run the interactive cosy analysis with --mem-analysis instead.",
+                        action="store_true")
+    parser.add_argument("--prof-repeat", default=10, type=int, help="model runs recorded by --per-ops-aot. default: 10")
+    parser.add_argument("--timer", choices=TIMER_CHOICES, default=None,
+                        help="on-board timer backend, dwt and mcycle count core clock cycles. default: xtimer")
+    parser.add_argument("--target-precision", default=None, type=float,
+                        help="stop once the 95%% CI half-width relative to the mean falls below this value, e.g. 0.01. "
+                             "Replaces --trials-num, needs the binary output format. default: None")
+    parser.add_argument("--min-trials", default=5, type=int, help="minimum trials with --target-precision. default: 5")
+    parser.add_argument("--max-trials", default=10000, type=int, help="trial budget with --target-precision. default: 10000")
+    parser.add_argument("--max-time", default=None, type=float, help="time budget in seconds with --target-precision. default: None")
+    parser.add_argument("--warmup", default=0, type=int,
+                        help="runs before the trials, reported separately and left out of the statistics. default: 0")
+    parser.add_argument("--burst", default=0, type=int,
+                        help="back-to-back runs after the trials to measure the sustained inferences/s. default: 0")
+    parser.add_argument("--energy", help="measure the energy per inference from a power trace, see --power-trace.",
+                        action="store_true")
+    parser.add_argument("--power-trace", default=None,
+                        help="IoT-LAB .oml consumption file or CSV of a power analyzer recorded during the run. "
+                             "default: the consumption file of the IoT-LAB experiment")
+    parser.add_argument("--trial-gap-ms", default=None, type=int,
+                        help="idle time before each trial with --energy. default: 20")
+    parser.add_argument("--voltage", default=None, type=float, help="supply voltage of a CSV trace with current only.")
+    parser.add_argument("--input-sets", default=None, type=int,
+                        help="random inputs generated before the first trial, trial i uses set i %% N. "
+                             "default: a fresh input before each trial")
+    add_trace_args(parser)
+    args = parser.parse_args(argv)
+    if args.per_ops_aot and (args.use_iotlab or args.iotlab_node or args.iotlab_pool):
+        parser.error("--per-ops-aot reads the profile from a local board, it cannot run in FIT IoT-LAB")
+    if args.iotlab_pool and args.energy and args.power_trace is None:
+        # the consumption file of an experiment only shows up once it ended, pooled experiments keep running
+        parser.error("--energy needs an own IoT-LAB experiment (--use-iotlab) or a --power-trace, "
+                     "the pooled experiments have no consumption file")
+    start_trace(args)
+    from evaluate import (evaluate_per_model, evaluate_per_operator, evaluate_per_operator_aot, memory_analysis,
+                          memory_timeline_analysis)
+    early_stopping = None
+    if args.target_precision is not None:
+        early_stopping = {'rel_precision': args.target_precision, 'min_trials': args.min_trials,
+                          'max_trials': args.max_trials, 'max_time': args.max_time}
+    energy = None
+    if args.energy or args.power_trace is not None:
+        energy = {'trace': args.power_trace, 'voltage': args.voltage}
+        if args.trial_gap_ms is not None:
+            energy['gap_ms'] = args.trial_gap_ms
+    if args.iotlab_pool:
+        from iotlab_pool import enable_pool
+        args.use_iotlab = True
+        enable_pool([args.board], args.iotlab_pool)
+    use_cache = not args.no_cache
     if args.mem_analysis:
-        memory_analysis(args.model_file, args.board, {'input': args.input_shape} if args.input_shape is not None else None)
+        memory_analysis(args.model_file, args.board, {'input': args.input_shape} if args.input_shape is not None else None, use_cache,
+                        use_cosy=args.cosy)
+    elif args.mem_timeline:
+        memory_timeline_analysis(args.model_file, args.board,
+                                 {'input': args.input_shape} if args.input_shape is not None else None, use_cache)
+    elif args.per_ops_aot:
+        evaluate_per_operator_aot(args.model_file, args.board, args.prof_repeat, args.random_seed,
+                                  {'input': args.input_shape} if args.input_shape is not None else None, use_cache,
+                                  timer=args.timer, baudrate=args.baudrate)
     elif args.per_ops:
-        evaluate_per_operator(args.model_file, args.board, args.use_iotlab, args.iotlab_node, {'input': args.input_shape} if args.input_shape is not None else None)
+        evaluate_per_operator(args.model_file, args.board, args.use_iotlab, args.iotlab_node, {'input': args.input_shape} if args.input_shape is not None else None, use_cache,
+                              timer=args.timer, baudrate=args.baudrate, transport=args.transport)
     else:
-        evaluate_per_model(args.model_file, args.board, args.trials_num, args.use_iotlab, args.iotlab_node, args.random_seed, {'input': args.input_shape} if args.input_shape is not None else None)
+        evaluate_per_model(args.model_file, args.board, args.trials_num, args.use_iotlab, args.iotlab_node, args.random_seed, {'input': args.input_shape} if args.input_shape is not None else None, use_cache,
+                           output_format=args.output_format, early_stopping=early_stopping, timer=args.timer,
+                           warmup=args.warmup, burst=args.burst, input_sets=args.input_sets, energy=energy,
+                           baudrate=args.baudrate)
 
+SUBCOMMANDS = {'sweep': sweep_main, 'batch': batch_main, 'report': report_main, 'tune': tune_main, 'pack': pack_main,
+               'compare': compare_main, 'energy': energy_main, 'pool': pool_main, 'memory': memory_main,
+               'collect': collect_main}
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        sys.exit(SUBCOMMANDS[sys.argv[1]](sys.argv[2:]) or 0)
+    evaluate_main(sys.argv[1:])
@@ -1,5 +1,18 @@
 from string import Template
+import os
 import re
+import json
+import numpy as np
+
+class NpEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        if isinstance(obj, np.floating):
+            return float(obj)
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return super(NpEncoder, self).default(obj)
 
 def _shape_to_size(shape, dtype):
     bits_per_item = int(
@@ -36,10 +49,44 @@ def generate_model_io_vars_header(input_vars : dict, output_vars : dict, output_
     output_fields, output_size = get_fields_and_size(output_vars, 'output')
     io_vars_header = Template(HEADER_TEMPLATE).substitute(input_size=input_size, output_size=output_size,
                                                           input_fields=input_fields, output_fields=output_fields)
+    # an unchanged header keeps its mtime, so main.c is not recompiled
+    if os.path.isfile(output_path):
+        with open(output_path, "r") as f:
+            if f.read() == io_vars_header:
+                return io_vars_header
     with open(output_path, "w") as f:
         f.write(io_vars_header)
     return io_vars_header
 
+def generate_model_table_header(models : list, output_path='./model_table.h'):
+    # models: [{'name': mod_name, 'input_vars': [...], 'output_vars': [...]}]
+    # only one model runs at a time, so all of them share one input and one output buffer
+    input_size = max(sum(v['size'] for v in m['input_vars']) for m in models)
+    output_size = max(sum(v['size'] for v in m['output_vars']) for m in models)
+    lines = ["/* U-TOE Auto-generated File */"]
+    lines += [f"#include <tvmgen_{m['name']}.h>" for m in models]
+    lines += [f"static char input[{input_size}];", f"static char output[{output_size}];"]
+    for m in models:
+        name = m['name']
+        def fields(vars, buffer):
+            offsets = [sum(v['size'] for v in vars[:i]) for i in range(len(vars))]
+            return ' '.join(f".{v['name']} = &{buffer}[{o}]," for v, o in zip(vars, offsets))
+        lines += [f"static struct tvmgen_{name}_inputs {name}_inputs = {{ {fields(m['input_vars'], 'input')} }};",
+                  f"static struct tvmgen_{name}_outputs {name}_outputs = {{ {fields(m['output_vars'], 'output')} }};",
+                  f"static int {name}_run(void) {{ return tvmgen_{name}_run(&{name}_inputs, &{name}_outputs); }}"]
+    lines.append("static const utoe_model_t utoe_models[] = {")
+    lines += [f"    {{ \"{m['name']}\", {m['name']}_run, "
+              f"{sum(v['size'] for v in m['input_vars'])} }}," for m in models]
+    lines += ["};", f"#define UTOE_NUM_MODELS {len(models)}", ""]
+    header = '\n'.join(lines)
+    if os.path.isfile(output_path):
+        with open(output_path, "r") as f:
+            if f.read() == header:
+                return header
+    with open(output_path, "w") as f:
+        f.write(header)
+    return header
+
 def extract_io_vars_from_module(mod):
     metadata = mod.executor_codegen_metadata
     input_names = metadata.inputs
@@ -0,0 +1,85 @@
+/*
+ * Copyright (C) 2023 Zhaolan Huang <zhaolan.huang@fu-berlin.de>
+ *
+ * This file is subject to the terms and conditions of the GNU Lesser
+ * General Public License v3. See the file LICENSE in the top level
+ * directory for more details.
+ */
+
+/**
+ * @ingroup     apps
+ * @{
+ *
+ * @file
+ * @brief       U-TOE timer backends, selected at build time with UTOE_TIMER
+ *
+ * All backends count in 32 bit ticks of UTOE_TIMER_HZ, the difference of two
+ * readings is correct across one wrap around.
+ *
+ * @author      Zhaolan Huang <zhaolan.huang@fu-berlin.de>
+ *
+ * @}
+ */
+
+#ifndef UTOE_TIMER_H
+#define UTOE_TIMER_H
+
+#include <stdint.h>
+
+/* keep in sync with TIMER_BACKENDS in trial_protocol.py */
+#define UTOE_TIMER_XTIMER   0
+#define UTOE_TIMER_ZTIMER   1
+#define UTOE_TIMER_DWT      2   /* ARM Cortex-M3 and up: DWT cycle counter */
+#define UTOE_TIMER_MCYCLE   3   /* RISC-V: mcycle CSR */
+
+#ifndef UTOE_TIMER
+#define UTOE_TIMER UTOE_TIMER_XTIMER
+#endif
+
+#if (UTOE_TIMER==UTOE_TIMER_XTIMER)
+#include "xtimer.h"
+#define UTOE_TIMER_HZ 1000000UL
+
+static inline void utoe_timer_init(void) { xtimer_init(); }
+static inline uint32_t utoe_timer_now(void) { return xtimer_now_usec(); }
+
+#elif (UTOE_TIMER==UTOE_TIMER_ZTIMER)
+#include "ztimer.h"
+#define UTOE_TIMER_HZ 1000000UL
+
+static inline void utoe_timer_init(void) { }
+static inline uint32_t utoe_timer_now(void) { return ztimer_now(ZTIMER_USEC); }
+
+#elif (UTOE_TIMER==UTOE_TIMER_DWT)
+#include "cpu.h"
+#include "periph_conf.h"
+#if !defined(DWT_CTRL_CYCCNTENA_Msk)
+#error "UTOE_TIMER=dwt: this core has no DWT cycle counter"
+#endif
+#define UTOE_TIMER_HZ CLOCK_CORECLOCK
+
+static inline void utoe_timer_init(void)
+{
+    CoreDebug->DEMCR |= CoreDebug_DEMCR_TRCENA_Msk;
+    DWT->CYCCNT = 0;
+    DWT->CTRL |= DWT_CTRL_CYCCNTENA_Msk;
+}
+static inline uint32_t utoe_timer_now(void) { return DWT->CYCCNT; }
+
+#elif (UTOE_TIMER==UTOE_TIMER_MCYCLE)
+#include "periph_conf.h"
+#define UTOE_TIMER_HZ CLOCK_CORECLOCK
+
+static inline void utoe_timer_init(void) { }
+static inline uint32_t utoe_timer_now(void)
+{
+    uint32_t cycles;
+    __asm__ volatile ("csrr %0, mcycle" : "=r" (cycles));
+    return cycles;
+}
+
+#else
+#error "unknown UTOE_TIMER backend"
+#endif
+
+#endif /* UTOE_TIMER_H */